@@ -2,4 +2,15 @@ from django.apps import AppConfig
 
 class AchievementsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'backend.apps.achievements'
\ No newline at end of file
+    name = 'backend.apps.achievements'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_migrate, post_save
+        from backend.apps.leaderboard.models import Badge
+        from .engine import badge_engine, provision_after_migrate
+
+        # Thresholds are cached in memory, reload them after any badge edit;
+        # a saved badge gets its achievements badge first
+        post_save.connect(badge_engine.provision_on_save, sender=Badge, dispatch_uid='badge_engine_save')
+        post_delete.connect(badge_engine.invalidate_on_change, sender=Badge, dispatch_uid='badge_engine_delete')
+        post_migrate.connect(provision_after_migrate, sender=self)
@@ -0,0 +1,225 @@
+import logging
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Badge, UserBadge
+
+logger = logging.getLogger(__name__)
+
+ROLES = ('student', 'teacher', 'school')
+# Bumped on every leaderboard badge change so all processes reload their thresholds
+THRESHOLDS_VERSION_KEY = 'badge_thresholds_version'
+
+
+class RoleThresholds:
+    """
+    Badge thresholds of one role, sorted for binary search
+    Args:
+        badges: active leaderboard badges of the role
+        award_ids: leaderboard badge _id -> id of the achievements Badge awarded for it
+    """
+
+    def __init__(self, badges, award_ids):
+        point_badges = sorted(
+            (badge for badge in badges if badge.rank_required is None and badge.points_required is not None),
+            key=lambda badge: badge.points_required
+        )
+        self.points = [badge.points_required for badge in point_badges]
+        self.point_badge_ids = [award_ids[badge._id] for badge in point_badges]
+
+        rank_badges = sorted(
+            (badge for badge in badges if badge.rank_required is not None),
+            key=lambda badge: badge.rank_required
+        )
+        self.ranks = [badge.rank_required for badge in rank_badges]
+        self.rank_badges = [(award_ids[badge._id], badge.points_required or 0) for badge in rank_badges]
+
+    @property
+    def max_rank(self):
+        return self.ranks[-1] if self.ranks else None
+
+    def crossed_point_badges(self, old_points, new_points):
+        """Badges whose points_required lies in (old_points, new_points]"""
+        low = bisect_right(self.points, old_points) if old_points is not None else 0
+        high = bisect_right(self.points, new_points)
+        return self.point_badge_ids[low:high]
+
+    def rank_badges_for(self, rank, points):
+        """Rank badges held at this rank, i.e. rank_required >= rank"""
+        return [
+            badge_id
+            for badge_id, points_required in self.rank_badges[bisect_left(self.ranks, rank):]
+            if points >= points_required
+        ]
+
+
+def provision_award_badges(badges=None):
+    """
+    Make sure every leaderboard badge has its achievements Badge, matched by
+    name: UserBadge references achievements.Badge in PostgreSQL. Run when a
+    leaderboard badge is saved and after migrations, never while loading
+    thresholds. The unique name settles concurrent provisioning.
+    Args:
+        badges: leaderboard badges, all of them by default
+    Returns:
+        number of achievements badges created
+    """
+    from backend.apps.leaderboard.models import Badge as LeaderboardBadge
+
+    created_count = 0
+    for badge in (LeaderboardBadge.objects.all() if badges is None else badges):
+        _, created = Badge.objects.get_or_create(
+            name=badge.name,
+            defaults={
+                "description": badge.description,
+                "icon": badge.icon_url,
+                "points_required": badge.points_required or 0,
+                "badge_type": badge.role_specific or 'general'
+            }
+        )
+        created_count += created
+    return created_count
+
+
+def provision_after_migrate(sender, **kwargs):
+    """post_migrate receiver provisioning the achievements badges of every leaderboard badge"""
+    try:
+        created = provision_award_badges()
+    except Exception as e:
+        logger.error(f"Failed to provision achievements badges: {str(e)}", exc_info=True)
+        return
+    if created:
+        logger.info(f"Provisioned {created} achievements badges for leaderboard badges")
+
+
+def _award_ids(badges):
+    """
+    achievements Badge ids awarded for leaderboard badges, matched by name.
+    Leaderboard badges not provisioned yet are left out.
+    """
+    award_ids = dict(Badge.objects.filter(name__in=[badge.name for badge in badges]).values_list('name', 'id'))
+    missing = [badge.name for badge in badges if badge.name not in award_ids]
+    if missing:
+        logger.warning(f"Leaderboard badges without an achievements badge, not awarded: {', '.join(missing)}")
+    return {badge._id: award_ids[badge.name] for badge in badges if badge.name in award_ids}
+
+
+class BadgeEngine:
+    """
+    Awards achievements badges from leaderboard changes.
+
+    The active leaderboard badges are kept in memory per role and reloaded
+    after BADGE_THRESHOLDS_TTL seconds, or as soon as a badge change bumps
+    the version kept in the shared cache, so every worker picks it up.
+    Point badges are found by binary search over the thresholds crossed by
+    a points increase. Rank badges are checked in one pass over the top of
+    the role after ranks moved there. All awards are written with a single
+    bulk insert.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thresholds = None
+        self._version = None
+        self._loaded_at = 0
+
+    def invalidate(self):
+        self._thresholds = None
+        cache.add(THRESHOLDS_VERSION_KEY, 0, None)
+        try:
+            cache.incr(THRESHOLDS_VERSION_KEY)
+        except ValueError:
+            # Evicted between add and incr, any new value forces a reload
+            cache.set(THRESHOLDS_VERSION_KEY, 1, None)
+
+    def invalidate_on_change(self, sender, **kwargs):
+        self.invalidate()
+
+    def provision_on_save(self, sender, instance, **kwargs):
+        provision_award_badges([instance])
+        self.invalidate()
+
+    def _load(self):
+        from backend.apps.leaderboard.models import Badge as LeaderboardBadge
+
+        badges = list(LeaderboardBadge.objects.filter(is_active=True))
+        award_ids = _award_ids(badges)
+        badges = [badge for badge in badges if badge._id in award_ids]
+        return {
+            role: RoleThresholds(
+                [badge for badge in badges if badge.role_specific in (None, '', role)], award_ids
+            )
+            for role in ROLES
+        }
+
+    def thresholds(self, role):
+        return self._current()[role]
+
+    def _current(self):
+        """Thresholds of every role, reloaded when stale; one cache read per call"""
+        ttl = getattr(settings, 'BADGE_THRESHOLDS_TTL', 300)
+        version = cache.get(THRESHOLDS_VERSION_KEY)
+        thresholds = self._thresholds
+        if thresholds is None or version != self._version or time.monotonic() - self._loaded_at > ttl:
+            with self._lock:
+                thresholds = self._load()
+                self._thresholds = thresholds
+                self._version = version
+                self._loaded_at = time.monotonic()
+        return thresholds
+
+    def evaluate(self, changes, leaderboard=None):
+        """
+        Award badges for applied leaderboard changes
+        Args:
+            changes: dicts with user_id, role, old_points, points, old_rank and rank
+            leaderboard: leaderboard collection, needed for rank badges
+        Returns:
+            number of badge awards attempted
+        """
+        awards = set()
+        rank_roles = set()
+        role_thresholds = self._current()
+
+        for change in changes:
+            if change['role'] not in ROLES or not str(change['user_id']).isdigit():
+                continue
+            thresholds = role_thresholds[change['role']]
+
+            for badge_id in thresholds.crossed_point_badges(change['old_points'], change['points']):
+                awards.add((int(change['user_id']), badge_id))
+
+            # Any move through the rank badge zone shifts the ranks inside it
+            max_rank = thresholds.max_rank
+            if max_rank is not None and any(
+                rank is not None and rank <= max_rank for rank in (change['old_rank'], change['rank'])
+            ):
+                rank_roles.add(change['role'])
+
+        if leaderboard is not None:
+            for role in rank_roles:
+                thresholds = role_thresholds[role]
+                for entry in leaderboard.find(
+                    {"role": role, "rank": {"$lte": thresholds.max_rank}},
+                    {"user_id": 1, "rank": 1, "points": 1}
+                ):
+                    if not entry['user_id'].isdigit():
+                        continue
+                    for badge_id in thresholds.rank_badges_for(entry['rank'], entry.get('points', 0)):
+                        awards.add((int(entry['user_id']), badge_id))
+
+        if awards:
+            # Badges a user already holds are skipped by the (user, badge) unique constraint
+            UserBadge.objects.bulk_create(
+                [UserBadge(user_id=user_id, badge_id=badge_id) for user_id, badge_id in awards],
+                ignore_conflicts=True
+            )
+            logger.info(f"Evaluated {len(awards)} badge awards")
+        return len(awards)
+
+
+badge_engine = BadgeEngine()
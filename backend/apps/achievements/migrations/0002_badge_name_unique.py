@@ -0,0 +1,37 @@
+# Generated by Django 3.1.12 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+def merge_duplicate_badges(apps, schema_editor):
+    """Keep the oldest badge of each name, moving the awards of the others to it"""
+    Badge = apps.get_model('achievements', 'Badge')
+    UserBadge = apps.get_model('achievements', 'UserBadge')
+    duplicates = (
+        Badge.objects.values('name')
+        .annotate(count=models.Count('id'))
+        .filter(count__gt=1)
+        .values_list('name', flat=True)
+    )
+    for name in list(duplicates):
+        keep, *others = Badge.objects.filter(name=name).order_by('id')
+        for other in others:
+            held = UserBadge.objects.filter(badge=keep).values_list('user_id', flat=True)
+            UserBadge.objects.filter(badge=other).exclude(user_id__in=held).update(badge=keep)
+            other.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('achievements', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_badges, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='badge',
+            name='name',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+    ]
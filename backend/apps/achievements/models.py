@@ -2,7 +2,7 @@ from django.db import models
 from backend.apps.authentication.models import User
 
 class Badge(models.Model):
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, unique=True)
     description = models.TextField()
     icon = models.URLField()
     points_required = models.IntegerField()
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ClassroomsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'backend.apps.classrooms'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from backend.mongo_indexes import provision_indexes
+        post_migrate.connect(provision_indexes, sender=self)
+
+        from . import signals  # noqa
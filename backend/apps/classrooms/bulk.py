@@ -0,0 +1,245 @@
+import csv
+import json
+import logging
+from decimal import Decimal
+
+from bson import Decimal128, ObjectId
+from django.conf import settings
+from django.utils import timezone
+from pymongo.errors import BulkWriteError
+
+from .geo import get_classroom_collection
+from .geo_cache import nearby_cache
+from .serializers import ClassroomCreateSerializer
+from .snapshot import coordinate_snapshot
+from .spatial_index import classroom_index
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('ndjson', 'csv')
+CSV_COLUMNS = [
+    '_id', 'name', 'description', 'capacity', 'price_per_hour', 'address',
+    'lat', 'lng', 'amenities', 'images', 'is_available', 'created_at'
+]
+# Errors listed in an import report, the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+
+def _split_list(value):
+    """A list column of a CSV row, as a JSON array or semicolon separated values"""
+    value = value.strip()
+    if value.startswith('['):
+        return json.loads(value)
+    return [item.strip() for item in value.split(';') if item.strip()]
+
+
+def _record_from_csv(row):
+    record = {key: value for key, value in row.items() if key and value not in (None, '')}
+    lat, lng = record.pop('lat', None), record.pop('lng', None)
+    if 'location' in record:
+        record['location'] = json.loads(record['location'])
+    elif lat is not None or lng is not None:
+        # Left as given when not numeric, validate_location reports it
+        try:
+            record['location'] = {"type": "Point", "coordinates": [float(lng), float(lat)]}
+        except (TypeError, ValueError):
+            record['location'] = {"type": "Point", "coordinates": [lng, lat]}
+    for name in ('amenities', 'images'):
+        if name in record:
+            record[name] = _split_list(record[name])
+    return record
+
+
+def read_records(lines, input_format):
+    """
+    Classroom records from an iterable of text lines, one at a time
+    Yields:
+        (row number, record dict or None, parse error or None)
+    """
+    if input_format == 'csv':
+        for number, row in enumerate(csv.DictReader(lines), start=1):
+            try:
+                yield number, _record_from_csv(row), None
+            except ValueError as e:
+                yield number, None, f"Invalid row: {str(e)}"
+        return
+
+    number = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, None, f"Invalid JSON: {str(e)}"
+            continue
+        if not isinstance(record, dict):
+            yield number, None, "Each line must be a JSON object"
+            continue
+        yield number, record, None
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    if str(value).lower() in ('true', '1', 'yes'):
+        return True
+    if str(value).lower() in ('false', '0', 'no'):
+        return False
+    raise ValueError("is_available must be true or false")
+
+
+def build_document(record, school_id, now):
+    """
+    Validate a record with ClassroomCreateSerializer and build the
+    classrooms document the ORM would have inserted
+    Returns:
+        (document, None) or (None, errors)
+    """
+    serializer = ClassroomCreateSerializer(data=record)
+    if not serializer.is_valid():
+        return None, serializer.errors
+    try:
+        is_available = _parse_bool(record.get('is_available', True))
+    except ValueError as e:
+        return None, {"is_available": [str(e)]}
+
+    data = serializer.validated_data
+    return {
+        "_id": ObjectId(),
+        "school_id": school_id,
+        "name": data['name'],
+        "description": data['description'],
+        "capacity": data['capacity'],
+        "price_per_hour": Decimal128(Decimal(data['price_per_hour'])),
+        "location": data['location'],
+        "address": data['address'],
+        "amenities": data.get('amenities') or [],
+        "is_available": is_available,
+        "images": data.get('images') or [],
+        "created_at": now,
+        "updated_at": now
+    }, None
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, row, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "errors": errors})
+
+    def as_dict(self):
+        return {
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors)
+        }
+
+
+def _flush(batch, report):
+    """insert_many one batch, unordered so one bad row does not stop the others"""
+    documents = [document for _, document in batch]
+    failed = set()
+    try:
+        get_classroom_collection().insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        for write_error in e.details.get('writeErrors', []):
+            index = write_error['index']
+            failed.add(index)
+            report.error(batch[index][0], {"non_field_errors": [write_error.get('errmsg', 'Insert failed')]})
+
+    inserted = [document for index, document in enumerate(documents) if index not in failed]
+    report.inserted += len(inserted)
+    for document in inserted:
+        coordinate_snapshot.upsert(document["_id"], document["location"])
+        classroom_index.upsert(document)
+    nearby_cache.invalidate_locations(document["location"] for document in inserted)
+
+
+def import_classrooms(lines, input_format, school_id):
+    """
+    Stream classroom records into MongoDB for one school, validating each
+    row and inserting them in batches of CLASSROOM_IMPORT_BATCH_SIZE
+    Args:
+        lines: iterable of text lines, NDJSON or CSV with a header row
+        input_format: 'ndjson' or 'csv'
+    Returns:
+        ImportReport with per-row errors
+    """
+    batch_size = getattr(settings, 'CLASSROOM_IMPORT_BATCH_SIZE', 500)
+    max_rows = getattr(settings, 'CLASSROOM_IMPORT_MAX_ROWS', 10000)
+    report = ImportReport()
+    batch = []
+    now = timezone.now()
+
+    for number, record, parse_error in read_records(lines, input_format):
+        if report.rows >= max_rows:
+            report.error(number, {"non_field_errors": [f"Imports are limited to {max_rows} rows"]})
+            break
+        report.rows += 1
+        if parse_error:
+            report.error(number, {"non_field_errors": [parse_error]})
+            continue
+        document, errors = build_document(record, school_id, now)
+        if errors:
+            report.error(number, errors)
+            continue
+        batch.append((number, document))
+        if len(batch) >= batch_size:
+            _flush(batch, report)
+            batch = []
+    if batch:
+        _flush(batch, report)
+
+    logger.info(f"Imported {report.inserted} classrooms for school {school_id}, {report.failed} rows failed")
+    return report
+
+
+def _export_value(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def export_documents(query, batch_size=500):
+    """Classroom documents matching query, fetched from a cursor batch by batch"""
+    return get_classroom_collection().find(query, batch_size=batch_size).sort("_id", 1)
+
+
+def export_ndjson(documents):
+    for document in documents:
+        yield json.dumps({key: _export_value(value) for key, value in document.items()}, default=str) + "\n"
+
+
+class _Line:
+    """File-like target letting csv.writer produce one line at a time"""
+
+    def write(self, value):
+        return value
+
+
+def export_csv(documents):
+    writer = csv.writer(_Line())
+    yield writer.writerow(CSV_COLUMNS)
+    for document in documents:
+        coordinates = (document.get("location") or {}).get("coordinates") or [None, None]
+        row = dict(
+            {key: _export_value(value) for key, value in document.items()},
+            lng=coordinates[0], lat=coordinates[1],
+            amenities=';'.join(str(item) for item in document.get("amenities") or []),
+            images=';'.join(str(item) for item in document.get("images") or [])
+        )
+        yield writer.writerow([row.get(column) for column in CSV_COLUMNS])
@@ -0,0 +1,254 @@
+import logging
+from bisect import bisect_right
+from decimal import Decimal
+
+from bson import Decimal128, ObjectId
+from django.conf import settings
+from django.db import connections
+
+from backend.mongo import model_from_document
+from backend.pagination import decode_cursor, encode_cursor
+from .models import Classroom
+
+logger = logging.getLogger(__name__)
+
+CLASSROOMS_COLLECTION = 'classrooms'
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def get_classroom_collection():
+    return connections['mongodb'].connection[CLASSROOMS_COLLECTION]
+
+
+def classroom_from_document(document, projected=False):
+    """Classroom instance from a raw classrooms document, see model_from_document"""
+    return model_from_document(Classroom, document, projected)
+
+
+def price_as_float(value):
+    """price_per_hour as stored (Decimal128) or loaded (Decimal) to float, None if unset"""
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    return float(value) if isinstance(value, (Decimal, int, float)) else None
+
+
+def document_from_classroom(classroom):
+    """Raw document of a saved Classroom, the inverse of classroom_from_document"""
+    return {field.attname: getattr(classroom, field.attname) for field in Classroom._meta.concrete_fields}
+
+
+def decode_nearby_cursor(lat, lng, cursor):
+    """
+    Decode a nearby cursor issued for the same search center
+    Returns:
+        (last distance in meters, ids already returned at that distance)
+    Raises:
+        ValueError: if the cursor is malformed or belongs to another search
+    """
+    position = decode_cursor(cursor)
+    try:
+        if (position["lat"], position["lng"]) != (lat, lng):
+            raise ValueError("Cursor does not match the search center")
+        ids = [str(value) for value in position["ids"]]
+        if not all(ObjectId.is_valid(value) for value in ids):
+            raise ValueError("Invalid cursor")
+        return float(position["distance"]), ids
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {str(e)}")
+
+
+def encode_nearby_cursor(lat, lng, page, previous=None):
+    """
+    Cursor continuing after a page of (id, distance in meters) pairs
+    Args:
+        previous: decoded position of the cursor that produced the page
+    """
+    last_distance = page[-1][1]
+    tied_ids = [classroom_id for classroom_id, distance in page if distance == last_distance]
+    if previous and previous[0] == last_distance:
+        # The whole page sat at the previous distance, keep excluding those too
+        tied_ids += previous[1]
+    return encode_cursor({"lat": lat, "lng": lng, "distance": last_distance, "ids": tied_ids})
+
+
+def parse_search_filters(params):
+    """
+    Read is_available, min_capacity, max_capacity, min_price, max_price,
+    amenities (comma separated) and amenities_match (all or any) query parameters
+    Raises:
+        ValueError: if a value is not valid
+    """
+    filters = {}
+    if params.get('is_available') not in (None, ''):
+        value = params['is_available'].lower()
+        if value not in ('true', 'false', '1', '0'):
+            raise ValueError("is_available must be true or false")
+        filters['is_available'] = value in ('true', '1')
+    for name in ('min_capacity', 'max_capacity'):
+        if params.get(name) not in (None, ''):
+            filters[name] = int(params[name])
+    for name in ('min_price', 'max_price'):
+        if params.get(name) not in (None, ''):
+            filters[name] = float(params[name])
+    if params.get('amenities') not in (None, ''):
+        filters['amenities'] = sorted({value.strip() for value in params['amenities'].split(',') if value.strip()})
+        filters['amenities_match'] = params.get('amenities_match', 'all').lower()
+        if filters['amenities_match'] not in ('all', 'any'):
+            raise ValueError("amenities_match must be all or any")
+    return filters
+
+
+def filters_query(filters):
+    """MongoDB filter equivalent of parse_search_filters output"""
+    query = {}
+    if 'is_available' in filters:
+        query['is_available'] = filters['is_available']
+    capacity = {}
+    if 'min_capacity' in filters:
+        capacity["$gte"] = filters['min_capacity']
+    if 'max_capacity' in filters:
+        capacity["$lte"] = filters['max_capacity']
+    if capacity:
+        query['capacity'] = capacity
+    price = {}
+    if 'min_price' in filters:
+        price["$gte"] = Decimal128(str(filters['min_price']))
+    if 'max_price' in filters:
+        price["$lte"] = Decimal128(str(filters['max_price']))
+    if price:
+        query['price_per_hour'] = price
+    if filters.get('amenities'):
+        operator = "$all" if filters['amenities_match'] == 'all' else "$in"
+        query['amenities'] = {operator: filters['amenities']}
+    return query
+
+
+def price_bucket_boundaries():
+    return list(getattr(settings, 'CLASSROOM_PRICE_BUCKETS', [0, 1000, 2000, 5000, 10000]))
+
+
+def format_facets(total, amenity_counts, bucket_counts):
+    """
+    Facet response shared by the MongoDB and in-memory searches
+    Args:
+        amenity_counts: iterable of (amenity, count)
+        bucket_counts: dict of bucket lower bound (None for the open top bucket) -> count
+    """
+    boundaries = price_bucket_boundaries()
+    buckets = [
+        {"min": low, "max": high, "count": bucket_counts.get(low, 0)}
+        for low, high in zip(boundaries, boundaries[1:])
+    ]
+    buckets.append({"min": boundaries[-1], "max": None, "count": bucket_counts.get(None, 0)})
+    return {
+        "total": total,
+        "amenities": [
+            {"name": name, "count": count}
+            for name, count in sorted(amenity_counts, key=lambda item: (-item[1], str(item[0])))
+        ],
+        "price_buckets": buckets
+    }
+
+
+def count_facets(items):
+    """
+    Facets of classrooms held outside MongoDB, matching the $facet stage
+    Args:
+        items: list of (price as float or None, iterable of amenities)
+    """
+    boundaries = price_bucket_boundaries()
+    amenities = {}
+    buckets = {}
+    for price, classroom_amenities in items:
+        for amenity in classroom_amenities:
+            amenities[amenity] = amenities.get(amenity, 0) + 1
+        if price is not None:
+            # Prices outside the boundaries land in the open bucket, as with $bucket's default
+            position = bisect_right(boundaries, price) - 1
+            low = boundaries[position] if 0 <= position < len(boundaries) - 1 else None
+            buckets[low] = buckets.get(low, 0) + 1
+    return format_facets(len(items), amenities.items(), buckets)
+
+
+def _facet_stages():
+    boundaries = price_bucket_boundaries()
+    return {
+        "total": [{"$count": "count"}],
+        "amenities": [
+            {"$unwind": "$amenities"},
+            {"$group": {"_id": "$amenities", "count": {"$sum": 1}}}
+        ],
+        "price_buckets": [
+            {"$bucket": {
+                "groupBy": "$price_per_hour",
+                "boundaries": boundaries,
+                # Prices at or above the last boundary
+                "default": "above",
+                "output": {"count": {"$sum": 1}}
+            }}
+        ]
+    }
+
+
+def search_nearby(lat, lng, radius_km, limit=DEFAULT_LIMIT, cursor=None, filters=None, facets=False):
+    """
+    Classrooms within radius_km of (lat, lng), nearest first, in one $geoNear
+    aggregation that returns the documents with their distances.
+    Pages continue from the last returned distance, skipping the classrooms
+    already returned at exactly that distance.
+    Args:
+        filters: output of parse_search_filters, applied inside $geoNear
+        facets: also count amenities and price buckets of every match, in a
+            $facet stage of the same aggregation
+    Returns:
+        (list of Classroom with a distance attribute in km, next cursor or None, facets or None)
+    Raises:
+        ValueError: if the cursor is malformed
+    """
+    geo_query = filters_query(filters or {})
+    geo_near = {
+        "near": {"type": "Point", "coordinates": [lng, lat]},
+        "distanceField": "distance",
+        "maxDistance": radius_km * 1000,
+        "spherical": True,
+        "key": "location",
+    }
+    previous = None
+    if cursor:
+        previous = decode_nearby_cursor(lat, lng, cursor)
+        geo_near["minDistance"] = previous[0]
+        geo_query["_id"] = {"$nin": [ObjectId(value) for value in previous[1]]}
+    geo_near["query"] = geo_query
+
+    pipeline = [{"$geoNear": geo_near}]
+    facet_counts = None
+    if facets:
+        pipeline.append({"$facet": dict(_facet_stages(), results=[{"$limit": limit + 1}])})
+        result = next(get_classroom_collection().aggregate(pipeline))
+        documents = result["results"]
+        facet_counts = format_facets(
+            result["total"][0]["count"] if result["total"] else 0,
+            [(entry["_id"], entry["count"]) for entry in result["amenities"]],
+            {
+                (None if entry["_id"] == "above" else entry["_id"]): entry["count"]
+                for entry in result["price_buckets"]
+            }
+        )
+    else:
+        pipeline.append({"$limit": limit + 1})
+        documents = list(get_classroom_collection().aggregate(pipeline))
+    has_more = len(documents) > limit
+    documents = documents[:limit]
+
+    classrooms = []
+    for document in documents:
+        classroom = classroom_from_document(document)
+        classroom.distance = document["distance"] / 1000
+        classrooms.append(classroom)
+
+    next_cursor = None
+    if has_more:
+        page = [(str(document["_id"]), document["distance"]) for document in documents]
+        next_cursor = encode_nearby_cursor(lat, lng, page, previous)
+    return classrooms, next_cursor, facet_counts
@@ -0,0 +1,254 @@
+import hashlib
+import json
+import logging
+import math
+
+import numpy as np
+from bson import ObjectId
+from django.conf import settings
+from django.core.cache import cache
+
+from .geo import (
+    classroom_from_document, count_facets, decode_nearby_cursor, encode_nearby_cursor, filters_query,
+    get_classroom_collection, price_as_float
+)
+from .snapshot import EARTH_RADIUS_KM, haversine_km
+
+logger = logging.getLogger(__name__)
+
+STATS_PREFIX = "classroom_geo_cache_stats"
+STAT_NAMES = ("hits", "misses", "stale", "bypasses", "invalidations")
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def _incr(name, amount=1):
+    key = f"{STATS_PREFIX}:{name}"
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        cache.set(key, amount, None)
+
+
+def get_geo_cache_stats():
+    """Hit, miss and invalidation counters of the nearby search cache"""
+    values = cache.get_many([f"{STATS_PREFIX}:{name}" for name in STAT_NAMES])
+    stats = {name: values.get(f"{STATS_PREFIX}:{name}", 0) for name in STAT_NAMES}
+    lookups = stats["hits"] + stats["misses"] + stats["stale"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else None
+    return stats
+
+
+def _tile_key(row, col):
+    return f"classroom_geo_tile:{row}:{col}"
+
+
+class NearbyCache:
+    """
+    Cache of nearby searches shared by every user in the same small cell.
+
+    Searches are quantized to a CLASSROOM_GEO_CACHE_CELL_DEG cell and a
+    radius rounded up to CLASSROOM_GEO_CACHE_RADIUS_STEP_KM. Each entry keeps
+    a compact candidate list (id, coordinates, price, amenities) covering
+    any center in the cell, so a hit only recomputes the caller's own
+    distances, paging and facets, then loads the page by id.
+
+    Entries record the versions of the CLASSROOM_GEO_CACHE_TILE_DEG tiles
+    they cover. A classroom change bumps the version of its tile, which
+    invalidates exactly the entries overlapping it.
+    """
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'CLASSROOM_GEO_CACHE_TTL', 60)
+
+    @property
+    def cell_deg(self):
+        return getattr(settings, 'CLASSROOM_GEO_CACHE_CELL_DEG', 0.01)
+
+    @property
+    def tile_deg(self):
+        return getattr(settings, 'CLASSROOM_GEO_CACHE_TILE_DEG', 0.25)
+
+    @property
+    def radius_step_km(self):
+        return getattr(settings, 'CLASSROOM_GEO_CACHE_RADIUS_STEP_KM', 1)
+
+    @property
+    def max_candidates(self):
+        return getattr(settings, 'CLASSROOM_GEO_CACHE_MAX_CANDIDATES', 2000)
+
+    @property
+    def max_tiles(self):
+        return getattr(settings, 'CLASSROOM_GEO_CACHE_MAX_TILES', 64)
+
+    def _tile(self, lat, lng):
+        # Longitudes past the antimeridian wrap onto the tiles on the other side
+        lng = (lng + 180) % 360 - 180
+        return int(math.floor(lat / self.tile_deg)), int(math.floor(lng / self.tile_deg))
+
+    def _tiles_covering(self, lat, lng, radius_km):
+        """Tiles overlapping the bounding box of a circle, None when there are too many"""
+        lat_span = radius_km / KM_PER_DEGREE
+        cos_lat = math.cos(math.radians(min(abs(lat) + lat_span, 90)))
+        if cos_lat < 1e-6:
+            return None
+        lng_span = lat_span / cos_lat
+        if lng_span >= 180:
+            return None
+        low_row = int(math.floor(max(lat - lat_span, -90) / self.tile_deg))
+        high_row = int(math.floor(min(lat + lat_span, 90) / self.tile_deg))
+        low_col = int(math.floor((lng - lng_span) / self.tile_deg))
+        high_col = int(math.floor((lng + lng_span) / self.tile_deg))
+        if (high_row - low_row + 1) * (high_col - low_col + 1) > self.max_tiles:
+            return None
+        return sorted({
+            self._tile((row + 0.5) * self.tile_deg, (col + 0.5) * self.tile_deg)
+            for row in range(low_row, high_row + 1)
+            for col in range(low_col, high_col + 1)
+        })
+
+    def _entry(self, lat, lng, radius_km, filters):
+        """Cache key, cell center, covered radius and tile keys of a search"""
+        row, col = int(math.floor(lat / self.cell_deg)), int(math.floor(lng / self.cell_deg))
+        center_lat, center_lng = (row + 0.5) * self.cell_deg, (col + 0.5) * self.cell_deg
+        radius_q = math.ceil(radius_km / self.radius_step_km) * self.radius_step_km
+        # Any center inside the cell is within half a cell diagonal of the cell center
+        half_diagonal_km = self.cell_deg * KM_PER_DEGREE * math.sqrt(2) / 2
+        covered_km = radius_q + half_diagonal_km
+
+        digest = hashlib.md5(json.dumps(filters, sort_keys=True).encode()).hexdigest()[:12]
+        key = f"classroom_geo:{row}:{col}:{radius_q}:{digest}"
+        tiles = self._tiles_covering(center_lat, center_lng, covered_km)
+        tile_keys = [_tile_key(*tile) for tile in tiles] if tiles is not None else None
+        return key, (center_lat, center_lng), covered_km, tile_keys
+
+    def _load_candidates(self, center, covered_km, filters):
+        geo_near = {
+            "near": {"type": "Point", "coordinates": [center[1], center[0]]},
+            "distanceField": "distance",
+            "maxDistance": covered_km * 1000,
+            "spherical": True,
+            "key": "location",
+            "query": filters_query(filters),
+        }
+        documents = list(get_classroom_collection().aggregate([
+            {"$geoNear": geo_near},
+            {"$limit": self.max_candidates + 1},
+            {"$project": {"location": 1, "price_per_hour": 1, "amenities": 1}}
+        ]))
+        if len(documents) > self.max_candidates:
+            return None
+        candidates = []
+        for document in documents:
+            lng, lat = document["location"]["coordinates"]
+            amenities = document.get("amenities")
+            candidates.append((
+                str(document["_id"]), float(lat), float(lng),
+                price_as_float(document.get("price_per_hour")),
+                tuple(amenities) if isinstance(amenities, list) else ()
+            ))
+        return candidates
+
+    def search(self, lat, lng, radius_km, limit, cursor=None, filters=None, facets=False):
+        """
+        Same contract as geo.search_nearby, answered from the cache when possible
+        Returns:
+            (classrooms, next cursor, facets), or None when the search is not cacheable
+        """
+        if self.ttl <= 0:
+            return None
+        filters = filters or {}
+        key, center, covered_km, tile_keys = self._entry(lat, lng, radius_km, filters)
+        if tile_keys is None:
+            _incr("bypasses")
+            return None
+
+        values = cache.get_many([key] + tile_keys)
+        versions = {tile_key: values.get(tile_key, 0) for tile_key in tile_keys}
+        entry = values.get(key)
+        if entry is not None and entry["versions"] == versions:
+            _incr("hits")
+        else:
+            _incr("stale" if entry is not None else "misses")
+            # Versions are read before loading, a change made meanwhile leaves the entry stale
+            entry = {"versions": versions, "candidates": self._load_candidates(center, covered_km, filters)}
+            cache.set(key, entry, self.ttl)
+
+        if entry["candidates"] is None:
+            _incr("bypasses")
+            return None
+        return self._answer(entry["candidates"], lat, lng, radius_km, limit, cursor, facets)
+
+    def _answer(self, candidates, lat, lng, radius_km, limit, cursor, facets):
+        if candidates:
+            distances = haversine_km(
+                lat, lng,
+                np.fromiter((candidate[1] for candidate in candidates), dtype=np.float64, count=len(candidates)),
+                np.fromiter((candidate[2] for candidate in candidates), dtype=np.float64, count=len(candidates))
+            ) * 1000
+        else:
+            distances = np.empty(0)
+        matches = sorted(
+            (distance, candidate)
+            for distance, candidate in zip(distances.tolist(), candidates)
+            if distance <= radius_km * 1000
+        )
+
+        facet_counts = count_facets([(candidate[3], candidate[4]) for _, candidate in matches]) if facets else None
+
+        previous = decode_nearby_cursor(lat, lng, cursor) if cursor else None
+        if previous is not None:
+            seen = set(previous[1])
+            matches = [
+                (distance, candidate) for distance, candidate in matches
+                if distance > previous[0] or (distance == previous[0] and candidate[0] not in seen)
+            ]
+        has_more = len(matches) > limit
+        matches = matches[:limit]
+
+        documents = {
+            str(document["_id"]): document
+            for document in get_classroom_collection().find(
+                {"_id": {"$in": [ObjectId(candidate[0]) for _, candidate in matches]}}
+            )
+        } if matches else {}
+        classrooms = []
+        for distance, candidate in matches:
+            document = documents.get(candidate[0])
+            if document is not None:
+                classroom = classroom_from_document(document)
+                classroom.distance = distance / 1000
+                classrooms.append(classroom)
+
+        next_cursor = None
+        if has_more:
+            page = [(candidate[0], distance) for distance, candidate in matches]
+            next_cursor = encode_nearby_cursor(lat, lng, page, previous)
+        return classrooms, next_cursor, facet_counts
+
+    def invalidate_location(self, location):
+        """Invalidate every cached search overlapping a classroom location"""
+        self.invalidate_locations([location])
+
+    def invalidate_locations(self, locations):
+        """Invalidate the searches overlapping any of the locations, bumping each tile once"""
+        tiles = set()
+        for location in locations:
+            try:
+                lng, lat = location["coordinates"]
+                tiles.add(self._tile(float(lat), float(lng)))
+            except (KeyError, TypeError, ValueError):
+                continue
+        for tile in tiles:
+            key = _tile_key(*tile)
+            cache.add(key, 0, None)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, None)
+        if tiles:
+            _incr("invalidations", len(tiles))
+
+
+nearby_cache = NearbyCache()
@@ -0,0 +1,57 @@
+import logging
+
+from backend.pagination import keyset_cursor, keyset_filter, keyset_sort
+from .geo import classroom_from_document, get_classroom_collection
+
+logger = logging.getLogger(__name__)
+
+# Document fields read by serializer fields that are not model fields
+SERIALIZER_FIELD_SOURCES = {
+    'school': ['school_id'],
+    'school_name': ['school_id'],
+    'is_owned': ['school_id'],
+    'thumbnail': ['images'],
+    'distance': [],
+}
+
+
+def projection_for(field_names):
+    """
+    MongoDB projection loading only what the given serializer fields read.
+    created_at is always included since pages are keyed on it.
+    """
+    projection = {"created_at": 1}
+    for name in field_names:
+        for source in SERIALIZER_FIELD_SOURCES.get(name, [name]):
+            projection[source] = 1
+    if 'thumbnail' in field_names and 'images' not in field_names:
+        # Only the first image is shown on a card
+        projection["images"] = {"$slice": 1}
+    return projection
+
+
+def list_classrooms(query, limit, cursor=None, field_names=None):
+    """
+    One page of classrooms matching a MongoDB query, newest first, keyed on
+    (created_at, _id) so every page is a single indexed range scan
+    Args:
+        field_names: serializer fields that will be rendered, the documents
+            are projected to them and other model fields stay deferred
+    Returns:
+        (list of Classroom, next cursor or None)
+    Raises:
+        ValueError: if the cursor is malformed
+    """
+    if cursor:
+        query = {"$and": [query, keyset_filter(cursor, "created_at")]}
+    projection = projection_for(field_names) if field_names is not None else None
+
+    documents = list(
+        get_classroom_collection().find(query, projection).sort(keyset_sort("created_at")).limit(limit + 1)
+    )
+    has_more = len(documents) > limit
+    documents = documents[:limit]
+
+    classrooms = [classroom_from_document(document, projected=projection is not None) for document in documents]
+    next_cursor = keyset_cursor(documents[-1], "created_at") if has_more else None
+    return classrooms, next_cursor
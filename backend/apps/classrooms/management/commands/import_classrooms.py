@@ -0,0 +1,68 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.apps.authentication.models import User
+from backend.apps.classrooms.bulk import FORMATS, export_csv, export_documents, export_ndjson, import_classrooms
+
+
+class Command(BaseCommand):
+    help = (
+        'Import classrooms of a school from an NDJSON or CSV file, validated per row '
+        'and inserted in batches, or export them with --export'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to read, or write with --export; '-' for stdin/stdout")
+        parser.add_argument('--school', required=True, help='Id or email of the owning school user')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='File format, guessed from the extension when omitted (default ndjson)'
+        )
+        parser.add_argument('--export', action='store_true', help="Write the school's classrooms instead")
+
+    def _school(self, value):
+        lookup = {'email': value} if '@' in value else {'pk': value}
+        try:
+            school = User.objects.select_related('school_profile').get(**lookup)
+        except (User.DoesNotExist, ValueError):
+            raise CommandError(f'User {value} not found')
+        if not hasattr(school, 'school_profile'):
+            raise CommandError(f'User {value} is not a school')
+        return school
+
+    def handle(self, *args, **options):
+        school = self._school(options['school'])
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+
+        if options['export']:
+            documents = export_documents({"school_id": school.id})
+            chunks = export_csv(documents) if file_format == 'csv' else export_ndjson(documents)
+            target = sys.stdout if path == '-' else open(path, 'w', encoding='utf-8', newline='')
+            try:
+                for chunk in chunks:
+                    target.write(chunk)
+            finally:
+                if target is not sys.stdout:
+                    target.close()
+            return
+
+        started = time.monotonic()
+        source = sys.stdin if path == '-' else open(path, encoding='utf-8-sig', newline='')
+        try:
+            report = import_classrooms(source, file_format, school.id)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+        for error in report.errors:
+            self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'], default=str)}")
+        if report.errors and report.failed > len(report.errors):
+            self.stderr.write(f'... {report.failed - len(report.errors)} more failed rows')
+        self.stdout.write(
+            f'Imported {report.inserted} of {report.rows} classrooms for {school.email} '
+            f'in {time.monotonic() - started:.2f}s, {report.failed} failed'
+        )
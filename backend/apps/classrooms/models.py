@@ -26,12 +26,5 @@ class Classroom(models.Model):
           
         ]
     
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-       # debug the 2dsphere index creation
-        from django.db import connections
-        db = connections['mongodb'].connection
-        db['classrooms'].create_index([("location", "2dsphere")])
-    
     def __str__(self):
         return f"{self.name} at {self.school.school_name}"
\ No newline at end of file
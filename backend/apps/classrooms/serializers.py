@@ -1,9 +1,11 @@
 from rest_framework import serializers
 from .models import Classroom
 from backend.apps.authentication.serializers import UserProfileSerializer
+from backend.prefetch import CrossDatabaseListSerializer
+from backend.serializers import SparseFieldsetMixin
 from bson.objectid import ObjectId
 
-class ClassroomSerializer(serializers.ModelSerializer):
+class ClassroomSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     school = UserProfileSerializer(read_only=True)
     distance = serializers.SerializerMethodField()
     is_owned = serializers.SerializerMethodField()
@@ -16,6 +18,8 @@ class ClassroomSerializer(serializers.ModelSerializer):
             'distance', 'is_owned', 'created_at', 'updated_at'
         ]
         read_only_fields = ['school', 'created_at', 'updated_at']
+        list_serializer_class = CrossDatabaseListSerializer
+        prefetch_across = ['school']
     
     def get_distance(self, obj):
         # Returns the distance that was calculated in the view
@@ -26,9 +30,31 @@ class ClassroomSerializer(serializers.ModelSerializer):
     def get_is_owned(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.school == request.user
+            return obj.school_id == request.user.pk
         return False
 
+class ClassroomCardSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Compact classroom representation for list screens"""
+    school_name = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Classroom
+        fields = [
+            '_id', 'name', 'school_name', 'capacity', 'price_per_hour',
+            'address', 'is_available', 'thumbnail', 'created_at'
+        ]
+        list_serializer_class = CrossDatabaseListSerializer
+        prefetch_across = ['school']
+    
+    def get_school_name(self, obj):
+        if hasattr(obj.school, 'school_profile'):
+            return obj.school.school_profile.school_name
+        return obj.school.full_name
+    
+    def get_thumbnail(self, obj):
+        return obj.images[0] if obj.images else None
+
 class ClassroomCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Classroom
@@ -0,0 +1,33 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .models import Classroom
+from .geo import document_from_classroom
+from .geo_cache import nearby_cache
+from .snapshot import coordinate_snapshot
+from .spatial_index import classroom_index
+
+
+@receiver(post_init, sender=Classroom)
+def remember_location(sender, instance, **kwargs):
+    # Cached searches around the previous location go stale when a classroom moves.
+    # Read from __dict__ so instances loaded with .only() do not fetch a deferred location.
+    instance._original_location = instance.__dict__.get('location')
+
+
+@receiver(post_save, sender=Classroom)
+def refresh_classroom_location(sender, instance, **kwargs):
+    coordinate_snapshot.upsert(instance._id, instance.location)
+    classroom_index.upsert(document_from_classroom(instance))
+
+    nearby_cache.invalidate_location(instance.location)
+    if instance._original_location not in (None, instance.location):
+        nearby_cache.invalidate_location(instance._original_location)
+    instance._original_location = instance.location
+
+
+@receiver(post_delete, sender=Classroom)
+def drop_classroom_location(sender, instance, **kwargs):
+    coordinate_snapshot.remove(instance._id)
+    classroom_index.remove(instance._id)
+    nearby_cache.invalidate_location(instance.location)
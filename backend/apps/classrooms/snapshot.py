@@ -0,0 +1,158 @@
+import logging
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .geo import get_classroom_collection
+
+logger = logging.getLogger(__name__)
+
+# Radius $geoNear uses for GeoJSON points (WGS84 equatorial), so distances agree with it
+EARTH_RADIUS_KM = 6378.1
+
+
+def _coordinates(location):
+    """(lat, lng) of a GeoJSON point, None if it is not a valid one"""
+    try:
+        lng, lat = location['coordinates']
+        lat, lng = float(lat), float(lng)
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Distances in km from one point to arrays of points"""
+    lat, lng = np.radians(lat), np.radians(lng)
+    lats, lngs = np.radians(lats), np.radians(lngs)
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lngs - lng) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class CoordinateSnapshot:
+    """
+    Array-backed copy of every classroom location, used when the $geoNear
+    search is unavailable.
+
+    Ids and float64 lat/lng arrays are loaded from MongoDB on first use,
+    patched in place on Classroom save/delete in this process and fully
+    reloaded after CLASSROOM_SNAPSHOT_TTL seconds to pick up changes made by
+    other workers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._ids = []
+        self._slots = {}
+        self._lats = np.empty(0)
+        self._lngs = np.empty(0)
+        self._size = 0
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'CLASSROOM_SNAPSHOT_TTL', 300)
+
+    def _load(self):
+        ids, lats, lngs = [], [], []
+        skipped = 0
+        for document in get_classroom_collection().find({}, {"location": 1}):
+            point = _coordinates(document.get("location"))
+            if point is None:
+                skipped += 1
+                continue
+            ids.append(str(document["_id"]))
+            lats.append(point[0])
+            lngs.append(point[1])
+        if skipped:
+            logger.warning(f"Skipped {skipped} classrooms without a valid location")
+
+        self._ids = ids
+        self._slots = {classroom_id: slot for slot, classroom_id in enumerate(ids)}
+        self._lats = np.array(lats, dtype=np.float64)
+        self._lngs = np.array(lngs, dtype=np.float64)
+        self._size = len(ids)
+        self._loaded_at = time.monotonic()
+        logger.info(f"Loaded coordinate snapshot of {self._size} classrooms")
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+            with self._lock:
+                if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+                    self._load()
+
+    def upsert(self, classroom_id, location):
+        """Add or move one classroom, a no-op until the snapshot is loaded"""
+        point = _coordinates(location)
+        if point is None:
+            self.remove(classroom_id)
+            return
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            classroom_id = str(classroom_id)
+            slot = self._slots.get(classroom_id)
+            if slot is None:
+                slot = self._size
+                if slot == len(self._lats):
+                    # Grow geometrically so repeated inserts stay amortized O(1)
+                    capacity = max(16, 2 * slot)
+                    self._lats = np.resize(self._lats, capacity)
+                    self._lngs = np.resize(self._lngs, capacity)
+                self._ids.append(classroom_id)
+                self._slots[classroom_id] = slot
+                self._size += 1
+            self._lats[slot], self._lngs[slot] = point
+
+    def remove(self, classroom_id):
+        """Drop one classroom by moving the last slot into its place"""
+        with self._lock:
+            slot = self._slots.pop(str(classroom_id), None)
+            if slot is None:
+                return
+            last = self._size - 1
+            if slot != last:
+                moved_id = self._ids[last]
+                self._ids[slot] = moved_id
+                self._slots[moved_id] = slot
+                self._lats[slot] = self._lats[last]
+                self._lngs[slot] = self._lngs[last]
+            self._ids.pop()
+            self._size = last
+
+    def nearest(self, lat, lng, radius_km, limit=None):
+        """
+        Classrooms within radius_km of (lat, lng), nearest first
+        Returns:
+            list of (classroom id, distance in km), at most limit long
+        """
+        self._ensure_loaded()
+        with self._lock:
+            lats = self._lats[:self._size]
+            lngs = self._lngs[:self._size]
+            ids = self._ids
+
+            # Bounding box prefilter, longitude window widens towards the poles
+            angular_radius = radius_km / EARTH_RADIUS_KM
+            lat_span = np.degrees(angular_radius)
+            sin_radius, cos_lat = np.sin(min(angular_radius, np.pi / 2)), np.cos(np.radians(lat))
+            lng_span = 180.0 if sin_radius >= cos_lat else np.degrees(np.arcsin(sin_radius / cos_lat))
+            lng_offset = np.abs((lngs - lng + 180.0) % 360.0 - 180.0)
+            candidates = np.flatnonzero((np.abs(lats - lat) <= lat_span) & (lng_offset <= lng_span))
+
+            distances = haversine_km(lat, lng, lats[candidates], lngs[candidates])
+            within = distances <= radius_km
+            candidates, distances = candidates[within], distances[within]
+
+            if limit is not None and len(candidates) > limit:
+                top = np.argpartition(distances, limit - 1)[:limit]
+                candidates, distances = candidates[top], distances[top]
+            order = np.argsort(distances, kind='stable')
+            return [(ids[candidates[i]], float(distances[i])) for i in order]
+
+
+coordinate_snapshot = CoordinateSnapshot()
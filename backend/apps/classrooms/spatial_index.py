@@ -0,0 +1,371 @@
+import logging
+import math
+import threading
+import time
+
+import numpy as np
+from bson import ObjectId
+from django.conf import settings
+
+from .geo import classroom_from_document, count_facets, get_classroom_collection, price_as_float
+from .snapshot import EARTH_RADIUS_KM, haversine_km
+
+logger = logging.getLogger(__name__)
+
+# Fields compared by the consistency check, a change in any of them is a stale entry
+FINGERPRINT_FIELDS = ("location", "is_available", "capacity", "price_per_hour", "updated_at")
+
+
+def _point(document):
+    try:
+        lng, lat = document["location"]["coordinates"]
+        lat, lng = float(lat), float(lng)
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+def _fingerprint(document):
+    values = []
+    for name in FINGERPRINT_FIELDS:
+        value = document.get(name)
+        if name == "price_per_hour":
+            value = price_as_float(value)
+        elif name == "location":
+            value = _point(document)
+        elif name == "updated_at" and value is not None:
+            value = value.replace(tzinfo=None, microsecond=value.microsecond // 1000 * 1000)
+        values.append(value)
+    return tuple(values)
+
+
+def matches_filters(entry, filters):
+    """Whether an indexed classroom passes parse_search_filters output"""
+    if 'is_available' in filters and entry.is_available != filters['is_available']:
+        return False
+    if 'min_capacity' in filters and (entry.capacity is None or entry.capacity < filters['min_capacity']):
+        return False
+    if 'max_capacity' in filters and (entry.capacity is None or entry.capacity > filters['max_capacity']):
+        return False
+    if 'min_price' in filters and (entry.price is None or entry.price < filters['min_price']):
+        return False
+    if 'max_price' in filters and (entry.price is None or entry.price > filters['max_price']):
+        return False
+    if filters.get('amenities'):
+        wanted = set(filters['amenities'])
+        if filters['amenities_match'] == 'all' and not wanted <= entry.amenities:
+            return False
+        if filters['amenities_match'] == 'any' and not wanted & entry.amenities:
+            return False
+    return True
+
+
+class IndexedClassroom:
+    __slots__ = (
+        "id", "lat", "lng", "cell", "is_available", "capacity", "price", "amenities", "document", "fingerprint"
+    )
+
+    def __init__(self, classroom_id, point, cell, document):
+        self.id = classroom_id
+        self.lat, self.lng = point
+        self.cell = cell
+        self.is_available = document.get("is_available")
+        self.capacity = document.get("capacity")
+        self.price = price_as_float(document.get("price_per_hour"))
+        amenities = document.get("amenities")
+        self.amenities = frozenset(
+            amenity for amenity in amenities if isinstance(amenity, str)
+        ) if isinstance(amenities, list) else frozenset()
+        self.document = document
+        self.fingerprint = _fingerprint(document)
+
+
+class ClassroomGridIndex:
+    """
+    In-process spatial index over classroom documents, bucketed in a
+    latitude/longitude grid of CLASSROOM_INDEX_CELL_DEG degree cells.
+
+    The index holds the full documents, so nearby searches are answered
+    without a MongoDB round trip. It is loaded on first use, patched by
+    Classroom signals and by the direct collection writes of the detail
+    view, and compared against MongoDB every CLASSROOM_INDEX_VERIFY_INTERVAL
+    seconds in the background to pick up writes made by other workers.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._cells = {}
+        self._loaded = False
+        self._verified_at = 0
+        self._verifying = False
+
+    @property
+    def cell_deg(self):
+        return getattr(settings, 'CLASSROOM_INDEX_CELL_DEG', 0.25)
+
+    @property
+    def verify_interval(self):
+        return getattr(settings, 'CLASSROOM_INDEX_VERIFY_INTERVAL', 300)
+
+    @property
+    def rows(self):
+        return math.ceil(180 / self.cell_deg)
+
+    @property
+    def cols(self):
+        return math.ceil(360 / self.cell_deg)
+
+    def _cell(self, lat, lng):
+        row = min(int((lat + 90) // self.cell_deg), self.rows - 1)
+        col = int((lng + 180) // self.cell_deg) % self.cols
+        return row, col
+
+    # Maintenance
+
+    def load(self):
+        """(Re)build the whole index from MongoDB"""
+        documents = list(get_classroom_collection().find({}))
+        with self._lock:
+            self._entries = {}
+            self._cells = {}
+            for document in documents:
+                self._insert(document)
+            self._loaded = True
+            self._verified_at = time.monotonic()
+        logger.info(f"Loaded classroom grid index with {len(self._entries)} classrooms")
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.load()
+        elif time.monotonic() - self._verified_at > self.verify_interval and not self._verifying:
+            self._verifying = True
+            threading.Thread(target=self._verify_in_background, daemon=True).start()
+
+    def _verify_in_background(self):
+        try:
+            self.check_consistency(repair=True)
+        except Exception as e:
+            logger.error(f"Classroom grid index consistency check failed: {str(e)}")
+        finally:
+            self._verified_at = time.monotonic()
+            self._verifying = False
+
+    def _insert(self, document):
+        classroom_id = str(document["_id"])
+        self._remove(classroom_id)
+        point = _point(document)
+        if point is None:
+            return
+        cell = self._cell(*point)
+        self._entries[classroom_id] = IndexedClassroom(classroom_id, point, cell, document)
+        self._cells.setdefault(cell, set()).add(classroom_id)
+
+    def _remove(self, classroom_id):
+        entry = self._entries.pop(classroom_id, None)
+        if entry is not None:
+            members = self._cells[entry.cell]
+            members.discard(classroom_id)
+            if not members:
+                del self._cells[entry.cell]
+
+    def upsert(self, document):
+        """Index or re-index one classroom document, a no-op until loaded"""
+        with self._lock:
+            if self._loaded:
+                self._insert(document)
+
+    def remove(self, classroom_id):
+        with self._lock:
+            self._remove(str(classroom_id))
+
+    def set_available(self, classroom_id, is_available):
+        """Mirror a direct is_available update of the collection"""
+        with self._lock:
+            entry = self._entries.get(str(classroom_id))
+            if entry is not None:
+                self._insert(dict(entry.document, is_available=is_available))
+
+    def check_consistency(self, repair=False):
+        """
+        Compare the index against MongoDB
+        Returns:
+            dict with the number of checked documents and the ids missing from
+            the index, stale in it and extra in it
+        """
+        projection = {name: 1 for name in FINGERPRINT_FIELDS}
+        fingerprints = {
+            str(document["_id"]): _fingerprint(document)
+            for document in get_classroom_collection().find({}, projection)
+        }
+        with self._lock:
+            indexed = {classroom_id: entry.fingerprint for classroom_id, entry in self._entries.items()}
+
+        # Classrooms without a valid location are never indexed
+        missing = [
+            classroom_id for classroom_id, fingerprint in fingerprints.items()
+            if classroom_id not in indexed and fingerprint[0] is not None
+        ]
+        stale = [
+            classroom_id for classroom_id, fingerprint in fingerprints.items()
+            if classroom_id in indexed and indexed[classroom_id] != fingerprint
+        ]
+        extra = [classroom_id for classroom_id in indexed if classroom_id not in fingerprints]
+        report = {"checked": len(fingerprints), "missing": missing, "stale": stale, "extra": extra}
+
+        if repair and (missing or stale or extra):
+            refetch = [ObjectId(classroom_id) for classroom_id in missing + stale]
+            documents = list(get_classroom_collection().find({"_id": {"$in": refetch}})) if refetch else []
+            with self._lock:
+                for classroom_id in stale + extra:
+                    self._remove(classroom_id)
+                for document in documents:
+                    self._insert(document)
+            logger.warning(
+                f"Repaired classroom grid index: {len(missing)} missing, "
+                f"{len(stale)} stale, {len(extra)} extra"
+            )
+        return report
+
+    # Queries
+
+    def _scan_cells(self, row_range, col_range):
+        """Ids in a block of cells, or in all cells when that is cheaper"""
+        rows = range(max(row_range[0], 0), min(row_range[1], self.rows - 1) + 1)
+        if col_range is None:
+            cols = range(self.cols)
+        else:
+            cols = [col % self.cols for col in range(col_range[0], col_range[1] + 1)]
+        if len(rows) * len(cols) >= len(self._cells):
+            wanted_rows = set(rows)
+            wanted_cols = set(cols)
+            return [
+                classroom_id
+                for (row, col), members in self._cells.items()
+                if row in wanted_rows and col in wanted_cols
+                for classroom_id in members
+            ]
+        return [
+            classroom_id
+            for row in rows for col in cols
+            for classroom_id in self._cells.get((row, col), ())
+        ]
+
+    def _measure(self, lat, lng, ids, filters):
+        entries = [self._entries[classroom_id] for classroom_id in ids]
+        entries = [entry for entry in entries if matches_filters(entry, filters)]
+        if not entries:
+            return []
+        distances = haversine_km(
+            lat, lng,
+            np.fromiter((entry.lat for entry in entries), dtype=np.float64, count=len(entries)),
+            np.fromiter((entry.lng for entry in entries), dtype=np.float64, count=len(entries))
+        )
+        return sorted(zip(distances.tolist(), (entry.id for entry in entries)))
+
+    def radius(self, lat, lng, radius_km, filters=None, limit=None, after=None):
+        """
+        Indexed classrooms within radius_km of (lat, lng), nearest first
+        Args:
+            after: (distance in meters, ids) to resume after, as stored in a cursor
+        Returns:
+            list of (distance in km, classroom id)
+        """
+        self._ensure_loaded()
+        angular_radius = radius_km / EARTH_RADIUS_KM
+        lat_span = math.degrees(angular_radius)
+        sin_radius, cos_lat = math.sin(min(angular_radius, math.pi / 2)), math.cos(math.radians(lat))
+        lng_span = None if sin_radius >= cos_lat else math.degrees(math.asin(sin_radius / cos_lat))
+
+        low_row, low_col = self._cell(max(lat - lat_span, -90), lng)
+        high_row, _ = self._cell(min(lat + lat_span, 90), lng)
+        col_range = None
+        if lng_span is not None:
+            # Unwrapped columns, _scan_cells wraps them around the antimeridian
+            low = int((lng - lng_span + 180) // self.cell_deg)
+            high = int((lng + lng_span + 180) // self.cell_deg)
+            col_range = (low, high) if high - low + 1 < self.cols else None
+
+        with self._lock:
+            results = [
+                (distance, classroom_id)
+                for distance, classroom_id in self._measure(
+                    lat, lng, self._scan_cells((low_row, high_row), col_range), filters or {}
+                )
+                if distance <= radius_km
+            ]
+        if after is not None:
+            last_distance, seen = after[0], set(after[1])
+            results = [
+                (distance, classroom_id) for distance, classroom_id in results
+                if distance * 1000 > last_distance
+                or (distance * 1000 == last_distance and classroom_id not in seen)
+            ]
+        return results[:limit] if limit is not None else results
+
+    def nearest(self, lat, lng, k, filters=None, max_km=None):
+        """
+        k nearest indexed classrooms, searched in rings of cells around
+        (lat, lng) until no unsearched cell can hold a closer one
+        Returns:
+            list of (distance in km, classroom id)
+        """
+        self._ensure_loaded()
+        filters = filters or {}
+        row, col = self._cell(lat, lng)
+
+        with self._lock:
+            ring = 0
+            found = []
+            while True:
+                candidates = self._scan_cells(
+                    (row - ring, row + ring),
+                    (col - ring, col + ring) if 2 * ring + 1 < self.cols else None
+                )
+                found = self._measure(lat, lng, candidates, filters)
+                if max_km is not None:
+                    found = [item for item in found if item[0] <= max_km]
+
+                covers_all = row - ring <= 0 and row + ring >= self.rows - 1 and 2 * ring + 1 >= self.cols
+                if covers_all:
+                    break
+
+                # Anything outside the searched block is at least ring cells away
+                gap = ring * self.cell_deg
+                lat_bound = EARTH_RADIUS_KM * math.radians(gap)
+                max_abs_lat = min(abs(lat) + gap + self.cell_deg, 90)
+                lng_bound = 2 * EARTH_RADIUS_KM * math.asin(
+                    math.cos(math.radians(max_abs_lat)) * math.sin(math.radians(min(gap, 180) / 2))
+                )
+                lower_bound = min(lat_bound, lng_bound)
+                if len(found) >= k and found[k - 1][0] <= lower_bound:
+                    break
+                if max_km is not None and lower_bound > max_km:
+                    break
+                ring = ring + 1 if ring < 4 else ring * 2
+            return found[:k]
+
+    def facet_counts(self, results):
+        """Amenity and price bucket counts of (distance, id) results, as format_facets"""
+        with self._lock:
+            entries = [self._entries.get(classroom_id) for _, classroom_id in results]
+        return count_facets([(entry.price, entry.amenities) for entry in entries if entry is not None])
+
+    def hydrate(self, results):
+        """Classroom instances with a distance attribute for (distance, id) results"""
+        classrooms = []
+        with self._lock:
+            documents = [(distance, self._entries.get(classroom_id)) for distance, classroom_id in results]
+        for distance, entry in documents:
+            if entry is not None:
+                classroom = classroom_from_document(entry.document)
+                classroom.distance = distance
+                classrooms.append(classroom)
+        return classrooms
+
+
+classroom_index = ClassroomGridIndex()
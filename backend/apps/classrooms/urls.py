@@ -2,11 +2,19 @@ from django.urls import path
 from .views import (
     ClassroomView, 
     ClassroomDetailView, 
-    NearbyClassroomsView
+    ClassroomAvailabilityView,
+    ClassroomBulkImportView,
+    ClassroomExportView,
+    NearbyClassroomsView,
+    NearbyCacheStatsView
 )
 
 urlpatterns = [
     path('', ClassroomView.as_view(), name='classroom-list'),
+    path('bulk/', ClassroomBulkImportView.as_view(), name='classroom-bulk-import'),
+    path('export/', ClassroomExportView.as_view(), name='classroom-export'),
     path('nearby/', NearbyClassroomsView.as_view(), name='nearby-classrooms'),
+    path('nearby/cache-stats/', NearbyCacheStatsView.as_view(), name='nearby-cache-stats'),
     path('<str:pk>/', ClassroomDetailView.as_view(), name='classroom-detail'),
+    path('<str:pk>/availability/', ClassroomAvailabilityView.as_view(), name='classroom-availability'),
 ]
\ No newline at end of file
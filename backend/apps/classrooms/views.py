@@ -1,26 +1,37 @@
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from math import radians, sin, cos, sqrt, atan2
 from django.utils import timezone
 
-from backend.apps.authentication.permissions import IsSchoolUser
+from backend.apps.authentication.permissions import IsAdminUser, IsSchoolUser
 from .models import Classroom
-from .serializers import ClassroomSerializer
+from .serializers import ClassroomCardSerializer, ClassroomSerializer
+from .geo import (
+    DEFAULT_LIMIT, MAX_LIMIT, decode_nearby_cursor, encode_nearby_cursor, filters_query,
+    get_classroom_collection, parse_search_filters, search_nearby
+)
+from .snapshot import coordinate_snapshot
+from .spatial_index import classroom_index
+from .geo_cache import nearby_cache
+from .listing import list_classrooms
+from django.conf import settings
+from backend.pagination import parse_fields, parse_limit
 from django.db import connections
 from bson.objectid import ObjectId
+from bson.errors import InvalidId
+import codecs
 import json
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
+from django.utils.dateparse import parse_date, parse_datetime
 from backend.apps.authentication.models import User
 
 logger = logging.getLogger(__name__)
 
 class NearbyClassroomsView(APIView):
     permission_classes = [IsAuthenticated]
-    EARTH_RADIUS_KM = 6371 
 
     def get(self, request):
         try:
@@ -28,41 +39,36 @@ class NearbyClassroomsView(APIView):
             lng = float(request.query_params.get('lng'))
             distance = float(request.query_params.get('distance', 10))  # Default 10km radius
             
-            # Try MongoDB geospatial query first
+            limit = parse_limit(request.query_params.get('limit'), DEFAULT_LIMIT, MAX_LIMIT)
+            cursor = request.query_params.get('cursor')
+            filters = parse_search_filters(request.query_params)
+            
+            # k nearest classrooms within the radius, as a single unpaged result
+            nearest = request.query_params.get('k')
+            if nearest is not None:
+                limit, cursor = parse_limit(nearest, DEFAULT_LIMIT, MAX_LIMIT), None
+            
+            # Facet counts describe the whole result set, so only the first page carries them
+            facets = not cursor and request.query_params.get('facets', 'true').lower() != 'false'
+            
+            if getattr(settings, 'CLASSROOM_MEMORY_INDEX', False):
+                return self._search_memory_index(
+                    lat, lng, distance, limit, cursor, filters, nearest is not None, facets
+                )
+            
+            # Documents, distances, order and facets come back from a single $geoNear aggregation,
+            # or from the candidates cached for the caller's cell
             try:
-                db = connections['mongodb'].connection
-                collection = db['classrooms']
-                
-               
-                if 'location_2dsphere' not in collection.index_information():
-                    collection.create_index([('location', '2dsphere')], name='location_2dsphere')
-                
-                
-                results = collection.find({
-                    'location': {
-                        '$nearSphere': {
-                            '$geometry': {
-                                'type': 'Point',
-                                'coordinates': [lng, lat]
-                            },
-                            '$maxDistance': distance * 1000  # meters
-                        }
-                    }
-                })
-                
-                classroom_ids = [str(res['_id']) for res in results]
-                classrooms = Classroom.objects.filter(_id__in=classroom_ids)
-                
-                # Calculate distances for each classroom
-                for classroom in classrooms:
-                    coords = classroom.location['coordinates']
-                    classroom.distance = self._haversine(lat, lng, coords[1], coords[0])
-                
-                classrooms = sorted(classrooms, key=lambda x: x.distance)
+                result = nearby_cache.search(lat, lng, distance, limit, cursor, filters, facets)
+                if result is None:
+                    result = search_nearby(lat, lng, distance, limit, cursor, filters, facets)
+                classrooms, next_cursor, facet_counts = result
                 serializer = ClassroomSerializer(classrooms, many=True)
                 
                 return Response({
                     'results': serializer.data,
+                    'next_cursor': next_cursor,
+                    'facets': facet_counts,
                     'search_metrics': {
                         'center': {'lat': lat, 'lng': lng},
                         'radius_km': distance,
@@ -70,9 +76,12 @@ class NearbyClassroomsView(APIView):
                     }
                 })
                 
+            except ValueError:
+                # Malformed cursor, answered with a 400 below
+                raise
             except Exception as mongo_error:
                 logger.warning(f"MongoDB geospatial query failed, falling back to manual calculation: {str(mongo_error)}")
-                return self._fallback_distance_calculation(lat, lng, distance)
+                return self._fallback_distance_calculation(lat, lng, distance, limit, filters)
                 
         except ValueError as ve:
             return Response(
@@ -86,22 +95,64 @@ class NearbyClassroomsView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    def _fallback_distance_calculation(self, lat, lng, distance):
-        """Manual distance calculation fallback"""
-        classrooms = Classroom.objects.all()
-        results = []
+    def _search_memory_index(self, lat, lng, distance, limit, cursor, filters, nearest, facets):
+        """Answer from the in-process grid index, without a MongoDB round trip"""
+        facet_counts = None
+        if nearest:
+            results = classroom_index.nearest(lat, lng, limit, filters, max_km=distance)
+            has_more, previous = False, None
+            if facets:
+                facet_counts = classroom_index.facet_counts(classroom_index.radius(lat, lng, distance, filters))
+        else:
+            previous = decode_nearby_cursor(lat, lng, cursor) if cursor else None
+            results = classroom_index.radius(
+                lat, lng, distance, filters, None if facets else limit + 1, after=previous
+            )
+            if facets:
+                facet_counts = classroom_index.facet_counts(results)
+            has_more = len(results) > limit
+            results = results[:limit]
         
-        for classroom in classrooms:
-            try:
-                coords = classroom.location['coordinates']
-                dist = self._haversine(lat, lng, coords[1], coords[0])
-                if dist <= distance:
-                    classroom.distance = dist
-                    results.append(classroom)
-            except:
-                continue
+        classrooms = classroom_index.hydrate(results)
+        next_cursor = None
+        if has_more:
+            page = [(classroom_id, dist * 1000) for dist, classroom_id in results]
+            next_cursor = encode_nearby_cursor(lat, lng, page, previous)
+        serializer = ClassroomSerializer(classrooms, many=True)
+        
+        return Response({
+            'results': serializer.data,
+            'next_cursor': next_cursor,
+            'facets': facet_counts,
+            'search_metrics': {
+                'center': {'lat': lat, 'lng': lng},
+                'radius_km': distance,
+                'count': len(classrooms),
+                'source': 'memory_index'
+            }
+        })
+
+    def _fallback_distance_calculation(self, lat, lng, distance, limit=MAX_LIMIT, filters=None):
+        """Vectorized distance calculation over the in-memory coordinate snapshot"""
+        if filters:
+            # The snapshot only holds coordinates, filters are checked with one id-only query
+            nearest = coordinate_snapshot.nearest(lat, lng, distance)
+            query = dict(filters_query(filters), _id={"$in": [ObjectId(classroom_id) for classroom_id, _ in nearest]})
+            matching = {str(document['_id']) for document in get_classroom_collection().find(query, {'_id': 1})}
+            nearest = [item for item in nearest if item[0] in matching][:limit]
+        else:
+            nearest = coordinate_snapshot.nearest(lat, lng, distance, limit)
+        classrooms = {
+            str(classroom._id): classroom
+            for classroom in Classroom.objects.filter(_id__in=[ObjectId(classroom_id) for classroom_id, _ in nearest])
+        }
         
-        results = sorted(results, key=lambda x: x.distance)
+        results = []
+        for classroom_id, dist in nearest:
+            classroom = classrooms.get(classroom_id)
+            if classroom is not None:
+                classroom.distance = dist
+                results.append(classroom)
         serializer = ClassroomSerializer(results, many=True)
         
         return Response({
@@ -114,14 +165,6 @@ class NearbyClassroomsView(APIView):
             'warning': 'Used fallback distance calculation'
         })
 
-    def _haversine(self, lat1, lon1, lat2, lon2):
-        """Calculate distance between two points in kilometers"""
-        lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-        return self.EARTH_RADIUS_KM * 2 * atan2(sqrt(a), sqrt(1-a))
-
 
 class ClassroomView(APIView):
     permission_classes = [IsAuthenticated]
@@ -132,13 +175,37 @@ class ClassroomView(APIView):
         return [IsAuthenticated()]
 
     def get(self, request):
-        if request.user.role == 'school':
-            classrooms = Classroom.objects.filter(school=request.user)
-        else:
-            classrooms = Classroom.objects.filter(is_available=True)
+        """
+        Keyset-paginated classrooms, newest first
+        GET params:
+        - view=card: compact representation for list screens
+        - fields: comma separated fields to return, only those are read from MongoDB
+        - limit, cursor: page size and the next_cursor of the previous page
+        """
+        try:
+            serializer_class = ClassroomCardSerializer if request.query_params.get('view') == 'card' else ClassroomSerializer
+            fields = parse_fields(request.query_params.get('fields'), serializer_class.Meta.fields)
+            limit = parse_limit(request.query_params.get('limit'), DEFAULT_LIMIT, MAX_LIMIT)
+            
+            if request.user.role == 'school':
+                query = {"school_id": request.user.id}
+            else:
+                query = {"is_available": True}
+            
+            classrooms, next_cursor = list_classrooms(
+                query, limit, request.query_params.get('cursor'), fields or serializer_class.Meta.fields
+            )
+        except ValueError as ve:
+            return Response(
+                {"error": f"Invalid parameters: {str(ve)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        serializer = ClassroomSerializer(classrooms, many=True)
-        return Response(serializer.data)
+        serializer = serializer_class(classrooms, many=True, fields=fields, context={'request': request})
+        return Response({
+            'results': serializer.data,
+            'next_cursor': next_cursor
+        })
 
     def post(self, request):
         serializer = ClassroomSerializer(data=request.data)
@@ -226,12 +293,8 @@ class ClassroomDetailView(APIView):
         # 4. Check contracts if making unavailable
         if not new_availability:
             try:
-                from backend.apps.contracts.models import Contract
-                if Contract.objects.filter(
-                    classroom=classroom,
-                    end_date__gte=timezone.now().date(),
-                    status__in=['active', 'pending']
-                ).exists():
+                from backend.apps.contracts.calendar import classroom_booked
+                if classroom_booked(classroom._id):
                     return Response(
                         {"error": "Classroom has active contracts"},
                         status=status.HTTP_400_BAD_REQUEST
@@ -247,6 +310,8 @@ class ClassroomDetailView(APIView):
                 {'_id': ObjectId(clean_pk)},
                 {'$set': {'is_available': new_availability}}
             )
+            classroom_index.set_available(clean_pk, new_availability)
+            nearby_cache.invalidate_location(classroom.location)
             
             # Update Django model
             classroom.is_available = new_availability
@@ -299,11 +364,8 @@ class ClassroomDetailView(APIView):
             
         # Check for active contracts
         try:
-            from backend.apps.contracts.models import Contract
-            if Contract.objects.filter(
-                classroom=classroom,
-                end_date__gte=datetime.now().date()
-            ).exists():
+            from backend.apps.contracts.calendar import classroom_booked
+            if classroom_booked(obj_id):
                 logger.warning(f"Classroom {clean_pk} has active contracts, cannot delete")
                 return Response(
                     {"error": "Cannot delete classroom with active contracts"},
@@ -322,6 +384,8 @@ class ClassroomDetailView(APIView):
                     {"error": "Failed to delete classroom from database"},
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
+            classroom_index.remove(clean_pk)
+            nearby_cache.invalidate_location(classroom.location)
             logger.debug(f"Deleted classroom {clean_pk} from MongoDB")
         except Exception as e:
             logger.error(f"Error deleting from MongoDB: {str(e)}")
@@ -343,4 +407,149 @@ class ClassroomDetailView(APIView):
             return Response(
                 {"error": "Error completing deletion"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+
+
+def _bulk_format(value, default='ndjson'):
+    if value in (None, ''):
+        return default
+    if value not in ('ndjson', 'csv'):
+        raise ValueError("Format must be ndjson or csv")
+    return value
+
+
+class ClassroomBulkImportView(APIView):
+    """
+    Create many classrooms of the requesting school from an NDJSON or CSV
+    body (Content-Type text/csv, or ?input=csv), read as a stream and
+    inserted in batches. Returns a report with per-row errors.
+    """
+    permission_classes = [IsAuthenticated, IsSchoolUser]
+
+    def post(self, request):
+        from .bulk import import_classrooms
+        
+        try:
+            default = 'csv' if request.content_type.startswith('text/csv') else 'ndjson'
+            input_format = _bulk_format(request.query_params.get('input'), default)
+        except ValueError as ve:
+            return Response({"error": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            # The body is decoded line by line, never loaded whole
+            lines = codecs.iterdecode(request.stream or [], 'utf-8-sig')
+            report = import_classrooms(lines, input_format, request.user.id)
+        except UnicodeDecodeError as e:
+            return Response({"error": f"Body must be UTF-8: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Bulk classroom import failed: {str(e)}", exc_info=True)
+            return Response(
+                {"error": "Internal server error"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        
+        if report.inserted:
+            response_status = status.HTTP_201_CREATED
+        elif report.failed:
+            response_status = status.HTTP_400_BAD_REQUEST
+        else:
+            response_status = status.HTTP_200_OK
+        return Response(report.as_dict(), status=response_status)
+
+
+class ClassroomExportView(APIView):
+    """Stream the requesting school's classrooms as NDJSON or CSV (?output=csv)"""
+    permission_classes = [IsAuthenticated, IsSchoolUser]
+
+    def get(self, request):
+        from .bulk import export_csv, export_documents, export_ndjson
+        
+        try:
+            output = _bulk_format(request.query_params.get('output'))
+        except ValueError as ve:
+            return Response({"error": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        documents = export_documents({"school_id": request.user.id})
+        if output == 'csv':
+            response = StreamingHttpResponse(export_csv(documents), content_type='text/csv')
+        else:
+            response = StreamingHttpResponse(export_ndjson(documents), content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="classrooms.{output}"'
+        return response
+
+
+class ClassroomAvailabilityView(APIView):
+    """
+    Booked and free periods of a classroom
+    GET params:
+    - start, end: ISO dates or datetimes (UTC), defaults to the next 30 days
+    - min_hours: only return free periods at least this long
+    """
+    permission_classes = [IsAuthenticated]
+    MAX_RANGE_DAYS = 366
+
+    def _parse_moment(self, value, name):
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                raise ValueError(f"{name} must be an ISO date or datetime")
+            moment = datetime.combine(day, datetime.min.time())
+        return moment
+
+    def get(self, request, pk):
+        from backend.apps.contracts.calendar import as_utc, classroom_availability, weekly_capacity
+        
+        try:
+            classroom_id = ObjectId(pk.rstrip('/'))
+            start = request.query_params.get('start')
+            start = as_utc(self._parse_moment(start, 'start')) if start else datetime.utcnow()
+            end = request.query_params.get('end')
+            end = as_utc(self._parse_moment(end, 'end')) if end else start + timedelta(days=30)
+            if end <= start:
+                raise ValueError("end must be after start")
+            if end - start > timedelta(days=self.MAX_RANGE_DAYS):
+                raise ValueError(f"Range cannot exceed {self.MAX_RANGE_DAYS} days")
+            min_hours = request.query_params.get('min_hours')
+            min_duration = timedelta(hours=float(min_hours)) if min_hours else None
+        except (InvalidId, TypeError, ValueError) as e:
+            return Response(
+                {"error": f"Invalid parameters: {str(e)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if get_classroom_collection().find_one({"_id": classroom_id}, {"_id": 1}) is None:
+            return Response(
+                {"error": "Classroom not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        busy, free = classroom_availability(classroom_id, start, end, min_duration)
+        
+        def period(begin, finish, hours_per_week=None):
+            item = {
+                "start": timezone.make_aware(begin, timezone.utc).isoformat(),
+                "end": timezone.make_aware(finish, timezone.utc).isoformat()
+            }
+            if hours_per_week is not None:
+                item["booked_hours_per_week"] = hours_per_week
+                item["free_hours_per_week"] = max(weekly_capacity() - hours_per_week, 0)
+            return item
+        
+        return Response({
+            "classroom": str(classroom_id),
+            "start": timezone.make_aware(start, timezone.utc).isoformat(),
+            "end": timezone.make_aware(end, timezone.utc).isoformat(),
+            "weekly_hours": weekly_capacity(),
+            "busy": [period(*item) for item in busy],
+            "free": [period(*item) for item in free]
+        })
+
+
+class NearbyCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        """Hit, miss and invalidation counters of the nearby search cache"""
+        from .geo_cache import get_geo_cache_stats
+        return Response(get_geo_cache_stats(), status=status.HTTP_200_OK)
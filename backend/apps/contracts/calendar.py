@@ -0,0 +1,284 @@
+import logging
+import time
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from datetime import datetime
+
+from bson import ObjectId
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from backend.mongo import acquire_lease, get_mongo_db, release_lease
+
+logger = logging.getLogger(__name__)
+
+CONTRACTS_COLLECTION = 'contracts'
+# Contracts holding their weekly hours of the classroom until their end date.
+# Only rejected and cancelled contracts give them back; a completed contract
+# keeps its hours until end_date, like any other.
+BLOCKING_STATUSES = ('processing', 'payment_pending', 'ready_for_enrollment', 'completed')
+
+
+class BookingConflict(Exception):
+    """The classroom has not enough weekly hours left over the requested period"""
+
+    def __init__(self, start, end, hours_per_week):
+        super().__init__(
+            f"Classroom is already booked for {hours_per_week} hours per week "
+            f"from {start.isoformat()} to {end.isoformat()}"
+        )
+        self.start = start
+        self.end = end
+        self.hours_per_week = hours_per_week
+
+
+class CalendarBusy(Exception):
+    """Another booking of the same classroom is in progress"""
+
+
+def as_utc(value):
+    """Naive UTC datetime, as pymongo returns them, from a naive or aware datetime"""
+    if timezone.is_aware(value):
+        value = timezone.make_naive(value, timezone.utc)
+    return value
+
+
+def _calendar_key(classroom_id):
+    return f"classroom_calendar:v2:{classroom_id}"
+
+
+def weekly_capacity():
+    """Hours per week a classroom can be booked for"""
+    return getattr(settings, 'CONTRACT_CLASSROOM_WEEKLY_HOURS', 84)
+
+
+class BookingCalendar:
+    """
+    Bookings of one classroom as a segment list sorted by start, with the
+    running maximum of end times alongside. Each booking holds its
+    contract's hours_per_week of the classroom over its period.
+
+    Contracts only state how many hours per week they need, not which
+    weekly slots, so bookings may overlap as long as the hours booked at
+    any moment stay within the classroom's weekly capacity.
+
+    Bookings starting before a moment are a prefix of the list (one bisect),
+    and walking that prefix backwards can stop as soon as the running
+    maximum end falls before the period start, so finding the overlaps
+    costs O(log n) plus the overlaps found. The running maximum keeps this
+    exact for overlapping bookings.
+    """
+
+    def __init__(self, bookings=()):
+        self._bookings = sorted(bookings)
+        self._starts = []
+        self._max_ends = []
+        self._reindex(0)
+
+    def _reindex(self, position):
+        """Recompute the starts and running maximum ends from position on"""
+        del self._starts[position:]
+        del self._max_ends[position:]
+        latest = self._max_ends[-1] if self._max_ends else None
+        for start, end, _, _ in self._bookings[position:]:
+            latest = end if latest is None or end > latest else latest
+            self._starts.append(start)
+            self._max_ends.append(latest)
+
+    def __len__(self):
+        return len(self._bookings)
+
+    def add(self, start, end, contract_id, hours_per_week):
+        booking = (start, end, str(contract_id), hours_per_week)
+        position = bisect_right(self._bookings, booking)
+        self._bookings.insert(position, booking)
+        self._reindex(position)
+
+    def remove(self, contract_id):
+        contract_id = str(contract_id)
+        for position, booking in enumerate(self._bookings):
+            if booking[2] == contract_id:
+                del self._bookings[position]
+                self._reindex(position)
+                return True
+        return False
+
+    def overlapping(self, start, end):
+        """Bookings overlapping [start, end), latest start first"""
+        position = bisect_left(self._starts, end)
+        found = []
+        for index in range(position - 1, -1, -1):
+            if self._max_ends[index] <= start:
+                break
+            if self._bookings[index][1] > start:
+                found.append(self._bookings[index])
+        return found
+
+    def load(self, start, end, exclude=None):
+        """
+        Periods of constant booked weekly hours within [start, end)
+        Returns:
+            list of (start, end, hours_per_week) with hours_per_week > 0, in order
+        """
+        exclude = str(exclude) if exclude is not None else None
+        changes = {}
+        for booking_start, booking_end, contract_id, hours in self.overlapping(start, end):
+            if contract_id == exclude:
+                continue
+            booking_start, booking_end = max(booking_start, start), min(booking_end, end)
+            changes[booking_start] = changes.get(booking_start, 0) + hours
+            changes[booking_end] = changes.get(booking_end, 0) - hours
+
+        segments = []
+        hours = 0
+        moments = sorted(changes)
+        for moment, following in zip(moments, moments[1:]):
+            hours += changes[moment]
+            if hours <= 0:
+                continue
+            if segments and segments[-1][1] == moment and segments[-1][2] == hours:
+                segments[-1] = (segments[-1][0], following, hours)
+            else:
+                segments.append((moment, following, hours))
+        return segments
+
+    def conflict(self, start, end, hours_per_week, exclude=None, capacity=None):
+        """
+        First period within [start, end) where adding hours_per_week would
+        exceed the weekly capacity, ignoring contract exclude
+        Returns:
+            (start, end, booked hours_per_week) or None
+        """
+        capacity = capacity if capacity is not None else weekly_capacity()
+        if hours_per_week > capacity:
+            return (start, end, 0)
+        for segment in self.load(start, end, exclude):
+            if segment[2] + hours_per_week > capacity:
+                return segment
+        return None
+
+    def booked_after(self, moment):
+        """True if any booking is still running or upcoming at moment"""
+        return bool(self._max_ends) and self._max_ends[-1] > moment
+
+    def free_slots(self, start, end, min_duration=None):
+        """
+        Booked periods and gaps between them within [start, end)
+        Returns:
+            (busy periods as (start, end, booked hours_per_week),
+             free periods as (start, end) with no booking at all)
+        """
+        busy = self.load(start, end)
+
+        free = []
+        cursor = start
+        for busy_start, busy_end, _ in busy + [(end, end, 0)]:
+            if busy_start > cursor and (min_duration is None or busy_start - cursor >= min_duration):
+                free.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+        return busy, free
+
+
+def _load_calendar(classroom_id, start=None, end=None):
+    """
+    Blocking contracts of a classroom that have not ended, or only those
+    overlapping [start, end). Served by the (classroom_id, status, end_date,
+    start_date) index, start_date is filtered on index keys before any
+    contract is fetched.
+    """
+    query = {
+        "classroom_id": ObjectId(str(classroom_id)),
+        "status": {"$in": list(BLOCKING_STATUSES)},
+        "end_date": {"$gt": max(start, datetime.utcnow()) if start else datetime.utcnow()}
+    }
+    if end is not None:
+        query["start_date"] = {"$lt": end}
+    documents = get_mongo_db()[CONTRACTS_COLLECTION].find(
+        query, {"start_date": 1, "end_date": 1, "hours_per_week": 1}
+    )
+    return BookingCalendar(
+        (
+            as_utc(document["start_date"]),
+            as_utc(document["end_date"]),
+            str(document["_id"]),
+            document.get("hours_per_week") or 0
+        )
+        for document in documents
+    )
+
+
+def get_calendar(classroom_id):
+    """
+    Current and upcoming bookings of a classroom, from the cache or rebuilt
+    from MongoDB. Contract signals drop the cached calendar on every change.
+    The rebuilt calendar is only added if no other is cached by then, so a
+    reader that loaded before a booking cannot overwrite the booking's
+    calendar with its older copy.
+    """
+    key = _calendar_key(classroom_id)
+    calendar = cache.get(key)
+    if calendar is None:
+        calendar = _load_calendar(classroom_id)
+        cache.add(key, calendar, getattr(settings, 'CONTRACT_CALENDAR_TTL', 300))
+    return calendar
+
+
+def invalidate_calendar(classroom_id):
+    cache.delete(_calendar_key(classroom_id))
+
+
+@contextmanager
+def booking_lock(classroom_id):
+    """
+    Serialize bookings of one classroom across processes
+    Raises:
+        CalendarBusy: if the lock could not be taken within CONTRACT_BOOKING_LOCK_WAIT seconds
+    """
+    name = f"classroom_booking:{classroom_id}"
+    deadline = time.monotonic() + getattr(settings, 'CONTRACT_BOOKING_LOCK_WAIT', 2)
+    token = acquire_lease(name, getattr(settings, 'CONTRACT_BOOKING_LOCK_TTL', 10))
+    while token is None:
+        if time.monotonic() > deadline:
+            raise CalendarBusy("Another booking of this classroom is in progress, please retry")
+        time.sleep(0.05)
+        token = acquire_lease(name, getattr(settings, 'CONTRACT_BOOKING_LOCK_TTL', 10))
+    try:
+        yield
+    finally:
+        release_lease(name, token)
+
+
+def book_contract(contract, update_fields=None):
+    """
+    Save a contract if its classroom has its hours_per_week left over its
+    whole period. An existing contract does not conflict with its own booking.
+    Raises:
+        BookingConflict: if the overlapping blocking contracts leave too few weekly hours
+        CalendarBusy: if another booking of the classroom holds the lock
+    """
+    classroom_id = contract.classroom_id
+    start, end = as_utc(contract.start_date), as_utc(contract.end_date)
+    with booking_lock(classroom_id):
+        # Checked against MongoDB, never against a possibly stale cached copy,
+        # loading only the contracts overlapping the requested period
+        overlapping = _load_calendar(classroom_id, start, end)
+        segment = overlapping.conflict(start, end, contract.hours_per_week, exclude=contract._id)
+        if segment is not None:
+            raise BookingConflict(*segment)
+        # The post_save signal drops the cached calendar
+        contract.save(update_fields=update_fields)
+    return contract
+
+
+def classroom_booked(classroom_id):
+    """True if a blocking contract of the classroom is running or upcoming"""
+    return get_calendar(classroom_id).booked_after(datetime.utcnow())
+
+
+def classroom_availability(classroom_id, start, end, min_duration=None):
+    """
+    Booked periods, with their booked weekly hours, and free periods of a
+    classroom within [start, end), as naive UTC datetimes
+    """
+    return get_calendar(classroom_id).free_slots(as_utc(start), as_utc(end), min_duration)
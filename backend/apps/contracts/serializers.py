@@ -1,7 +1,9 @@
 from rest_framework import serializers
 from .models import Contract
+from .calendar import BookingConflict, CalendarBusy, book_contract
 from backend.apps.classrooms.serializers import ClassroomSerializer
 from backend.apps.authentication.serializers import UserProfileSerializer
+from backend.prefetch import CrossDatabaseListSerializer
 from bson import ObjectId
 from decimal import Decimal
 
@@ -41,6 +43,8 @@ class ContractSerializer(serializers.ModelSerializer):
             'created_at',
             'updated_at'
         ]
+        list_serializer_class = CrossDatabaseListSerializer
+        prefetch_across = ['classroom', 'classroom.school', 'teacher', 'school']
 
 class ContractCreateSerializer(serializers.ModelSerializer):
     classroom_id = serializers.CharField(write_only=True, required=True)
@@ -88,7 +92,12 @@ class ContractCreateSerializer(serializers.ModelSerializer):
             hours_per_week=int(validated_data['hours_per_week']),
             status='processing'
         )
-        contract.save()
+        try:
+            book_contract(contract)
+        except BookingConflict as e:
+            raise serializers.ValidationError({"start_date": str(e)})
+        except CalendarBusy as e:
+            raise serializers.ValidationError(str(e))
         return contract
 
 class ContractStatusSerializer(serializers.ModelSerializer):
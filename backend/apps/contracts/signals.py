@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .calendar import invalidate_calendar
+from .models import Contract
+
+
+@receiver(post_save, sender=Contract)
+@receiver(post_delete, sender=Contract)
+def drop_classroom_calendar(sender, instance, **kwargs):
+    # Any contract change may free or take a period of its classroom
+    invalidate_calendar(instance.classroom_id)
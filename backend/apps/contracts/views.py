@@ -4,6 +4,7 @@ from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
 from django.http import Http404
 from .models import Contract
+from .calendar import BLOCKING_STATUSES, BookingConflict, CalendarBusy, book_contract
 from .serializers import (
     ContractSerializer,
     ContractCreateSerializer,
@@ -97,9 +98,16 @@ class SchoolContractUpdateView(generics.UpdateAPIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-           
-            contract.status = new_status
-            contract.save(update_fields=['status'])
+            # Moving a rejected contract back to a blocking status books its period again
+            if new_status in BLOCKING_STATUSES and contract.status not in BLOCKING_STATUSES:
+                contract.status = new_status
+                try:
+                    book_contract(contract, update_fields=['status'])
+                except (BookingConflict, CalendarBusy) as e:
+                    return Response({"detail": str(e)}, status=status.HTTP_409_CONFLICT)
+            else:
+                contract.status = new_status
+                contract.save(update_fields=['status'])
             
             return Response(ContractSerializer(contract).data)
         except Http404:
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class CoursesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'backend.apps.courses'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from backend.mongo_indexes import provision_indexes
+        post_migrate.connect(provision_indexes, sender=self)
@@ -0,0 +1,181 @@
+import logging
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from backend.mongo import get_mongo_db, model_from_document
+from .models import COURSES_COLLECTION, ENROLLMENTS_COLLECTION, Enrollment
+
+logger = logging.getLogger(__name__)
+
+# Inserts retried when the enrollment they collided with disappeared meanwhile
+INSERT_ATTEMPTS = 3
+
+
+class CourseNotFound(Exception):
+    """The course does not exist"""
+
+
+class CourseUnavailable(Exception):
+    """The course does not accept enrollments"""
+
+
+class CourseFull(CourseUnavailable):
+    """Every seat of the course is taken"""
+
+
+def _claim_seat(courses, course_id):
+    """
+    Take one seat with a single conditional update: the filter only matches
+    a published course with a free seat, so concurrent claims can never push
+    current_students past max_students and no lock is held
+    Returns:
+        the course document after the claim, None if no seat was taken
+    """
+    return courses.find_one_and_update(
+        {
+            "_id": course_id,
+            "status": 'published',
+            "$expr": {"$lt": ["$current_students", "$max_students"]}
+        },
+        {"$inc": {"current_students": 1}},
+        projection={"is_free": 1},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def _release_seat(courses, course_id):
+    """Give back a seat claimed for an enrollment that was not created"""
+    try:
+        courses.update_one(
+            {"_id": course_id, "current_students": {"$gt": 0}},
+            {"$inc": {"current_students": -1}}
+        )
+    except Exception:
+        # The course keeps one seat too many taken, the enrollment was not created
+        logger.exception(f"Could not release a seat of course {course_id}")
+
+
+def _inserted(enrollments, enrollment_id):
+    """Whether an enrollment exists, None when the database cannot tell"""
+    try:
+        return enrollments.find_one({"_id": enrollment_id}, {"_id": 1}) is not None
+    except Exception:
+        logger.exception(f"Could not check whether enrollment {enrollment_id} exists")
+        return None
+
+
+def _rejection(courses, course_id):
+    """Why a seat could not be claimed"""
+    course = courses.find_one({"_id": course_id}, {"status": 1})
+    if course is None:
+        return CourseNotFound(f"Course with ID {course_id} does not exist")
+    if course.get("status") != 'published':
+        return CourseUnavailable("Course not available for enrollment")
+    return CourseFull("Course is full")
+
+
+def _enrollment_created(enrollment):
+    """
+    Send post_save for an enrollment inserted without the ORM, so receivers
+    such as the course chat room see it as created. The enrollment exists
+    either way, a failing receiver is only logged.
+    """
+    responses = post_save.send_robust(
+        sender=Enrollment, instance=enrollment, created=True,
+        update_fields=None, raw=False, using='mongodb'
+    )
+    for receiver, response in responses:
+        if isinstance(response, Exception):
+            logger.error(
+                f"post_save receiver {getattr(receiver, '__qualname__', receiver)} failed "
+                f"for enrollment {enrollment.pk}: {str(response)}",
+                exc_info=response
+            )
+
+
+def enroll(student_id, course_id, notify=True):
+    """
+    Enroll a student in a course, idempotently: enrolling again returns the
+    existing enrollment. The seat is claimed first, then the enrollment is
+    inserted; the unique (student_id, course_id) index settles concurrent
+    requests of the same student, and a seat claimed for an enrollment that
+    could not be inserted is released.
+    Args:
+        notify: False skips post_save for a created enrollment, e.g. for
+            throwaway enrollments that must not reach the chat rooms
+    Returns:
+        (Enrollment, created)
+    Raises:
+        CourseNotFound: if the course does not exist
+        CourseUnavailable: if the course is not published
+        CourseFull: if no seat is left
+    """
+    db = get_mongo_db()
+    courses, enrollments = db[COURSES_COLLECTION], db[ENROLLMENTS_COLLECTION]
+    course_id = ObjectId(str(course_id))
+
+    existing = enrollments.find_one({"student_id": student_id, "course_id": course_id})
+    if existing is not None:
+        return model_from_document(Enrollment, existing), False
+
+    course = _claim_seat(courses, course_id)
+    if course is None:
+        # A concurrent request of the same student may have taken the last seat
+        existing = enrollments.find_one({"student_id": student_id, "course_id": course_id})
+        if existing is not None:
+            return model_from_document(Enrollment, existing), False
+        raise _rejection(courses, course_id)
+
+    document = {
+        "_id": ObjectId(),
+        "student_id": student_id,
+        "course_id": course_id,
+        "enrollment_date": timezone.now(),
+        "completion_date": None,
+        "is_completed": False,
+        "progress": 0.0,
+        "rating": None,
+        "review": None,
+        "payment_reference": None,
+        "is_paid": bool(course.get("is_free"))
+    }
+    for attempt in range(INSERT_ATTEMPTS):
+        try:
+            enrollments.insert_one(document)
+            break
+        except DuplicateKeyError:
+            existing = enrollments.find_one({"student_id": student_id, "course_id": course_id})
+            if existing is None:
+                # The conflicting enrollment was deleted meanwhile, the seat is still ours
+                if attempt + 1 < INSERT_ATTEMPTS:
+                    continue
+                _release_seat(courses, course_id)
+                raise
+            if existing["_id"] == document["_id"]:
+                # A retried insert that had already been applied
+                break
+            # Lost the race against another request of the same student
+            _release_seat(courses, course_id)
+            return model_from_document(Enrollment, existing), False
+        except Exception:
+            # A write interrupted by a network error may still have been applied.
+            # When that cannot be told the seat is kept: a seat left unused is
+            # safer than a course taking one student too many.
+            inserted = _inserted(enrollments, document["_id"])
+            if inserted is False:
+                _release_seat(courses, course_id)
+            if not inserted:
+                raise
+            logger.warning(f"Enrollment {document['_id']} was inserted despite an error")
+            break
+
+    enrollment = model_from_document(Enrollment, document)
+    if notify:
+        _enrollment_created(enrollment)
+    return enrollment, True
+
@@ -0,0 +1,53 @@
+import logging
+
+from backend.mongo import get_mongo_db
+from .models import ENROLLMENTS_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+
+class EnrollmentStates:
+    """
+    The requesting user's enrollment in each course serialized during one
+    request: None when not enrolled, otherwise whether it is paid.
+
+    List serializers load every course of the page with a single query;
+    courses serialized one at a time are loaded on first use.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._states = {}
+
+    @classmethod
+    def for_request(cls, request):
+        """The loader attached to a request, created on first use"""
+        states = getattr(request, '_enrollment_states', None)
+        if states is None or states.user is not request.user:
+            states = cls(request.user)
+            request._enrollment_states = states
+        return states
+
+    def remember(self, course_id, is_paid):
+        """Record an enrollment already loaded elsewhere"""
+        self._states[course_id] = bool(is_paid)
+
+    def load(self, course_ids):
+        """Fetch the enrollments of the courses not known yet, in one query"""
+        missing = [course_id for course_id in set(course_ids) if course_id not in self._states]
+        if not missing or not self.user.is_authenticated:
+            return
+        documents = get_mongo_db()[ENROLLMENTS_COLLECTION].find(
+            {"student_id": self.user.pk, "course_id": {"$in": missing}},
+            {"course_id": 1, "is_paid": 1}
+        )
+        for course_id in missing:
+            self._states[course_id] = None
+        for document in documents:
+            self._states[document["course_id"]] = bool(document.get("is_paid"))
+
+    def get(self, course):
+        """None if the user is not enrolled in course, else whether the enrollment is paid"""
+        if course.pk not in self._states:
+            self.load([course.pk])
+        return self._states.get(course.pk)
@@ -0,0 +1,58 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from backend.apps.courses.ratings import run_rating_repair
+
+
+class Command(BaseCommand):
+    help = 'Recompute course rating aggregates from enrollments and fix drift, once or on an interval'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Run a single pass and exit'
+        )
+        parser.add_argument(
+            '--interval', type=int,
+            default=getattr(settings, 'COURSE_RATING_REPAIR_INTERVAL', 3600),
+            help='Seconds between passes'
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=getattr(settings, 'COURSE_RATING_REPAIR_BATCH_SIZE', 1000),
+            help='Courses read and corrected per batch'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report drifted courses without fixing them'
+        )
+        parser.add_argument('--json', action='store_true', help='Print each report as JSON')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            try:
+                report = run_rating_repair(not options['dry_run'], options['batch_size'])
+                if report is None:
+                    self.stdout.write('Rating repair already running in another process, skipped')
+                elif options['json']:
+                    self.stdout.write(json.dumps(report, indent=2))
+                else:
+                    self.stdout.write(
+                        f"Checked {report['checked']} courses: {report['skipped']} skipped as just rated, "
+                        f"{report['drifted']} drifted, "
+                        f"{report['fixed']} fixed in {time.monotonic() - started:.2f}s"
+                    )
+            except Exception as e:
+                self.stderr.write(f'Rating repair failed: {str(e)}')
+                if options['once']:
+                    raise
+
+            if options['once']:
+                return
+
+            # Next pass starts one interval after this one started
+            time.sleep(max(options['interval'] - (time.monotonic() - started), 0))
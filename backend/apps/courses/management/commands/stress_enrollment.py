@@ -0,0 +1,197 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from statistics import median
+
+from bson import ObjectId
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from backend.apps.courses.enrollment import CourseFull, enroll
+from backend.mongo import override_database
+from backend.mongo_indexes import MONGO_INDEXES
+
+STRESS_DB_NAME = 'enrollment_stress'
+
+
+class _StressCollection:
+    """
+    Collection proxy failing a share of inserts, to exercise seat
+    compensation. With a lock, each driver call runs alone, standing in for
+    the per-operation atomicity of a real server that mongomock lacks.
+    """
+
+    def __init__(self, collection, failure_rate, rng, lock):
+        self._collection = collection
+        self._failure_rate = failure_rate
+        self._rng = rng
+        self._lock = lock
+
+    def insert_one(self, *args, **kwargs):
+        if self._failure_rate and self._rng.random() < self._failure_rate:
+            raise PyMongoError("Injected insert failure")
+        return self._call('insert_one', *args, **kwargs)
+
+    def _call(self, name, *args, **kwargs):
+        if self._lock is None:
+            return getattr(self._collection, name)(*args, **kwargs)
+        with self._lock:
+            return getattr(self._collection, name)(*args, **kwargs)
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if callable(attr):
+            return lambda *args, **kwargs: self._call(name, *args, **kwargs)
+        return attr
+
+
+class _StressDatabase:
+    def __init__(self, db, failure_rate, seed, atomic_calls):
+        self._db = db
+        self._failure_rate = failure_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock() if atomic_calls else None
+
+    def __getitem__(self, name):
+        rate = self._failure_rate if name == 'enrollments' else 0
+        return _StressCollection(self._db[name], rate, self._rng, self._lock)
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+
+class Command(BaseCommand):
+    help = (
+        'Fire concurrent enrollments at one course in a throwaway database and '
+        'check that seats are never oversubscribed and every student is enrolled at most once'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mongo-uri',
+            help=(
+                'Local MongoDB to run against; when omitted the in-memory mongomock is used '
+                'with driver calls serialized, which checks the logic but not the server'
+            )
+        )
+        parser.add_argument('--db-name', default=STRESS_DB_NAME, help='Database seeded and dropped by the test')
+        parser.add_argument('--seats', type=int, default=50, help='max_students of the course')
+        parser.add_argument('--students', type=int, default=500, help='Distinct students enrolling')
+        parser.add_argument('--repeat', type=int, default=2, help='Requests sent by each student')
+        parser.add_argument('--threads', type=int, default=200, help='Concurrent requests')
+        parser.add_argument(
+            '--failure-rate', type=float, default=0.0,
+            help='Share of enrollment inserts failing on purpose, their seats must be given back'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for request order and failures')
+
+    def _connect(self, mongo_uri, db_name):
+        if mongo_uri:
+            return MongoClient(mongo_uri, maxPoolSize=max(100, self.threads))[db_name]
+        try:
+            import mongomock
+        except ImportError:
+            raise CommandError('mongomock is not installed, pass a MongoDB URI instead')
+        return mongomock.MongoClient()[db_name]
+
+    def handle(self, *args, **options):
+        if options['db_name'] == settings.DATABASES['mongodb']['NAME']:
+            raise CommandError('Refusing to use the application database, pick another --db-name')
+        if min(options['seats'], options['students'], options['repeat'], options['threads']) < 1:
+            raise CommandError('--seats, --students, --repeat and --threads must be positive')
+        if not 0 <= options['failure_rate'] < 1:
+            raise CommandError('--failure-rate must be between 0 and 1')
+
+        self.threads = options['threads']
+        db = self._connect(options['mongo_uri'], options['db_name'])
+        try:
+            self._seed(db, options['seats'])
+            stress_db = _StressDatabase(
+                db, options['failure_rate'], options['seed'], atomic_calls=not options['mongo_uri']
+            )
+            outcomes, latencies, elapsed = self._run(stress_db, options)
+            problems = self._check(db, options, outcomes)
+        finally:
+            db.client.drop_database(options['db_name'])
+
+        latencies.sort()
+        self.stdout.write(
+            f"{len(latencies)} requests in {elapsed:.2f}s ({len(latencies) / elapsed:.0f}/s), "
+            f"p50 {median(latencies) * 1000:.1f}ms, p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}ms"
+        )
+        self.stdout.write(', '.join(f"{name}: {count}" for name, count in sorted(outcomes.items())))
+        if problems:
+            raise CommandError('; '.join(problems))
+        self.stdout.write(self.style.SUCCESS('Seats and enrollments are consistent'))
+
+    def _seed(self, db, seats):
+        db['courses'].delete_many({})
+        db['enrollments'].delete_many({})
+        db['enrollments'].create_indexes(MONGO_INDEXES['courses']['enrollments'])
+        self.course_id = ObjectId()
+        db['courses'].insert_one({
+            "_id": self.course_id,
+            "title": "Stress test course",
+            "status": 'published',
+            "is_free": True,
+            "max_students": seats,
+            "current_students": 0
+        })
+
+    def _run(self, db, options):
+        requests = [
+            student_id
+            for student_id in range(1, options['students'] + 1)
+            for _ in range(options['repeat'])
+        ]
+        random.Random(options['seed']).shuffle(requests)
+
+        outcomes = {"created": 0, "existing": 0, "full": 0, "failed": 0}
+        latencies = []
+        lock = threading.Lock()
+        start = threading.Event()
+
+        def request(student_id):
+            start.wait()
+            began = time.monotonic()
+            try:
+                # Fake students, kept out of the course chat rooms
+                _, created = enroll(student_id, self.course_id, notify=False)
+                outcome = 'created' if created else 'existing'
+            except CourseFull:
+                outcome = 'full'
+            except PyMongoError:
+                outcome = 'failed'
+            with lock:
+                outcomes[outcome] += 1
+                latencies.append(time.monotonic() - began)
+
+        with override_database(db), ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            futures = [pool.submit(request, student_id) for student_id in requests]
+            began = time.monotonic()
+            start.set()
+            for future in futures:
+                future.result()
+            elapsed = time.monotonic() - began
+        return outcomes, latencies, elapsed
+
+    def _check(self, db, options, outcomes):
+        problems = []
+        course = db['courses'].find_one({"_id": self.course_id})
+        enrolled = db['enrollments'].count_documents({"course_id": self.course_id})
+        students = len(db['enrollments'].distinct("student_id", {"course_id": self.course_id}))
+
+        if course["current_students"] > options['seats']:
+            problems.append(f"{course['current_students']} students counted for {options['seats']} seats")
+        if course["current_students"] != enrolled:
+            problems.append(f"current_students is {course['current_students']} but {enrolled} enrollments exist")
+        if students != enrolled:
+            problems.append(f"{enrolled} enrollments for {students} distinct students")
+        if outcomes["created"] != enrolled:
+            problems.append(f"{outcomes['created']} enrollments reported created, {enrolled} exist")
+        if not outcomes["failed"] and enrolled != min(options['seats'], options['students']):
+            problems.append(f"{enrolled} enrollments, expected {min(options['seats'], options['students'])}")
+        return problems
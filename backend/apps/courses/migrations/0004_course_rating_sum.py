@@ -0,0 +1,18 @@
+# Generated by Django 3.1.12 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_auto_20250403_1206'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='rating_sum',
+            field=models.FloatField(default=0.0),
+        ),
+    ]
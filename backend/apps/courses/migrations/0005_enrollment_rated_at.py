@@ -0,0 +1,18 @@
+# Generated by Django 3.1.12 on 2026-10-18 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_course_rating_sum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollment',
+            name='rated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
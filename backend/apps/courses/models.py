@@ -5,6 +5,10 @@ from django.core.exceptions import ValidationError
 from backend.apps.authentication.models import User
 from backend.apps.contracts.models import Contract
 
+# MongoDB collections of the models, for queries made with pymongo
+COURSES_COLLECTION = 'courses'
+ENROLLMENTS_COLLECTION = 'enrollments'
+
 class Course(models.Model):
     _id = models.ObjectIdField()
     title = models.CharField(max_length=255)
@@ -35,6 +39,8 @@ class Course(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     rating = models.FloatField(default=0.0, validators=[MinValueValidator(0.0), MaxValueValidator(5.0)])
     total_ratings = models.IntegerField(default=0)
+    # Sum of the enrollment ratings, rating is rating_sum / total_ratings
+    rating_sum = models.FloatField(default=0.0)
     tags = models.JSONField(default=list)
     requirements = models.JSONField(default=list)
     syllabus = models.JSONField(default=list)
@@ -43,7 +49,7 @@ class Course(models.Model):
     meeting_link = models.URLField(max_length=512, blank=True, null=True)
 
     class Meta:
-        db_table = 'courses'
+        db_table = COURSES_COLLECTION
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['title']),
@@ -85,11 +91,12 @@ class Enrollment(models.Model):
     progress = models.FloatField(default=0.0, validators=[MinValueValidator(0.0), MaxValueValidator(100.0)])
     rating = models.FloatField(null=True, blank=True, validators=[MinValueValidator(1.0), MaxValueValidator(5.0)])
     review = models.TextField(null=True, blank=True)
+    rated_at = models.DateTimeField(null=True, blank=True)
     payment_reference = models.CharField(max_length=100, null=True, blank=True)
     is_paid = models.BooleanField(default=False)
 
     class Meta:
-        db_table = 'enrollments'
+        db_table = ENROLLMENTS_COLLECTION
         unique_together = ('student', 'course')
         indexes = [
             models.Index(fields=['student']),
@@ -0,0 +1,194 @@
+import logging
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument, UpdateOne
+from django.conf import settings
+from django.utils import timezone
+
+from backend.mongo import acquire_lease, get_mongo_db, release_lease
+from .models import COURSES_COLLECTION, ENROLLMENTS_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+# Drifted courses listed in a repair report, the rest are only counted
+MAX_REPORTED_DRIFTS = 100
+
+
+def average_rating(rating_sum, total_ratings):
+    return round(rating_sum / total_ratings, 2) if total_ratings else 0.0
+
+
+def _seed_rating_sum(courses, course_id):
+    """
+    Courses rated before rating_sum existed start from their stored average
+    Returns:
+        False if the course does not exist
+    """
+    course = courses.find_one({"_id": course_id}, {"rating": 1, "total_ratings": 1, "rating_sum": 1})
+    if course is None:
+        return False
+    if "rating_sum" not in course:
+        courses.update_one(
+            {"_id": course_id, "rating_sum": {"$exists": False}},
+            {"$set": {"rating_sum": (course.get("rating") or 0) * (course.get("total_ratings") or 0)}}
+        )
+    return True
+
+
+def apply_rating(course_id, previous, rating):
+    """
+    Add a rating to a course's running sum and count with $inc. A re-rating
+    only moves the sum by the difference and leaves the count alone.
+    The average is then written only if no other rating landed in between,
+    in which case that rating's own write carries the newer average.
+    Returns:
+        the course average after this rating, None if the course does not exist
+    """
+    courses = get_mongo_db()[COURSES_COLLECTION]
+    increments = {
+        "rating_sum": rating - (previous or 0),
+        "total_ratings": 0 if previous is not None else 1
+    }
+    course = None
+    for _ in range(2):
+        course = courses.find_one_and_update(
+            {"_id": course_id, "rating_sum": {"$exists": True}},
+            {"$inc": increments},
+            projection={"rating_sum": 1, "total_ratings": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if course is not None or not _seed_rating_sum(courses, course_id):
+            break
+    if course is None:
+        return None
+
+    average = average_rating(course["rating_sum"], course["total_ratings"])
+    courses.update_one(
+        {"_id": course_id, "rating_sum": course["rating_sum"], "total_ratings": course["total_ratings"]},
+        {"$set": {"rating": average}}
+    )
+    return average
+
+
+def rate_enrollment(enrollment_id, student_id, rating, review):
+    """
+    Store a student's rating of a completed enrollment and fold it into the
+    course aggregates. The previous rating is read by the same update that
+    replaces it, so concurrent re-ratings each apply their own difference.
+    Returns:
+        the course average, None if the enrollment is not a completed one of the student
+    """
+    previous = get_mongo_db()[ENROLLMENTS_COLLECTION].find_one_and_update(
+        {"_id": enrollment_id, "student_id": student_id, "is_completed": True},
+        {"$set": {"rating": rating, "review": review, "rated_at": timezone.now()}},
+        projection={"rating": 1, "course_id": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    if previous is None:
+        return None
+    return apply_rating(previous["course_id"], previous.get("rating"), rating)
+
+
+def _expected_ratings(enrollments, course_ids):
+    """Rating sum, count and latest rating time of each course, recomputed from its enrollments"""
+    return {
+        row["_id"]: (row["sum"], row["count"], row["last_rated"])
+        for row in enrollments.aggregate([
+            {"$match": {"course_id": {"$in": course_ids}, "rating": {"$ne": None}}},
+            {"$group": {
+                "_id": "$course_id",
+                "sum": {"$sum": "$rating"},
+                "count": {"$sum": 1},
+                "last_rated": {"$max": "$rated_at"}
+            }}
+        ])
+    }
+
+
+def repair_course_ratings(fix=True, batch_size=None):
+    """
+    Recompute the rating aggregates of every course from its enrollments,
+    one batch of courses at a time, and compare them with the running values.
+    Each batch is aggregated after its courses were read, and corrections
+    are written only where the running values did not move since, so a
+    rating landing meanwhile makes the write a no-op instead of being
+    overwritten. A rating whose enrollment is written but whose course
+    update is still in flight would be counted twice by a correction, so
+    courses rated within COURSE_RATING_REPAIR_GRACE seconds of their read
+    are skipped and left to the next pass.
+    Args:
+        fix: False only reports the drift
+    Returns:
+        dict with checked, skipped and drifted counts, corrections made and drift samples
+    """
+    batch_size = batch_size or getattr(settings, 'COURSE_RATING_REPAIR_BATCH_SIZE', 1000)
+    grace = timedelta(seconds=getattr(settings, 'COURSE_RATING_REPAIR_GRACE', 60))
+    db = get_mongo_db()
+    courses, enrollments = db[COURSES_COLLECTION], db[ENROLLMENTS_COLLECTION]
+    report = {"checked": 0, "skipped": 0, "drifted": 0, "fixed": 0, "drifts": []}
+
+    def repair_batch(batch, read_at):
+        expected = _expected_ratings(enrollments, [course["_id"] for course in batch])
+        operations = []
+        for course in batch:
+            rating_sum, total_ratings, last_rated = expected.get(course["_id"], (0, 0, None))
+            if last_rated is not None and last_rated > read_at - grace:
+                # Rated around the read, its course update may still be in flight
+                report["skipped"] += 1
+                continue
+            rating = average_rating(rating_sum, total_ratings)
+            current = (course.get("rating_sum"), course.get("total_ratings"), course.get("rating"))
+            if current == (rating_sum, total_ratings, rating):
+                continue
+
+            report["drifted"] += 1
+            if len(report["drifts"]) < MAX_REPORTED_DRIFTS:
+                report["drifts"].append({
+                    "course_id": str(course["_id"]),
+                    "stored": dict(zip(("rating_sum", "total_ratings", "rating"), current)),
+                    "expected": {"rating_sum": rating_sum, "total_ratings": total_ratings, "rating": rating}
+                })
+            operations.append(UpdateOne(
+                {"_id": course["_id"], "rating_sum": current[0], "total_ratings": current[1]},
+                {"$set": {"rating_sum": rating_sum, "total_ratings": total_ratings, "rating": rating}}
+            ))
+        if fix and operations:
+            report["fixed"] += courses.bulk_write(operations, ordered=False).modified_count
+
+    batch = []
+    # No course of a batch was read before its read_at, prefetched ones
+    # fall within the grace period
+    read_at = datetime.utcnow()
+    cursor = courses.find({}, {"rating": 1, "rating_sum": 1, "total_ratings": 1}).batch_size(batch_size)
+    for course in cursor:
+        report["checked"] += 1
+        batch.append(course)
+        if len(batch) >= batch_size:
+            repair_batch(batch, read_at)
+            batch = []
+            read_at = datetime.utcnow()
+    if batch:
+        repair_batch(batch, read_at)
+
+    if report["drifted"]:
+        logger.warning(
+            f"Course rating repair found {report['drifted']} drifted courses out of "
+            f"{report['checked']}, fixed {report['fixed']}"
+        )
+    return report
+
+
+def run_rating_repair(fix=True, batch_size=None):
+    """
+    Run one repair pass unless another process is already running one
+    Returns the repair report, None if the pass was skipped
+    """
+    lock_ttl = max(getattr(settings, 'COURSE_RATING_REPAIR_INTERVAL', 3600), 60)
+    token = acquire_lease('course_rating_repair', lock_ttl)
+    if token is None:
+        logger.info("Course rating repair already running elsewhere, skipping")
+        return None
+    try:
+        return repair_course_ratings(fix, batch_size)
+    finally:
+        release_lease('course_rating_repair', token)
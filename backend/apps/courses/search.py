@@ -0,0 +1,156 @@
+import hashlib
+import json
+import logging
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.conf import settings
+
+from backend.mongo import get_mongo_db, model_from_document
+from backend.pagination import decode_cursor, encode_cursor
+from .models import COURSES_COLLECTION, Course
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+MAX_QUERY_LENGTH = 200
+
+
+def get_course_collection():
+    return get_mongo_db()[COURSES_COLLECTION]
+
+
+def parse_search_params(params):
+    """
+    Read q, tags (comma separated), tags_match (all or any), is_online and
+    is_free query parameters
+    Returns:
+        search dict, or None when neither q nor tags asks for a search
+    Raises:
+        ValueError: if a value is not valid
+    """
+    text = (params.get('q') or '').strip()
+    tags = sorted({tag.strip() for tag in (params.get('tags') or '').split(',') if tag.strip()})
+    if not text and not tags:
+        return None
+    if len(text) > MAX_QUERY_LENGTH:
+        raise ValueError(f"q cannot be longer than {MAX_QUERY_LENGTH} characters")
+
+    search = {"text": text, "tags": tags, "tags_match": (params.get('tags_match') or 'all').lower()}
+    if search["tags_match"] not in ('all', 'any'):
+        raise ValueError("tags_match must be all or any")
+    for name in ('is_online', 'is_free'):
+        value = params.get(name)
+        if value in ('true', 'false'):
+            search[name] = value == 'true'
+    return search
+
+
+def _relevance():
+    """
+    Text score (1 without a text query) boosted by a Bayesian average of
+    the rating: courses with few ratings are pulled towards the prior, so a
+    single 5-star rating does not outrank a well-established course
+    """
+    weight = getattr(settings, 'COURSE_SEARCH_RATING_WEIGHT', 0.5)
+    prior = getattr(settings, 'COURSE_SEARCH_RATING_PRIOR', 3.0)
+    prior_votes = getattr(settings, 'COURSE_SEARCH_RATING_PRIOR_VOTES', 5)
+    votes = {"$ifNull": ["$total_ratings", 0]}
+    rating = {"$divide": [
+        {"$add": [{"$multiply": [{"$ifNull": ["$rating", 0]}, votes]}, prior * prior_votes]},
+        {"$add": [votes, prior_votes]}
+    ]}
+    return {"$add": [1, {"$multiply": [weight, {"$divide": [rating, 5]}]}]}
+
+
+def _search_digest(search):
+    return hashlib.md5(json.dumps(search, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def _after_cursor(search, cursor):
+    """$match stage continuing after a cursor position in (relevance, _id) order"""
+    position = decode_cursor(cursor)
+    try:
+        if position["search"] != _search_digest(search):
+            raise ValueError("Cursor does not match the search")
+        relevance = float(position["relevance"])
+        last_id = ObjectId(position["_id"])
+    except (KeyError, TypeError, InvalidId) as e:
+        raise ValueError(f"Invalid cursor: {str(e)}")
+    return {"$match": {"$or": [
+        {"relevance": {"$lt": relevance}},
+        {"relevance": relevance, "_id": {"$lt": last_id}}
+    ]}}
+
+
+def search_courses(search, limit=DEFAULT_LIMIT, cursor=None, published_only=False):
+    """
+    Courses matching a text query and/or tags, best first.
+    Text matching uses the course_text index on title and description,
+    tags the multikey tags index. Relevance is the text score weighted by
+    the course rating, pages continue after the last (relevance, _id).
+
+    Relevance is computed, so no index can serve its sort. Only the best
+    COURSE_SEARCH_MAX_CANDIDATES matches by text score (by rating for
+    tag-only searches) are scored and sorted, a top-k sort that keeps the
+    per-page work bounded however broad the search. Matches past the cap
+    are never returned, and since the rating boost is at most
+    1 + COURSE_SEARCH_RATING_WEIGHT, a course just outside the cap could
+    have ranked inside it.
+    Args:
+        search: output of parse_search_params
+    Returns:
+        (list of Course with a relevance attribute, next cursor or None)
+    Raises:
+        ValueError: if the cursor is malformed or belongs to another search
+    """
+    match = {}
+    if search["text"]:
+        match["$text"] = {"$search": search["text"]}
+    if search["tags"]:
+        operator = "$all" if search["tags_match"] == 'all' else "$in"
+        match["tags"] = {operator: search["tags"]}
+    for name in ('is_online', 'is_free'):
+        if name in search:
+            match[name] = search[name]
+    if published_only:
+        match["status"] = 'published'
+
+    relevance = _relevance()
+    if search["text"]:
+        relevance = {"$multiply": [{"$meta": "textScore"}, relevance]}
+        candidates = {"score": {"$meta": "textScore"}, "_id": -1}
+    else:
+        candidates = {"rating": -1, "_id": -1}
+
+    # $text has to be the first stage of the pipeline
+    pipeline = [
+        {"$match": match},
+        {"$sort": candidates},
+        {"$limit": getattr(settings, 'COURSE_SEARCH_MAX_CANDIDATES', 1000)},
+        {"$addFields": {"relevance": relevance}}
+    ]
+    if cursor:
+        pipeline.append(_after_cursor(search, cursor))
+    pipeline += [{"$sort": {"relevance": -1, "_id": -1}}, {"$limit": limit + 1}]
+
+    documents = list(get_course_collection().aggregate(pipeline))
+    has_more = len(documents) > limit
+    documents = documents[:limit]
+
+    courses = []
+    for document in documents:
+        course = model_from_document(Course, document)
+        course.relevance = document["relevance"]
+        courses.append(course)
+
+    next_cursor = None
+    if has_more:
+        last = documents[-1]
+        next_cursor = encode_cursor({
+            "search": _search_digest(search),
+            "relevance": last["relevance"],
+            "_id": str(last["_id"])
+        })
+    return courses, next_cursor
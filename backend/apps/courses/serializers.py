@@ -3,10 +3,23 @@ from rest_framework import serializers
 from .models import Course, Enrollment
 from backend.apps.authentication.serializers import UserProfileSerializer
 from backend.apps.contracts.models import Contract
+from backend.prefetch import CrossDatabaseListSerializer
+from backend.serializers import SparseFieldsetMixin
+from .enrollment_state import EnrollmentStates
 from bson import ObjectId
+from bson.errors import InvalidId
 from django.core.exceptions import ValidationError
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseListSerializer(CrossDatabaseListSerializer):
+    """Also loads the caller's enrollment in every listed course with one query"""
+
+    def prefetch(self, instances):
+        super().prefetch(instances)
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
+            EnrollmentStates.for_request(request).load([course.pk for course in instances])
+
+class CourseSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     teacher = UserProfileSerializer(read_only=True)
     is_enrolled = serializers.SerializerMethodField()
     has_access_to_attachments = serializers.SerializerMethodField()
@@ -27,12 +40,24 @@ class CourseSerializer(serializers.ModelSerializer):
             'teacher', 'current_students', 'rating', 'total_ratings', 'status',
             'has_access_to_attachments', 'attachments', 'contract'
         ]
+        list_serializer_class = CourseListSerializer
+        prefetch_across = ['teacher', 'contract']
+        # Document fields read by the method fields, for fields= projections
+        field_sources = {
+            'is_enrolled': [],
+            'has_access_to_attachments': ['is_free'],
+            'attachments': ['is_free', 'course_materials_link', 'meeting_link'],
+        }
     
-    def get_is_enrolled(self, obj):
+    def _enrollment_state(self, obj):
+        """None if the caller is not enrolled, else whether the enrollment is paid"""
         request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.enrollments.filter(student=request.user).exists()
-        return False
+        if not request or not request.user.is_authenticated:
+            return None
+        return EnrollmentStates.for_request(request).get(obj)
+    
+    def get_is_enrolled(self, obj):
+        return self._enrollment_state(obj) is not None
     
     def get_has_access_to_attachments(self, obj):
         request = self.context.get('request')
@@ -41,12 +66,7 @@ class CourseSerializer(serializers.ModelSerializer):
         
         if obj.is_free:
             return True
-            
-        try:
-            enrollment = obj.enrollments.get(student=request.user)
-            return enrollment.is_paid
-        except Enrollment.DoesNotExist:
-            return False
+        return bool(self._enrollment_state(obj))
     
     def get_attachments(self, obj):
         request = self.context.get('request')
@@ -60,6 +80,23 @@ class CourseSerializer(serializers.ModelSerializer):
             'meeting_link': obj.meeting_link
         }
 
+class CourseSummarySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Compact course representation nested in enrollment lists"""
+    teacher_name = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Course
+        fields = [
+            '_id', 'title', 'teacher_name', 'is_online', 'is_free', 'status',
+            'start_date', 'end_date', 'rating'
+        ]
+        list_serializer_class = CrossDatabaseListSerializer
+        prefetch_across = ['teacher']
+        field_sources = {'teacher_name': ['teacher']}
+    
+    def get_teacher_name(self, obj):
+        return obj.teacher.full_name
+
 class CourseCreateSerializer(serializers.ModelSerializer):
     contract = serializers.CharField(required=False, allow_null=True)
     
@@ -121,7 +158,19 @@ class CourseCreateSerializer(serializers.ModelSerializer):
         
         return super().create(validated_data)
 
-class EnrollmentSerializer(serializers.ModelSerializer):
+class EnrollmentListSerializer(CrossDatabaseListSerializer):
+    """The caller's own enrollments already tell the nested courses' enrollment state"""
+
+    def prefetch(self, instances):
+        super().prefetch(instances)
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
+            states = EnrollmentStates.for_request(request)
+            for enrollment in instances:
+                if enrollment.student_id == request.user.pk:
+                    states.remember(enrollment.course_id, enrollment.is_paid)
+
+class EnrollmentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     student = UserProfileSerializer(read_only=True)
     course = CourseSerializer(read_only=True)
     has_access_to_attachments = serializers.SerializerMethodField()
@@ -137,10 +186,20 @@ class EnrollmentSerializer(serializers.ModelSerializer):
             'student', 'course', 'enrollment_date', 'payment_reference', 'is_paid',
             'has_access_to_attachments'
         ]
+        list_serializer_class = EnrollmentListSerializer
+        prefetch_across = ['student', 'course', 'course.teacher', 'course.contract']
+        field_sources = {'has_access_to_attachments': ['course', 'is_paid']}
     
     def get_has_access_to_attachments(self, obj):
         return obj.has_access_to_attachments()
 
+class EnrollmentSummarySerializer(EnrollmentSerializer):
+    """Enrollment list item, with the course in its compact form"""
+    course = CourseSummarySerializer(read_only=True)
+    
+    class Meta(EnrollmentSerializer.Meta):
+        prefetch_across = ['student', 'course', 'course.teacher']
+
 class EnrollmentCreateSerializer(serializers.ModelSerializer):
     course = serializers.CharField(required=True)
     
@@ -148,27 +207,9 @@ class EnrollmentCreateSerializer(serializers.ModelSerializer):
         model = Enrollment
         fields = ['course']
     
-    def validate(self, data):
-        course_id = data.get('course')
-        user = self.context['request'].user
-        
+    def validate_course(self, value):
+        # Seats, status and duplicates are checked atomically by enrollment.enroll
         try:
-            try:
-                object_id = ObjectId(course_id)
-                course = Course.objects.get(_id=object_id)
-            except (TypeError, ValueError):
-                course = Course.objects.get(_id=course_id)
-                
-            if course.current_students >= course.max_students:
-                raise serializers.ValidationError("Course is full")
-            
-            if course.enrollments.filter(student=user).exists():
-                raise serializers.ValidationError("You are already enrolled in this course")
-            
-            data['course'] = course
-            return data
-            
-        except Course.DoesNotExist:
-            raise serializers.ValidationError(f"Course with ID {course_id} does not exist")
-        except Exception as e:
+            return ObjectId(value)
+        except (InvalidId, TypeError) as e:
             raise serializers.ValidationError(f"Invalid course ID format: {str(e)}")
\ No newline at end of file
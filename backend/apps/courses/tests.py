@@ -1,3 +1,101 @@
-from django.test import TestCase
+import os
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from bson import ObjectId
+from django.core.management import call_command
+from django.db.models.signals import post_save
+from django.test import SimpleTestCase
+
+from backend.mongo import override_database
+from backend.mongo_indexes import MONGO_INDEXES
+from .enrollment import CourseFull, CourseUnavailable, enroll
+from .models import Enrollment
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+# A local mongod to run the concurrency test against, e.g. mongodb://localhost:27017
+MONGO_TEST_URI = os.getenv('MONGO_TEST_URI')
+
+
+@skipUnless(mongomock, "mongomock is not installed")
+class EnrollTests(SimpleTestCase):
+    def setUp(self):
+        # Receivers such as the course chat room would need the SQL databases
+        patcher = mock.patch.object(post_save, 'send_robust', return_value=[])
+        self.post_save = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.db = mongomock.MongoClient()['enrollment_tests']
+        self.db['enrollments'].create_indexes(MONGO_INDEXES['courses']['enrollments'])
+        self.course_id = ObjectId()
+        self.db['courses'].insert_one({
+            "_id": self.course_id,
+            "status": 'published',
+            "is_free": True,
+            "max_students": 2,
+            "current_students": 0
+        })
+
+    def seats_taken(self):
+        return self.db['courses'].find_one({"_id": self.course_id})["current_students"]
+
+    def test_enrolling_again_returns_the_existing_enrollment(self):
+        with override_database(self.db):
+            first, created = enroll(1, self.course_id)
+            again, created_again = enroll(1, self.course_id)
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(first.pk, again.pk)
+        self.assertEqual(self.seats_taken(), 1)
+
+    def test_created_enrollment_sends_post_save(self):
+        with override_database(self.db):
+            enrollment, _ = enroll(1, self.course_id)
+            enroll(1, self.course_id)
+        # Once, for the enrollment created, so the course chat room gets the student
+        self.post_save.assert_called_once_with(
+            sender=Enrollment, instance=enrollment, created=True,
+            update_fields=None, raw=False, using='mongodb'
+        )
+
+    def test_enrollment_without_notify_sends_nothing(self):
+        with override_database(self.db):
+            enroll(1, self.course_id, notify=False)
+        self.post_save.assert_not_called()
+
+    def test_full_course_rejects_new_students(self):
+        with override_database(self.db):
+            enroll(1, self.course_id)
+            enroll(2, self.course_id)
+            with self.assertRaises(CourseFull):
+                enroll(3, self.course_id)
+        self.assertEqual(self.seats_taken(), 2)
+
+    def test_unpublished_course_is_unavailable(self):
+        self.db['courses'].update_one({"_id": self.course_id}, {"$set": {"status": 'draft'}})
+        with override_database(self.db):
+            with self.assertRaises(CourseUnavailable):
+                enroll(1, self.course_id)
+        self.assertEqual(self.seats_taken(), 0)
+
+
+@skipUnless(mongomock, "mongomock is not installed")
+class StressEnrollmentTests(SimpleTestCase):
+    """stress_enrollment fails with CommandError when seats or enrollments are inconsistent"""
+
+    def stress(self, **options):
+        call_command('stress_enrollment', stdout=StringIO(), **options)
+
+    def test_concurrent_enrollments_never_oversubscribe(self):
+        self.stress(seats=20, students=200, repeat=2, threads=50)
+
+    def test_failed_inserts_give_their_seats_back(self):
+        self.stress(seats=20, students=60, repeat=2, threads=30, failure_rate=0.3)
+
+    @skipUnless(MONGO_TEST_URI, "MONGO_TEST_URI is not set")
+    def test_concurrent_enrollments_against_mongod(self):
+        # Real server-side atomicity, driver calls are not serialized here
+        self.stress(mongo_uri=MONGO_TEST_URI, seats=50, students=500, repeat=3, threads=200, failure_rate=0.05)
@@ -1,6 +1,4 @@
 from collections import defaultdict
-from venv import logger
-from django.db import DatabaseError, transaction
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
@@ -16,7 +14,6 @@ from django.utils import timezone
 from bson import ObjectId
 
 from bson.errors import InvalidId
-from django.db.models import F, Avg
 from backend.apps.contracts.models import Contract
 from rest_framework import generics, serializers
 from rest_framework.response import Response
@@ -28,22 +25,32 @@ from bson import ObjectId
 from collections import defaultdict
 from rest_framework import status
 
-from django.db import DatabaseError, transaction
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.core.exceptions import ValidationError
 from bson import ObjectId
 from bson.errors import InvalidId
-from django.db.models import F
 from .models import Enrollment, Course
 from .serializers import EnrollmentSerializer, EnrollmentCreateSerializer
 from backend.apps.authentication.permissions import IsStudentUser
+from backend.prefetch import CrossDatabaseListSerializer, prefetch_related_across_databases
+from backend.pagination import KeysetPagination, MongoQuery, parse_limit
+from backend.mongo import get_mongo_db
+from backend.serializers import SparseFieldsetViewMixin
+from .models import ENROLLMENTS_COLLECTION
+from .search import DEFAULT_LIMIT, MAX_LIMIT, get_course_collection, parse_search_params, search_courses
+from .serializers import EnrollmentSummarySerializer
+from .enrollment import CourseFull, CourseNotFound, CourseUnavailable, enroll
+from pymongo.errors import PyMongoError
 import logging
 
-class CourseListView(generics.ListCreateAPIView):
+logger = logging.getLogger(__name__)
+
+class CourseListView(SparseFieldsetViewMixin, generics.ListCreateAPIView):
     serializer_class = CourseSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -51,22 +58,50 @@ class CourseListView(generics.ListCreateAPIView):
         return super().get_serializer_class()
 
     def get_queryset(self):
-        queryset = Course.objects.all()
+        query = {}
         
         # Filter by query parameters
         is_online = self.request.query_params.get('is_online')
         if is_online in ['true', 'false']:
-            queryset = queryset.filter(is_online=(is_online == 'true'))
+            query['is_online'] = is_online == 'true'
         
         is_free = self.request.query_params.get('is_free')
         if is_free in ['true', 'false']:
-            queryset = queryset.filter(is_free=(is_free == 'true'))
+            query['is_free'] = is_free == 'true'
         
         # For students only show published courses
         if hasattr(self.request.user, 'student_profile'):
-            queryset = queryset.filter(status='published')
+            query['status'] = 'published'
         
-        return queryset
+        return MongoQuery(get_course_collection(), query, Course)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Search mode when q (title and description words) or tags (comma
+        separated, tags_match=all|any) is given: best matches first, paged
+        with limit and the returned next_cursor
+        """
+        try:
+            search = parse_search_params(request.query_params)
+            if search is not None:
+                limit = parse_limit(request.query_params.get('limit'), DEFAULT_LIMIT, MAX_LIMIT)
+                courses, next_cursor = search_courses(
+                    search, limit, request.query_params.get('cursor'),
+                    published_only=hasattr(request.user, 'student_profile')
+                )
+        except ValueError as ve:
+            return Response(
+                {"error": f"Invalid parameters: {str(ve)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if search is None:
+            return super().list(request, *args, **kwargs)
+        serializer = self.get_serializer(courses, many=True)
+        return Response({
+            'results': serializer.data,
+            'next_cursor': next_cursor
+        })
 
     def perform_create(self, serializer):
         if not hasattr(self.request.user, 'teacher_profile'):
@@ -91,93 +126,59 @@ class CourseListView(generics.ListCreateAPIView):
         
         course.save()
 
-class MyCoursesView(generics.ListAPIView):
+class MyCoursesView(SparseFieldsetViewMixin, generics.ListAPIView):
     serializer_class = CourseSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        if hasattr(self.request.user, 'teacher_profile'):
-            return Course.objects.filter(teacher=self.request.user)
-        elif hasattr(self.request.user, 'student_profile'):
-            return Course.objects.filter(enrollments__student=self.request.user)
-        return Course.objects.none()
+        user = self.request.user
+        if hasattr(user, 'teacher_profile'):
+            query = {"teacher_id": user.pk}
+        elif hasattr(user, 'student_profile'):
+            enrollments = get_mongo_db()[ENROLLMENTS_COLLECTION]
+            query = {"_id": {"$in": enrollments.distinct("course_id", {"student_id": user.pk})}}
+        else:
+            query = {"_id": {"$in": []}}
+        return MongoQuery(get_course_collection(), query, Course)
 
 
-class EnrollmentListView(generics.ListCreateAPIView):
-    serializer_class = EnrollmentSerializer
+class EnrollmentListView(SparseFieldsetViewMixin, generics.ListCreateAPIView):
+    serializer_class = EnrollmentSummarySerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticated, IsStudentUser]
 
     def get_serializer_class(self):
-        return EnrollmentCreateSerializer if self.request.method == 'POST' else EnrollmentSerializer
+        return EnrollmentCreateSerializer if self.request.method == 'POST' else EnrollmentSummarySerializer
 
     def get_queryset(self):
-        return Enrollment.objects.filter(student=self.request.user)
+        enrollments = get_mongo_db()[ENROLLMENTS_COLLECTION]
+        return MongoQuery(enrollments, {"student_id": self.request.user.pk}, Enrollment, 'enrollment_date')
 
     def post(self, request, *args, **kwargs):
         serializer = EnrollmentCreateSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
-        
-        course = serializer.validated_data['course']
-        user = request.user
 
         try:
-            # Start transaction with specific isolation level
-            with transaction.atomic(using='default'):
-                # Check existing enrollment with lock
-                if Enrollment.objects.select_for_update().filter(
-                    student=user, 
-                    course=course
-                ).exists():
-                    return Response(
-                        {"detail": "Already enrolled in this course"},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-
-                # Validate course status with lock
-                course = Course.objects.select_for_update().get(pk=course.pk)
-                if course.status != 'published':
-                    return Response(
-                        {"detail": "Course not available for enrollment"},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-
-                if course.current_students >= course.max_students:
-                    return Response(
-                        {"detail": "Course is full"},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-
-                # Create enrollment
-                enrollment = Enrollment.objects.create(
-                    student=user,
-                    course=course,
-                    is_paid=course.is_free
-                )
-
-                # Update counter with explicit value to avoid F() issues
-                new_count = course.current_students + 1
-                Course.objects.filter(pk=course.pk).update(
-                    current_students=new_count
-                )
-
-                # Verify update
-                updated_course = Course.objects.get(pk=course.pk)
-                if updated_course.current_students != new_count:
-                    logger.error(f"Counter mismatch! Expected {new_count}, got {updated_course.current_students}")
-                    raise DatabaseError("Student count update failed")
-
-                return Response(
-                    EnrollmentSerializer(enrollment).data,
-                    status=status.HTTP_201_CREATED
-                )
-
-        except Exception as e:
+            enrollment, created = enroll(request.user.pk, serializer.validated_data['course'])
+        except CourseNotFound as e:
+            return Response({"detail": str(e)}, status=status.HTTP_404_NOT_FOUND)
+        except CourseFull as e:
+            return Response({"detail": str(e)}, status=status.HTTP_409_CONFLICT)
+        except CourseUnavailable as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except PyMongoError as e:
             logger.exception("Enrollment failed")
             return Response(
                 {"detail": f"Operation failed: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+        return Response(
+            EnrollmentSerializer(enrollment, context={'request': request}).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
 class EnrollmentCompleteView(generics.UpdateAPIView):
     serializer_class = EnrollmentSerializer
     permission_classes = [IsAuthenticated, IsStudentUser]
@@ -276,6 +277,8 @@ class EnrollmentRateView(generics.UpdateAPIView):
             raise ValidationError(str(e))
 
     def update(self, request, *args, **kwargs):
+        from .ratings import rate_enrollment
+
         try:
             enrollment = self.get_object()
             
@@ -305,29 +308,21 @@ class EnrollmentRateView(generics.UpdateAPIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Update enrollment
+            # Rating and course aggregates are updated in place, in O(1)
+            review = request.data.get('review', '')
+            course_avg_rating = rate_enrollment(enrollment._id, request.user.pk, rating, review)
             enrollment.rating = rating
-            enrollment.review = request.data.get('review', '')
-            enrollment.save()
-            
-            # Update course statistics with proper error handling
+            enrollment.review = review
+            course = enrollment.course
+
             try:
-                course = enrollment.course
-                ratings = course.enrollments.exclude(rating__isnull=True)
-                course.total_ratings = ratings.count()
-                
-                # Safely calculate average rating
-                avg_rating = ratings.aggregate(Avg('rating'))['rating__avg']
-                course.rating = round(float(avg_rating), 2) if avg_rating is not None else 0
-                course.save()
-                
                 # Update teacher points if exists
                 if hasattr(course.teacher, 'teacher_profile'):
                     course.teacher.teacher_profile.points += 5
                     course.teacher.teacher_profile.save()
             except Exception as e:
                 # Log the error but don't fail the request
-                logger.error(f"Error updating course stats: {str(e)}")
+                logger.error(f"Error updating teacher points: {str(e)}")
             
             return Response(
                 {
@@ -335,10 +330,10 @@ class EnrollmentRateView(generics.UpdateAPIView):
                     "message": "Rating submitted successfully",
                     "data": {
                         "enrollment_id": str(enrollment._id),
-                        "course_title": enrollment.course.title,
+                        "course_title": course.title,
                         "rating": enrollment.rating,
                         "review": enrollment.review,
-                        "course_avg_rating": course.rating
+                        "course_avg_rating": course_avg_rating
                     }
                 },
                 status=status.HTTP_200_OK
@@ -364,6 +359,8 @@ class EnrolledStudentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Enrollment
         fields = ['_id', 'full_name', 'enrollment_date', 'is_completed']
+        list_serializer_class = CrossDatabaseListSerializer
+        prefetch_across = ['student']
     
     def get_full_name(self, obj):
         return f"{obj.student.first_name} {obj.student.last_name}"
@@ -382,7 +379,7 @@ class TeacherStudentsListView(generics.ListAPIView):
         # Get enrollments for courses taught by current teacher
         return Enrollment.objects.filter(
             course__teacher=self.request.user
-        ).select_related('student', 'course').order_by('-enrollment_date')
+        ).order_by('-enrollment_date')
 
     def list(self, request, *args, **kwargs):
         try:
@@ -401,7 +398,9 @@ class TeacherStudentsListView(generics.ListAPIView):
             # Group by course if requested
             if request.query_params.get('group') == 'course':
                 grouped_data = defaultdict(list)
-                for enrollment in queryset:
+                # Students live in PostgreSQL, courses in MongoDB: one query each
+                enrollments = prefetch_related_across_databases(list(queryset), 'student', 'course')
+                for enrollment in enrollments:
                     course_name = enrollment.course.title
                     grouped_data[course_name].append({
                         'student_id': str(enrollment.student.id),
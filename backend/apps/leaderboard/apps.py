@@ -20,8 +20,9 @@ class LeaderboardConfig(AppConfig):
             # Connect signals after models are loaded
             self.connect_signals()
             
-            # Initialize indexes after migrations complete
-            post_migrate.connect(self.init_leaderboard, sender=self)
+            # Provision indexes once after migrations complete, never per request
+            from backend.mongo_indexes import provision_indexes
+            post_migrate.connect(provision_indexes, sender=self)
             
             logger.info("Leaderboard app initialized successfully")
         except Exception as e:
@@ -32,17 +33,3 @@ class LeaderboardConfig(AppConfig):
         """Connect signals after models are ready"""
         from . import signals  # noqa
         logger.debug("Leaderboard signals connected")
-    
-    def init_leaderboard(self, sender, **kwargs):
-        """Initialize leaderboard indexes and existing users after migrations"""
-        try:
-            from .utils import ensure_indexes, init_existing_users
-            ensure_indexes()
-            
-            # Only init users during actual migrations, not during runserver
-            if kwargs.get('verbosity', 0) > 0:
-                init_existing_users()
-                
-            logger.info("Leaderboard indexes and users initialized")
-        except Exception as e:
-            logger.error(f"Leaderboard initialization failed: {str(e)}", exc_info=True)
\ No newline at end of file
@@ -0,0 +1,299 @@
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from statistics import median
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test.utils import override_settings
+from pymongo import MongoClient
+
+from backend.mongo import CommandMetrics, override_database
+from .buffer import PointsBuffer
+from .ranking import rebuild_ranks
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_DB_NAME = 'leaderboard_benchmark'
+ROLES = ('student', 'teacher', 'school')
+# Share of seeded entries per role, roughly what production looks like
+ROLE_WEIGHTS = (0.8, 0.15, 0.05)
+# Operation -> share of the mixed workload
+DEFAULT_MIX = {"update": 20, "status": 50, "page": 20, "top": 10}
+SEED_BATCH_SIZE = 10000
+# The benchmark never touches the configured cache, which may be the shared Redis
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'leaderboard-benchmark',
+    }
+}
+# Driver calls counted on mongomock, which emits no command events
+COUNTED_METHODS = (
+    'find', 'find_one', 'find_one_and_update', 'count_documents', 'aggregate',
+    'insert_one', 'insert_many', 'update_one', 'update_many', 'delete_one', 'delete_many',
+    'bulk_write', 'create_index'
+)
+
+
+class BenchmarkUser:
+    """Stand-in for auth.User, only what the leaderboard functions read"""
+
+    def __init__(self, user_id):
+        self.id = user_id
+        self.username = f"bench_user_{user_id}"
+
+    def get_full_name(self):
+        return f"Bench User {self.id}"
+
+
+class _CountingCollection:
+    def __init__(self, collection, counter):
+        self._collection = collection
+        self._counter = counter
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name in COUNTED_METHODS:
+            def counted(*args, **kwargs):
+                self._counter.started_count += 1
+                self._counter.commands[name] += 1
+                return attr(*args, **kwargs)
+            return counted
+        return attr
+
+
+class _CountingDatabase:
+    """Database proxy counting driver calls when command events are not available"""
+
+    def __init__(self, db, counter):
+        self._db = db
+        self._counter = counter
+
+    def __getitem__(self, name):
+        return _CountingCollection(self._db[name], self._counter)
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+
+def connect(mongo_uri=None, db_name=BENCHMARK_DB_NAME):
+    """
+    Open the benchmark database on a local mongod, or in memory through
+    mongomock when no URI is given
+    Returns:
+        (database handle, CommandMetrics counting its operations)
+    """
+    metrics = CommandMetrics()
+    if mongo_uri:
+        client = MongoClient(mongo_uri, event_listeners=[metrics])
+        return client[db_name], metrics
+
+    try:
+        import mongomock
+    except ImportError:
+        raise RuntimeError(
+            "mongomock is not installed: pip install -r requirements-dev.txt, or pass a MongoDB URI instead"
+        )
+    return _CountingDatabase(mongomock.MongoClient()[db_name], metrics), metrics
+
+
+def seed(db, size, seed_value=0):
+    """
+    Replace the benchmark leaderboard with `size` random entries spread over
+    the roles, ranks included
+    Returns:
+        dict of role -> list of seeded user ids
+    """
+    rng = random.Random(seed_value)
+    collection = db['leaderboard']
+    collection.delete_many({})
+
+    started = datetime.utcnow() - timedelta(days=30)
+    user_ids = {role: [] for role in ROLES}
+    batch = []
+    for user_id in range(1, size + 1):
+        role = rng.choices(ROLES, ROLE_WEIGHTS)[0]
+        user_ids[role].append(user_id)
+        batch.append({
+            "user_id": str(user_id),
+            "user_name": f"Bench User {user_id}",
+            "role": role,
+            "points": int(rng.paretovariate(1.5) * 10),
+            "last_updated": started + timedelta(seconds=rng.randrange(30 * 86400))
+        })
+        if len(batch) >= SEED_BATCH_SIZE:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+    for role in ROLES:
+        rebuild_ranks(collection, role)
+    return user_ids
+
+
+def _percentile(samples, percent):
+    ordered = sorted(samples)
+    index = min(int(round(percent / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def summarize(name, samples, ops, elapsed):
+    """Latency percentiles (ms), Mongo ops per call and throughput of one operation"""
+    return {
+        "operation": name,
+        "calls": len(samples),
+        "p50_ms": round(median(samples), 3) if samples else None,
+        "p99_ms": round(_percentile(samples, 99), 3) if samples else None,
+        "max_ms": round(max(samples), 3) if samples else None,
+        "mongo_ops_per_call": round(ops / len(samples), 2) if samples else None,
+        "throughput_per_s": round(len(samples) / elapsed, 1) if elapsed else None
+    }
+
+
+class _InlineBuffer(PointsBuffer):
+    """Points buffer flushed inline by the benchmark instead of by a worker thread"""
+
+    def _ensure_worker(self):
+        pass
+
+    def _apply(self, batch, replay=False):
+        from .utils import process_points_changes
+        # Benchmark user ids may belong to real users, no badges are awarded
+        return process_points_changes(list(batch.values()), award_badges=False, replay=replay)
+
+    def add(self, *args, **kwargs):
+        super().add(*args, **kwargs)
+        if self._events >= self.max_events:
+            self.flush()
+
+
+class LeaderboardBenchmark:
+    """
+    Mixed read/update workload against a seeded benchmark database.
+
+    Every operation goes through the same leaderboard functions the API
+    uses, with get_mongo_db routed to the benchmark database, so the
+    numbers include index use and rank maintenance as deployed.
+    """
+
+    def __init__(self, db, metrics, user_ids, mix=None, seed_value=0):
+        self.db = db
+        self.metrics = metrics
+        self.user_ids = user_ids
+        self.mix = mix or DEFAULT_MIX
+        self.rng = random.Random(seed_value)
+        # Points changes take the path the profile signals take in production
+        self.buffer = _InlineBuffer() if getattr(settings, 'LEADERBOARD_WRITE_BEHIND', True) else None
+        self.operations = {
+            "update": self._update,
+            "status": self._status,
+            "page": self._page,
+            "top": self._top,
+        }
+        unknown = set(self.mix) - set(self.operations)
+        if unknown:
+            raise ValueError(f"Unknown benchmark operations: {', '.join(sorted(unknown))}")
+
+    def _random_user(self):
+        role = self.rng.choices(ROLES, ROLE_WEIGHTS)[0]
+        return BenchmarkUser(self.rng.choice(self.user_ids[role])), role
+
+    def _update(self):
+        from .utils import process_points_changes
+        user, role = self._random_user()
+        entry = self.db['leaderboard'].find_one({"user_id": str(user.id), "role": role}, {"points": 1})
+        delta = self.rng.randint(1, 50)
+        change = {
+            "user_id": str(user.id),
+            "user_name": user.get_full_name(),
+            "role": role,
+            "points": entry["points"] + delta,
+            "delta": delta
+        }
+        if self.buffer is not None:
+            self.buffer.add(change["user_id"], change["user_name"], role, change["points"], delta)
+        else:
+            process_points_changes([change], award_badges=False)
+
+    def _status(self):
+        from .utils import get_user_leaderboard_status
+        user, role = self._random_user()
+        get_user_leaderboard_status(user, role)
+
+    def _page(self):
+        from .utils import get_leaderboard_page
+        role = self.rng.choices(ROLES, ROLE_WEIGHTS)[0]
+        page = get_leaderboard_page(role, limit=50)
+        # Follow one cursor so deep pages are part of the sample too
+        if page["next_cursor"]:
+            get_leaderboard_page(role, cursor=page["next_cursor"], limit=50)
+
+    def _top(self):
+        from .utils import get_leaderboard_data
+        get_leaderboard_data()
+
+    def _timed(self, operation):
+        ops_before = self.metrics.started_count
+        started = time.perf_counter()
+        operation()
+        return (time.perf_counter() - started) * 1000, self.metrics.started_count - ops_before
+
+    def run(self, requests, warmup=0):
+        """
+        Run `requests` operations drawn from the mix
+        Returns:
+            list of per-operation summaries followed by the overall one
+        """
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        samples = {name: [] for name in names}
+        ops = dict.fromkeys(names, 0)
+
+        with override_database(self.db), override_settings(CACHES=BENCHMARK_CACHES):
+            cache.clear()
+            for _ in range(warmup):
+                self.operations[self.rng.choices(names, weights)[0]]()
+
+            started = time.perf_counter()
+            for _ in range(requests):
+                name = self.rng.choices(names, weights)[0]
+                elapsed_ms, call_ops = self._timed(self.operations[name])
+                samples[name].append(elapsed_ms)
+                ops[name] += call_ops
+            if self.buffer is not None:
+                # Changes still buffered are part of the workload's cost
+                self.buffer.flush()
+            elapsed = time.perf_counter() - started
+
+        results = [
+            summarize(name, samples[name], ops[name], elapsed)
+            for name in names if samples[name]
+        ]
+        results.append(summarize(
+            "mixed", [sample for name in names for sample in samples[name]], sum(ops.values()), elapsed
+        ))
+        return results
+
+    def run_rebuild(self, role='student'):
+        """Time one full rank rebuild of a role through recalculate_ranks"""
+        from .utils import recalculate_ranks
+
+        with override_database(self.db), override_settings(CACHES=BENCHMARK_CACHES):
+            elapsed_ms, call_ops = self._timed(lambda: recalculate_ranks(role))
+        return summarize(f"recalculate_ranks:{role}", [elapsed_ms], call_ops, elapsed_ms / 1000)
+
+
+def parse_mix(value):
+    """Parse an operation mix such as 'update=20,status=50,page=20,top=10'"""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if not name.strip() or not weight.strip().isdigit():
+            raise ValueError(f"Invalid mix entry: {part}")
+        mix[name.strip()] = int(weight)
+    if not any(mix.values()):
+        raise ValueError("Mix needs at least one operation with a positive weight")
+    return mix
@@ -0,0 +1,255 @@
+import atexit
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from bson import ObjectId
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError
+
+from backend.mongo import acquire_lease, get_mongo_db, release_lease
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_COLLECTION = 'leaderboard_pending'
+
+
+class _JournalBatch:
+    """Events journaled by one insert, shared by the add calls waiting on it"""
+
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.error = None
+
+
+class PointsBuffer:
+    """
+    Write-behind buffer for leaderboard points changes.
+
+    Changes are coalesced per (user, role) in memory and flushed together
+    every LEADERBOARD_BUFFER_FLUSH_MS or once LEADERBOARD_BUFFER_MAX_EVENTS
+    events are pending. Every change is recorded as its own event in a
+    MongoDB journal before add returns (at-least-once): changes arriving
+    while a journal write is in flight are written together by the next
+    one, so concurrent requests share inserts instead of paying one each.
+    Events held by a worker that dies before flushing are replayed by the
+    next recovery pass. Flushed events are acknowledged by id and the period
+    buckets count each event id once, so replaying one changes nothing.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._journaled = threading.Condition(self._lock)
+        self._wakeup = threading.Event()
+        self._pending = {}
+        self._events = 0
+        self._open_batch = None
+        self._journal_writing = False
+        self._thread = None
+        self._pid = None
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'LEADERBOARD_BUFFER_FLUSH_MS', 500) / 1000
+
+    @property
+    def max_events(self):
+        return getattr(settings, 'LEADERBOARD_BUFFER_MAX_EVENTS', 100)
+
+    def _journal(self):
+        return get_mongo_db()[JOURNAL_COLLECTION]
+
+    def add(self, user_id, user_name, role, points, delta=0):
+        """
+        Queue a points change, durable once this returns
+        Raises:
+            PyMongoError: if the change could not be journaled, it is not queued
+        """
+        self._ensure_worker()
+
+        event = {
+            "_id": ObjectId(),
+            "key": f"{role}:{user_id}",
+            "user_id": user_id,
+            "user_name": user_name,
+            "role": role,
+            "points": points,
+            "delta": delta,
+            "queued_at": datetime.utcnow()
+        }
+
+        with self._journaled:
+            if self._open_batch is None:
+                self._open_batch = _JournalBatch()
+            batch = self._open_batch
+            batch.events.append(event)
+            while not batch.done:
+                if self._journal_writing:
+                    self._journaled.wait()
+                else:
+                    self._write_open_batch()
+            full = self._events >= self.max_events
+
+        if batch.error is not None:
+            raise batch.error
+        if full:
+            self._wakeup.set()
+
+    def _write_open_batch(self):
+        """Journal the open batch and queue its events, called holding the lock"""
+        batch, self._open_batch = self._open_batch, None
+        self._journal_writing = True
+        self._lock.release()
+        try:
+            self._journal().insert_many(batch.events, ordered=False)
+        except BulkWriteError as e:
+            # Events written by an earlier attempt are already journaled
+            if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+                batch.error = e
+        except Exception as e:
+            batch.error = e
+        finally:
+            self._lock.acquire()
+
+        if batch.error is None:
+            for event in batch.events:
+                self._queue(event)
+        batch.done = True
+        self._journal_writing = False
+        self._journaled.notify_all()
+
+    def _queue(self, event):
+        """Merge a journaled event into its pending change, called holding the lock"""
+        entry = self._pending.setdefault(event["key"], {
+            "user_id": event["user_id"], "role": event["role"], "delta": 0, "events": []
+        })
+        entry.update(user_name=event["user_name"], points=event["points"])
+        entry["delta"] += event["delta"]
+        entry["events"].append({"_id": event["_id"], "delta": event["delta"], "at": event["queued_at"]})
+        self._events += 1
+
+    def flush(self):
+        """Apply all pending changes, returns the list of applied changes"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            self._events = 0
+
+        if not batch:
+            return []
+
+        try:
+            # A failed attempt may have counted part of a requeued batch already
+            applied = self._apply(batch, replay=any(entry.get("replay") for entry in batch.values()))
+        except Exception as e:
+            logger.error(f"Leaderboard buffer flush failed, will retry: {str(e)}", exc_info=True)
+            self._requeue(batch)
+            return []
+
+        try:
+            self._acknowledge(batch)
+        except Exception as e:
+            # Changes are applied, replaying their journal events later is a no-op
+            logger.error(f"Failed to acknowledge leaderboard buffer flush: {str(e)}")
+        return applied
+
+    def recover(self):
+        """
+        Replay journal events that no live worker flushed in time,
+        e.g. left behind by a worker killed during a restart
+        """
+        stale_after = getattr(settings, 'LEADERBOARD_BUFFER_RECOVER_AFTER', 60)
+        token = acquire_lease('leaderboard_buffer_recover', stale_after)
+        if token is None:
+            return []
+
+        try:
+            cutoff = datetime.utcnow() - timedelta(seconds=stale_after)
+            batch = {}
+            for event in self._journal().find({"queued_at": {"$lt": cutoff}}).sort("queued_at", ASCENDING):
+                entry = batch.setdefault(event.get("key", event["_id"]), {
+                    "user_id": event["user_id"], "role": event["role"], "delta": 0, "events": []
+                })
+                # The latest event carries the points, only applied if nothing newer was
+                entry.update(user_name=event["user_name"], points=event["points"], queued_at=event["queued_at"])
+                entry["delta"] += event["delta"]
+                entry["events"].append({"_id": event["_id"], "delta": event["delta"], "at": event["queued_at"]})
+            if not batch:
+                return []
+
+            logger.warning(f"Recovering {len(batch)} unflushed leaderboard changes")
+            applied = self._apply(batch, replay=True)
+            self._acknowledge(batch)
+            return applied
+        finally:
+            release_lease('leaderboard_buffer_recover', token)
+
+    def _apply(self, batch, replay=False):
+        from .utils import process_points_changes
+        return process_points_changes(list(batch.values()), replay=replay)
+
+    def _acknowledge(self, batch):
+        """Remove the flushed events from the journal"""
+        self._journal().delete_many({
+            "_id": {"$in": [event["_id"] for entry in batch.values() for event in entry["events"]]}
+        })
+
+    def _requeue(self, batch):
+        """Merge a failed batch back, keeping newer points queued meanwhile"""
+        with self._lock:
+            for key, entry in batch.items():
+                newer = self._pending.get(key)
+                if newer:
+                    newer["delta"] += entry["delta"]
+                    newer["events"] = entry["events"] + newer["events"]
+                else:
+                    newer = self._pending[key] = entry
+                newer["replay"] = True
+                self._events += len(entry["events"])
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked child: changes queued in the parent are the parent's to flush
+                self._pending = {}
+                self._events = 0
+                self._open_batch = None
+                self._journal_writing = False
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._run, name='leaderboard-buffer', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        recover_every = getattr(settings, 'LEADERBOARD_BUFFER_RECOVER_AFTER', 60)
+        last_recovery = None
+
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+            now = datetime.utcnow()
+            if last_recovery is None or (now - last_recovery).total_seconds() >= recover_every:
+                last_recovery = now
+                try:
+                    self.recover()
+                except Exception as e:
+                    logger.error(f"Leaderboard buffer recovery failed: {str(e)}")
+
+
+points_buffer = PointsBuffer()
+
+
+@atexit.register
+def _flush_on_exit():
+    # Best effort, anything left over is replayed from the journal
+    if points_buffer._pending:
+        points_buffer.flush()
@@ -0,0 +1,123 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+STATS_PREFIX = "leaderboard_cache_stats"
+STAT_NAMES = ("hits", "stale_hits", "misses", "refreshes", "refresh_failures", "refresh_ms_total")
+
+
+def _incr(name, amount=1):
+    key = f"{STATS_PREFIX}:{name}"
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        cache.set(key, amount, None)
+
+
+def get_cache_stats():
+    """Hit, miss and refresh latency counters shared by every worker"""
+    values = cache.get_many([f"{STATS_PREFIX}:{name}" for name in STAT_NAMES + ("refresh_ms_last",)])
+    stats = {name: values.get(f"{STATS_PREFIX}:{name}", 0) for name in STAT_NAMES}
+    stats["refresh_ms_last"] = values.get(f"{STATS_PREFIX}:refresh_ms_last")
+    stats["refresh_ms_avg"] = round(stats["refresh_ms_total"] / stats["refreshes"], 2) if stats["refreshes"] else None
+    lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+    stats["hit_rate"] = round((stats["hits"] + stats["stale_hits"]) / lookups, 4) if lookups else None
+    return stats
+
+
+class StaleWhileRevalidateCache:
+    """
+    Cache entry that keeps serving its last value after it goes stale while
+    exactly one worker, holding a cache-backed lock, rebuilds it.
+
+    An entry is fresh for LEADERBOARD_CACHE_TTL seconds and kept for
+    LEADERBOARD_CACHE_STALE_TTL seconds. A refresh starts in the background
+    LEADERBOARD_CACHE_REFRESH_AHEAD seconds before the entry goes stale, so
+    readers normally never see a stale value at all.
+    """
+
+    def __init__(self, key, loader):
+        self.key = key
+        self.lock_key = f"{key}:refresh_lock"
+        self.loader = loader
+
+    @property
+    def fresh_ttl(self):
+        return getattr(settings, 'LEADERBOARD_CACHE_TTL', 60)
+
+    @property
+    def stale_ttl(self):
+        return max(getattr(settings, 'LEADERBOARD_CACHE_STALE_TTL', 600), self.fresh_ttl)
+
+    @property
+    def refresh_ahead(self):
+        return getattr(settings, 'LEADERBOARD_CACHE_REFRESH_AHEAD', 10)
+
+    @property
+    def lock_timeout(self):
+        return getattr(settings, 'LEADERBOARD_CACHE_LOCK_TIMEOUT', 30)
+
+    def get(self):
+        entry = cache.get(self.key)
+        now = time.time()
+
+        if entry is not None:
+            if now < entry["fresh_until"]:
+                _incr("hits")
+                if now >= entry["fresh_until"] - self.refresh_ahead:
+                    self._refresh_in_background()
+            else:
+                _incr("stale_hits")
+                self._refresh_in_background()
+            return entry["data"]
+
+        _incr("misses")
+        if cache.add(self.lock_key, True, self.lock_timeout):
+            return self._refresh()
+
+        # Another worker is building the value, wait for it instead of piling on
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(self.key)
+            if entry is not None:
+                return entry["data"]
+
+        logger.warning(f"Timed out waiting for {self.key} refresh, loading directly")
+        return self.loader()
+
+    def invalidate(self):
+        """Mark the entry stale, readers keep the old value until the refresh lands"""
+        entry = cache.get(self.key)
+        if entry is not None:
+            entry["fresh_until"] = 0
+            cache.set(self.key, entry, self.stale_ttl)
+
+    def _refresh_in_background(self):
+        if cache.add(self.lock_key, True, self.lock_timeout):
+            threading.Thread(target=self._refresh, daemon=True).start()
+
+    def _refresh(self):
+        """Rebuild the entry, caller must hold the refresh lock"""
+        started = time.monotonic()
+        try:
+            data = self.loader()
+            cache.set(self.key, {"data": data, "fresh_until": time.time() + self.fresh_ttl}, self.stale_ttl)
+
+            elapsed_ms = round((time.monotonic() - started) * 1000)
+            _incr("refreshes")
+            _incr("refresh_ms_total", elapsed_ms)
+            cache.set(f"{STATS_PREFIX}:refresh_ms_last", elapsed_ms, None)
+            return data
+        except Exception as e:
+            _incr("refresh_failures")
+            logger.error(f"Failed to refresh {self.key}: {str(e)}")
+            raise
+        finally:
+            cache.delete(self.lock_key)
@@ -0,0 +1,79 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.apps.leaderboard.benchmark import (
+    BENCHMARK_DB_NAME, DEFAULT_MIX, LeaderboardBenchmark, connect, parse_mix, seed
+)
+from backend.apps.leaderboard.utils import ensure_indexes
+from backend.mongo import override_database
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway leaderboard into a local mongod or mongomock and report '
+        'p50/p99 latency, Mongo ops per request and throughput of a mixed workload'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mongo-uri',
+            help='Local MongoDB to benchmark against; when omitted the in-memory mongomock is used, practical for a few thousand entries only'
+        )
+        parser.add_argument(
+            '--db-name', default=BENCHMARK_DB_NAME,
+            help='Database seeded and dropped by the benchmark'
+        )
+        parser.add_argument('--size', type=int, default=10000, help='Leaderboard entries to seed')
+        parser.add_argument('--requests', type=int, default=2000, help='Measured operations')
+        parser.add_argument('--warmup', type=int, default=100, help='Unmeasured operations run first')
+        parser.add_argument(
+            '--mix', default=','.join(f'{name}={weight}' for name, weight in DEFAULT_MIX.items()),
+            help='Operation weights, e.g. update=20,status=50,page=20,top=10'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for data and workload')
+        parser.add_argument('--skip-rebuild', action='store_true', help='Do not time a full rank rebuild')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded database afterwards')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        if options['db_name'] == settings.DATABASES['mongodb']['NAME']:
+            raise CommandError('Refusing to seed the application database, pick another --db-name')
+        if options['size'] < 1 or options['requests'] < 1:
+            raise CommandError('--size and --requests must be positive')
+
+        try:
+            mix = parse_mix(options['mix'])
+            db, metrics = connect(options['mongo_uri'], options['db_name'])
+        except (ValueError, RuntimeError) as e:
+            raise CommandError(str(e))
+
+        try:
+            started = time.monotonic()
+            with override_database(db):
+                ensure_indexes()
+            user_ids = seed(db, options['size'], options['seed'])
+            self.stderr.write(f"Seeded {options['size']} entries in {time.monotonic() - started:.2f}s")
+
+            benchmark = LeaderboardBenchmark(db, metrics, user_ids, mix, options['seed'])
+            results = benchmark.run(options['requests'], options['warmup'])
+            if not options['skip_rebuild']:
+                results.append(benchmark.run_rebuild())
+        finally:
+            if not options['keep']:
+                db.client.drop_database(options['db_name'])
+
+        if options['json']:
+            self.stdout.write(json.dumps({
+                "size": options['size'],
+                "backend": 'mongod' if options['mongo_uri'] else 'mongomock',
+                "results": results
+            }, indent=2))
+            return
+
+        columns = ('operation', 'calls', 'p50_ms', 'p99_ms', 'max_ms', 'mongo_ops_per_call', 'throughput_per_s')
+        self.stdout.write(''.join(f'{column:>20}' for column in columns))
+        for result in results:
+            self.stdout.write(''.join(f'{str(result[column]):>20}' for column in columns))
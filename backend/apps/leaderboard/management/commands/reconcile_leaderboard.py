@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from backend.apps.leaderboard.utils import run_reconciliation
+
+
+class Command(BaseCommand):
+    help = 'Reconcile leaderboard points with user profiles, once or on an interval'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Run a single pass and exit'
+        )
+        parser.add_argument(
+            '--interval', type=int,
+            default=getattr(settings, 'LEADERBOARD_RECONCILE_INTERVAL', 300),
+            help='Seconds between passes'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int,
+            default=getattr(settings, 'LEADERBOARD_RECONCILE_CHUNK_SIZE', 1000),
+            help='Leaderboard entries diffed per profile query'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            try:
+                corrections = run_reconciliation(options['chunk_size'])
+                if corrections is None:
+                    self.stdout.write('Reconciliation already running in another process, skipped')
+                else:
+                    self.stdout.write(
+                        f'Reconciled leaderboard: {corrections} corrections '
+                        f'in {time.monotonic() - started:.2f}s'
+                    )
+            except Exception as e:
+                self.stderr.write(f'Reconciliation failed: {str(e)}')
+                if options['once']:
+                    raise
+
+            if options['once']:
+                return
+
+            # Next pass starts one interval after this one started
+            time.sleep(max(options['interval'] - (time.monotonic() - started), 0))
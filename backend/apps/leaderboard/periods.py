@@ -0,0 +1,197 @@
+import logging
+from datetime import datetime, timedelta
+
+import pymongo
+from django.conf import settings
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+PERIODS = ('daily', 'weekly', 'monthly')
+EVENTS_COLLECTION = 'leaderboard_events'
+BUCKETS_COLLECTION = 'leaderboard_buckets'
+
+BUCKET_SORT = [
+    ("points", pymongo.DESCENDING),
+    ("last_updated", pymongo.ASCENDING)
+]
+
+
+def period_start(period, at=None):
+    """Start (UTC midnight) of the daily, weekly (Monday) or monthly period containing `at`"""
+    at = at or datetime.utcnow()
+    day = datetime(at.year, at.month, at.day)
+    if period == 'daily':
+        return day
+    if period == 'weekly':
+        return day - timedelta(days=day.weekday())
+    if period == 'monthly':
+        return day.replace(day=1)
+    raise ValueError(f"Unknown leaderboard period: {period}")
+
+
+def period_end(period, start):
+    """Exclusive end of the period starting at `start`"""
+    if period == 'daily':
+        return start + timedelta(days=1)
+    if period == 'weekly':
+        return start + timedelta(weeks=1)
+    if period == 'monthly':
+        return (start + timedelta(days=32)).replace(day=1)
+    raise ValueError(f"Unknown leaderboard period: {period}")
+
+
+def _bucket_id(period, start, role, user_id):
+    return f"{period}:{start:%Y%m%d}:{role}:{user_id}"
+
+
+def _events_of(change, at):
+    """
+    Points events folded into a change: buffered changes carry their journal
+    events (id, delta and queue time), a direct change is one event of its own
+    """
+    if change.get('events'):
+        return change['events']
+    return [{"_id": None, "delta": change.get('delta') or 0, "at": at}]
+
+
+def _applied_event_ids(collection, bucket_ids):
+    """Event ids already counted in the given buckets"""
+    applied = set()
+    for bucket in collection.find({"_id": {"$in": list(bucket_ids)}}, {"event_ids": 1}):
+        applied.update(bucket.get("event_ids", []))
+    return applied
+
+
+def _ignore_duplicates(error):
+    """Re-raise a BulkWriteError unless every failure is a duplicate key"""
+    if any(write_error.get('code') != 11000 for write_error in error.details.get('writeErrors', [])):
+        raise error
+
+
+def record_points_events(db, changes, at=None, replay=False):
+    """
+    Log points deltas and add them to the daily/weekly/monthly buckets.
+    Buckets and events expire on their own through TTL indexes.
+
+    Events carrying a journal id are counted at most once: each is logged
+    under its id and each bucket keeps the ids it recently counted, an
+    update only matching while none of its ids is among them. Events land
+    in the buckets of the moment they were queued, so a replay hits the
+    same buckets as the original flush.
+    Args:
+        db: MongoDB database handle
+        changes: iterable of dicts with user_id, user_name, role and delta,
+            plus the journal events folded into them for buffered changes
+        replay: the events may already be counted, e.g. journal recovery;
+            buckets are read first so already counted events are skipped
+    """
+    at = at or datetime.utcnow()
+    bucket_retention = timedelta(days=getattr(settings, 'LEADERBOARD_PERIOD_RETENTION_DAYS', 90))
+    event_retention = timedelta(days=getattr(settings, 'LEADERBOARD_EVENT_RETENTION_DAYS', 30))
+    kept_ids = getattr(settings, 'LEADERBOARD_BUCKET_EVENT_IDS', 500)
+
+    log = []
+    buckets = {}
+    for change in changes:
+        for event in _events_of(change, at):
+            if not event['delta']:
+                continue
+            entry = {
+                "user_id": change['user_id'],
+                "role": change['role'],
+                "delta": event['delta'],
+                "at": event['at'],
+                "expires_at": event['at'] + event_retention
+            }
+            if event['_id'] is not None:
+                entry["_id"] = event['_id']
+            log.append(entry)
+
+            for period in PERIODS:
+                start = period_start(period, event['at'])
+                bucket_id = _bucket_id(period, start, change['role'], change['user_id'])
+                bucket = buckets.setdefault(bucket_id, {
+                    "period": period,
+                    "start": start,
+                    "change": change,
+                    "delta": 0,
+                    "event_ids": [],
+                    "last_updated": event['at']
+                })
+                bucket["delta"] += event['delta']
+                bucket["last_updated"] = max(bucket["last_updated"], event['at'])
+                if event['_id'] is not None:
+                    bucket["event_ids"].append(event['_id'])
+    if not log:
+        return 0
+
+    try:
+        db[EVENTS_COLLECTION].insert_many(log, ordered=False)
+    except BulkWriteError as e:
+        # Events logged by an earlier attempt
+        _ignore_duplicates(e)
+
+    if replay:
+        applied = _applied_event_ids(db[BUCKETS_COLLECTION], buckets)
+        for bucket in buckets.values():
+            fresh = [event_id for event_id in bucket["event_ids"] if event_id not in applied]
+            if len(fresh) < len(bucket["event_ids"]):
+                # Only the events not counted yet are added
+                fresh_ids = set(fresh)
+                bucket["delta"] = sum(
+                    event['delta']
+                    for event in _events_of(bucket["change"], at)
+                    if event['_id'] in fresh_ids and period_start(bucket["period"], event['at']) == bucket["start"]
+                )
+                bucket["event_ids"] = fresh
+
+    operations = []
+    for bucket_id, bucket in buckets.items():
+        change = bucket["change"]
+        if not bucket["delta"] and bucket["event_ids"] == []:
+            continue
+        update = {
+            "$inc": {"points": bucket["delta"]},
+            "$set": {"user_name": change['user_name'], "last_updated": bucket["last_updated"]},
+            "$setOnInsert": {
+                "period": bucket["period"],
+                "period_start": bucket["start"],
+                "role": change['role'],
+                "user_id": change['user_id'],
+                "expires_at": period_end(bucket["period"], bucket["start"]) + bucket_retention
+            }
+        }
+        query = {"_id": bucket_id}
+        if bucket["event_ids"]:
+            query["event_ids"] = {"$nin": bucket["event_ids"]}
+            update["$push"] = {"event_ids": {"$each": bucket["event_ids"], "$slice": -kept_ids}}
+        operations.append(UpdateOne(query, update, upsert=True))
+
+    if operations:
+        try:
+            db[BUCKETS_COLLECTION].bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # A guarded upsert whose events are already counted collides with its bucket
+            _ignore_duplicates(e)
+    return len(log)
+
+
+def get_period_leaderboard(db, period, start, limit):
+    """Top entries of each role for one period, read straight from its buckets"""
+    from .utils import serialize_entry
+
+    collection = db[BUCKETS_COLLECTION]
+    data = {
+        "period": period,
+        "period_start": start.isoformat(),
+        "period_end": period_end(period, start).isoformat()
+    }
+    for role, key in (('student', 'students'), ('teacher', 'teachers'), ('school', 'schools')):
+        entries = collection.find(
+            {"period": period, "period_start": start, "role": role, "points": {"$gt": 0}}
+        ).sort(BUCKET_SORT).limit(limit)
+        data[key] = [serialize_entry(entry, index + 1) for index, entry in enumerate(entries)]
+    return data
+
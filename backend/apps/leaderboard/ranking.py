@@ -0,0 +1,148 @@
+import logging
+import pymongo
+
+logger = logging.getLogger(__name__)
+
+# Ordering used for every rank in the leaderboard collection
+RANK_SORT = [
+    ("points", pymongo.DESCENDING),
+    ("last_updated", pymongo.ASCENDING)
+]
+
+# Total order used for keyset pagination, _id breaks exact ties
+PAGE_SORT = RANK_SORT + [("_id", pymongo.ASCENDING)]
+REVERSE_PAGE_SORT = [(field, -direction) for field, direction in PAGE_SORT]
+
+
+def ranked_above_filter(role, points, last_updated):
+    """
+    Filter matching entries of a role that rank above the given score
+    (more points, or same points reached earlier)
+    """
+    return {
+        "role": role,
+        "$or": [
+            {"points": {"$gt": points}},
+            {"points": points, "last_updated": {"$lt": last_updated}}
+        ]
+    }
+
+
+def count_ranked_above(collection, role, points, last_updated, exclude_id=None):
+    """Count entries ranked above the given score using the (role, points) index"""
+    query = ranked_above_filter(role, points, last_updated)
+    if exclude_id is not None:
+        query["_id"] = {"$ne": exclude_id}
+    return collection.count_documents(query)
+
+
+def rebuild_ranks(collection, role):
+    """Rewrite every rank of a role from scratch. Used for repairs only."""
+    cursor = collection.find({"role": role}, {"_id": 1, "rank": 1}).sort(PAGE_SORT)
+
+    bulk_operations = []
+    for index, entry in enumerate(cursor):
+        # Skip documents that already hold the right rank
+        if entry.get("rank") != index + 1:
+            bulk_operations.append(
+                pymongo.UpdateOne({"_id": entry["_id"]}, {"$set": {"rank": index + 1}})
+            )
+
+    if bulk_operations:
+        collection.bulk_write(bulk_operations, ordered=False)
+    return len(bulk_operations)
+
+
+def apply_points_change(collection, role, user_data, previous=None):
+    """
+    Write a user's new points and shift only the ranks between the old
+    and the new position.
+
+    Args:
+        collection: leaderboard collection
+        role: 'student', 'teacher' or 'school'
+        user_data: document fields to set, must contain user_id, points and last_updated
+        previous: the user's current leaderboard document, None for a new entry
+    Returns:
+        the user's new rank
+    """
+    old_rank = previous.get("rank") if previous else None
+    user_filter = {"user_id": user_data["user_id"], "role": role}
+
+    if previous is not None and not old_rank:
+        # Existing entry was never ranked, the role cannot be patched incrementally
+        collection.update_one(user_filter, {"$set": user_data}, upsert=True)
+        rebuild_ranks(collection, role)
+        entry = collection.find_one(user_filter, {"rank": 1})
+        return entry.get("rank") if entry else None
+
+    exclude_id = previous["_id"] if previous else None
+    new_rank = count_ranked_above(
+        collection, role, user_data["points"], user_data["last_updated"], exclude_id
+    ) + 1
+
+    others = {"role": role}
+    if exclude_id is not None:
+        others["_id"] = {"$ne": exclude_id}
+
+    if old_rank is None:
+        # New entry pushes everyone at or below its position down by one
+        others["rank"] = {"$gte": new_rank}
+        shift = 1
+    elif new_rank < old_rank:
+        # Moved up: entries it overtook move down by one
+        others["rank"] = {"$gte": new_rank, "$lt": old_rank}
+        shift = 1
+    elif new_rank > old_rank:
+        # Moved down: entries that overtook it move up by one
+        others["rank"] = {"$gt": old_rank, "$lte": new_rank}
+        shift = -1
+    else:
+        shift = 0
+
+    shifted = 0
+    if shift:
+        shifted = collection.update_many(others, {"$inc": {"rank": shift}}).modified_count
+
+    collection.update_one(
+        user_filter,
+        {"$set": dict(user_data, rank=new_rank)},
+        upsert=True
+    )
+
+    logger.debug(
+        f"Rank change for {user_data['user_id']} ({role}): "
+        f"{old_rank} -> {new_rank}, shifted {shifted} entries"
+    )
+    return new_rank
+
+
+def compute_rank(collection, entry):
+    """Read-only rank of a leaderboard document, one indexed count"""
+    return count_ranked_above(
+        collection, entry["role"], entry["points"], entry["last_updated"], entry["_id"]
+    ) + 1
+
+
+def after_position_filter(role, points, last_updated, entry_id):
+    """Filter matching entries ranked after a (points, last_updated, _id) position"""
+    return {
+        "role": role,
+        "$or": [
+            {"points": {"$lt": points}},
+            {"points": points, "last_updated": {"$gt": last_updated}},
+            {"points": points, "last_updated": last_updated, "_id": {"$gt": entry_id}}
+        ]
+    }
+
+
+def before_position_filter(role, points, last_updated, entry_id):
+    """Filter matching entries ranked before a (points, last_updated, _id) position"""
+    return {
+        "role": role,
+        "$or": [
+            {"points": {"$gt": points}},
+            {"points": points, "last_updated": {"$lt": last_updated}},
+            {"points": points, "last_updated": last_updated, "_id": {"$lt": entry_id}}
+        ]
+    }
@@ -1,10 +1,18 @@
-from django.db.models.signals import post_save, pre_save
+from django.conf import settings
+from django.db.models.signals import post_init, post_save, pre_save
 from django.dispatch import receiver
 from django.db import transaction
 import logging
 
 logger = logging.getLogger(__name__)
 
+@receiver(post_init, sender='authentication.Student')
+@receiver(post_init, sender='authentication.Teacher')
+@receiver(post_init, sender='authentication.School')
+def remember_points(sender, instance, **kwargs):
+    """Keep the loaded points so changes are detected without re-reading the row"""
+    instance._original_points = instance.__dict__.get('points')
+
 @receiver(pre_save, sender='authentication.Student')
 @receiver(pre_save, sender='authentication.Teacher')
 @receiver(pre_save, sender='authentication.School')
@@ -13,17 +21,14 @@ def check_points_change(sender, instance, **kwargs):
     if not instance.pk:  # New instance, no previous points
         return
         
-    try:
-        old_instance = sender.objects.get(pk=instance.pk)
-        if old_instance.points != instance.points:
-            logger.info(
-                f"Points change detected for {instance.user.id}: "
-                f"{old_instance.points} -> {instance.points}"
-            )
-            # Store the points change on the instance for post_save to use
-            instance._points_changed = True
-    except sender.DoesNotExist:
-        pass
+    original_points = getattr(instance, '_original_points', None)
+    if original_points is not None and original_points != instance.points:
+        logger.info(
+            f"Points change detected for {instance.user_id}: "
+            f"{original_points} -> {instance.points}"
+        )
+        # Store the points change on the instance for post_save to use
+        instance._points_changed = True
 
 @receiver(post_save, sender='authentication.Student')
 @receiver(post_save, sender='authentication.Teacher')
@@ -31,6 +36,11 @@ def check_points_change(sender, instance, **kwargs):
 def update_leaderboard_on_points_change(sender, instance, created, **kwargs):
     """Update leaderboard only if points changed"""
     points_changed = getattr(instance, '_points_changed', False) or created
+    previous_points = getattr(instance, '_original_points', None) or 0
+    
+    # The saved value is the baseline for the next save of this instance
+    instance._points_changed = False
+    instance._original_points = instance.points
     
     if not points_changed:
         return
@@ -48,15 +58,35 @@ def update_leaderboard_on_points_change(sender, instance, created, **kwargs):
     
     if not role:
         return
-        
+    
+    user = instance.user
+    points = instance.points
+    delta = points if created else points - previous_points
+    
     def execute_update():
-        from .utils import update_leaderboard
+        from .utils import process_points_changes
         try:
-            logger.info(f"Executing leaderboard update for {instance.user.id} with {instance.points} points")
-            success = update_leaderboard(instance.user, instance.points, role)
-            if not success:
-                logger.error(f"Failed to update leaderboard for {instance.user.id}")
+            logger.info(f"Executing leaderboard update for {user.id} with {points} points")
+            process_points_changes([{
+                "user_id": str(user.id),
+                "user_name": user.get_full_name() or user.username,
+                "role": role,
+                "points": points,
+                "delta": delta
+            }])
         except Exception as e:
             logger.error(f"Error in leaderboard update: {str(e)}", exc_info=True)
     
-    transaction.on_commit(execute_update)
\ No newline at end of file
+    def enqueue_update():
+        from .buffer import points_buffer
+        try:
+            points_buffer.add(str(user.id), user.get_full_name() or user.username, role, points, delta)
+        except Exception as e:
+            # Journal unavailable, fall back to a direct write
+            logger.error(f"Failed to buffer leaderboard update, writing directly: {str(e)}")
+            execute_update()
+    
+    if getattr(settings, 'LEADERBOARD_WRITE_BEHIND', True):
+        transaction.on_commit(enqueue_update)
+    else:
+        transaction.on_commit(execute_update)
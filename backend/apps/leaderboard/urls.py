@@ -1,9 +1,15 @@
 # leaderboard/urls.py
 from django.urls import path
-from .views import  LeaderboardView, UserLeaderboardStatusView
+from .views import (
+    LeaderboardView, UserLeaderboardStatusView, LeaderboardCacheStatsView,
+    RoleLeaderboardView, LeaderboardAroundMeView
+)
 
 urlpatterns = [
     path('', LeaderboardView.as_view(), name='leaderboard'),
     path('my-status/', UserLeaderboardStatusView.as_view(), name='user-leaderboard-status'),
+    path('cache-stats/', LeaderboardCacheStatsView.as_view(), name='leaderboard-cache-stats'),
+    path('<str:role>/', RoleLeaderboardView.as_view(), name='role-leaderboard'),
+    path('<str:role>/around-me/', LeaderboardAroundMeView.as_view(), name='leaderboard-around-me'),
     
 ]
\ No newline at end of file
@@ -1,19 +1,31 @@
-from pymongo import MongoClient
 from django.conf import settings
 import logging
 from datetime import datetime, timedelta
 import pymongo
 from pymongo import UpdateOne
 
-from backend.apps.authentication import apps
+from django.apps import apps
+from backend.mongo import acquire_lease, get_mongo_db, release_lease
+from backend.mongo_indexes import ensure_mongo_indexes
+from backend.pagination import decode_cursor, encode_cursor
+from bson import ObjectId
+from bson.errors import InvalidId
+from .caching import StaleWhileRevalidateCache
+from .periods import PERIODS, get_period_leaderboard, period_start, record_points_events
+from .ranking import (
+    PAGE_SORT, RANK_SORT, REVERSE_PAGE_SORT, after_position_filter, apply_points_change,
+    before_position_filter, compute_rank, rebuild_ranks
+)
 
 logger = logging.getLogger(__name__)
 
+# Number of entries per role shown on the public leaderboard
+LEADERBOARD_TOP_SIZE = 100
+
 def get_db_handle():
-    """Get MongoDB database handle using settings configuration"""
+    """Get MongoDB database handle backed by the shared, pooled client"""
     try:
-        client = MongoClient(settings.DATABASES['mongodb']['CLIENT']['host'])
-        return client[settings.DATABASES['mongodb']['NAME']]
+        return get_mongo_db('mongodb')
     except Exception as e:
         logger.error(f"Error connecting to MongoDB: {str(e)}")
         raise
@@ -44,179 +56,298 @@ def update_leaderboard(user, points, role):
             "last_updated": datetime.utcnow()
         }
         
-        result = collection.update_one(
-            {"user_id": user_data["user_id"], "role": role},
-            {"$set": user_data},
-            upsert=True
-        )
+        # Only the ranks between the old and new position are shifted
+        new_rank = apply_points_change(collection, role, user_data, previous=existing)
+        invalidate_rank_cache(role)
+        invalidate_leaderboard_if_top_changed(existing.get('rank') if existing else None, new_rank)
         
         logger.info(
             f"Leaderboard update for {user.id}: "
-            f"Matched {result.matched_count}, "
-            f"Modified {result.modified_count}, "
-            f"Upserted {result.upserted_id}"
+            f"{existing.get('points') if existing else None} -> {points} points, "
+            f"rank {existing.get('rank') if existing else None} -> {new_rank}"
         )
         
-        # Force immediate rank recalculation
-        recalculate_ranks(role)
-        
         return True
     except Exception as e:
         logger.error(f"Failed to update leaderboard: {str(e)}")
         return False
-def recalculate_ranks(role):
-    """Completely recalculate ranks for a specific role based on current points"""
+
+def apply_points_batch(changes):
+    """
+    Apply coalesced points changes to the leaderboard.
+    Small batches are ranked incrementally per user, large batches are
+    written with one bulk upsert followed by one rank pass per role.
+    Args:
+        changes: iterable of dicts with user_id, user_name, role and points,
+            plus queued_at for replayed changes: their points are skipped when
+            the entry was updated since, the entry already holds newer points
+    Returns:
+        list of applied changes with old/new points and old/new rank
+    """
     db = get_db_handle()
     collection = db['leaderboard']
+    rebuild_threshold = getattr(settings, 'LEADERBOARD_BUFFER_REBUILD_THRESHOLD', 50)
     
-    try:
-        # Get all users of this role sorted properly
-        users = list(collection.find({"role": role}).sort([
-            ("points", pymongo.DESCENDING),
-            ("last_updated", pymongo.ASCENDING)
-        ]))
+    changes_by_role = {}
+    for change in changes:
+        changes_by_role.setdefault(change['role'], []).append(change)
+    
+    applied = []
+    for role, role_changes in changes_by_role.items():
+        existing = {
+            entry['user_id']: entry
+            for entry in collection.find({
+                "role": role,
+                "user_id": {"$in": [change['user_id'] for change in role_changes]}
+            })
+        }
+        
+        now = datetime.utcnow()
+        updates = []
+        for change in role_changes:
+            previous = existing.get(change['user_id'])
+            if previous and previous.get('points') == change['points']:
+                continue
+            if previous and change.get('queued_at') and (previous.get('last_updated') or datetime.min) >= change['queued_at']:
+                continue
+            updates.append((previous, {
+                "user_id": change['user_id'],
+                "user_name": change['user_name'],
+                "role": role,
+                "points": change['points'],
+                # Distinct timestamps keep the tie-break deterministic within a batch
+                "last_updated": now + timedelta(milliseconds=len(updates))
+            }))
+        
+        if not updates:
+            continue
         
-        # Update ranks in bulk
-        bulk_operations = []
-        for index, user in enumerate(users):
-            bulk_operations.append(
-                pymongo.UpdateOne(
-                    {"_id": user["_id"]},
-                    {"$set": {"rank": index + 1}}
+        if len(updates) > rebuild_threshold:
+            collection.bulk_write([
+                UpdateOne(
+                    {"user_id": user_data['user_id'], "role": role},
+                    {"$set": user_data},
+                    upsert=True
                 )
-            )
+                for _, user_data in updates
+            ], ordered=False)
+            rebuild_ranks(collection, role)
+            new_ranks = {
+                entry['user_id']: entry.get('rank')
+                for entry in collection.find(
+                    {"role": role, "user_id": {"$in": [user_data['user_id'] for _, user_data in updates]}},
+                    {"user_id": 1, "rank": 1}
+                )
+            }
+        else:
+            new_ranks = {
+                user_data['user_id']: apply_points_change(collection, role, user_data, previous=previous)
+                for previous, user_data in updates
+            }
         
-        if bulk_operations:
-            collection.bulk_write(bulk_operations)
-            
+        invalidate_rank_cache(role)
+        if any(
+            _touches_top(previous.get('rank') if previous else None, new_ranks.get(user_data['user_id']))
+            for previous, user_data in updates
+        ):
+            leaderboard_cache.invalidate()
+        
+        for previous, user_data in updates:
+            applied.append({
+                "user_id": user_data['user_id'],
+                "role": role,
+                "old_points": previous.get('points') if previous else None,
+                "points": user_data['points'],
+                "old_rank": previous.get('rank') if previous else None,
+                "rank": new_ranks.get(user_data['user_id'])
+            })
+        
+        logger.info(f"Applied {len(updates)} buffered {role} points changes")
+    
+    return applied
+
+def process_points_changes(changes, award_badges=True, replay=False):
+    """
+    Apply points changes to the leaderboard, the period buckets and badges
+    Args:
+        changes: list of dicts with user_id, user_name, role, points and delta
+        award_badges: False skips badge evaluation, e.g. for benchmark users
+        replay: the changes' events may already be counted, e.g. journal recovery
+    Returns:
+        list of applied leaderboard changes
+    """
+    applied = apply_points_batch(changes)
+    record_leaderboard_events(changes, replay)
+    
+    if applied and award_badges:
+        from backend.apps.achievements.engine import badge_engine
+        try:
+            # Only users whose points or rank moved are evaluated
+            badge_engine.evaluate(applied, leaderboard=get_db_handle()['leaderboard'])
+        except Exception as e:
+            logger.error(f"Failed to evaluate badges: {str(e)}", exc_info=True)
+    
+    return applied
+
+def recalculate_ranks(role):
+    """
+    Completely recalculate ranks for a specific role based on current points.
+    Regular points changes are ranked incrementally by update_leaderboard,
+    this full pass is only needed to repair drifted ranks.
+    """
+    db = get_db_handle()
+    collection = db['leaderboard']
+    
+    try:
+        return rebuild_ranks(collection, role)
     except Exception as e:
         logger.error(f"Failed to recalculate ranks: {str(e)}")
         raise
 
 def check_and_assign_badges(user, points, role):
     """
-    Check and assign badges based on points and achievements
+    Check and assign every point badge a user qualifies for
     Args:
         user: User model instance
         points: Current user points
         role: User role
     """
-    from .models import Badge
+    from backend.apps.achievements.engine import badge_engine
     
     try:
-        # Get the profile based on role
-        if role == 'student':
-            profile = user.student_profile
-        elif role == 'teacher':
-            profile = user.teacher_profile
-        elif role == 'school':
-            profile = user.school_profile
-        else:
-            return
-        
-        # Initialize badges if not exists
-        if not hasattr(profile, 'badges'):
-            profile.badges = []
-        
-        # Check for point-based badges
-        point_badges = Badge.objects.filter(
-            points_required__lte=points,
-            role_specific=role
-        ).exclude(name__in=[b.get('name') for b in profile.badges])
-        
-        for badge in point_badges:
-            profile.badges.append({
-                'name': badge.name,
-                'description': badge.description,
-                'earned_at': datetime.now().isoformat()
-            })
-        
-        # Check for registration badge if this is the first update
-        if len(profile.badges) == 0:
-            registration_badge = Badge.objects.filter(
-                name__contains='Registration',
-                role_specific=role
-            ).first()
-            if registration_badge:
-                profile.badges.append({
-                    'name': registration_badge.name,
-                    'description': registration_badge.description,
-                    'earned_at': datetime.now().isoformat()
-                })
-        
-        profile.save()
+        badge_engine.evaluate([{
+            "user_id": str(user.id),
+            "role": role,
+            "old_points": None,
+            "points": points,
+            "old_rank": None,
+            "rank": None
+        }])
     except Exception as e:
         logger.error(f"Failed to assign badges: {str(e)}")
 
+def serialize_entry(entry, rank):
+    """Convert a leaderboard document to its API representation"""
+    processed_entry = {
+        "_id": str(entry["_id"]),
+        "user_id": entry["user_id"],
+        "user_name": entry["user_name"],
+        "points": entry["points"],
+        "rank": rank,
+        "last_updated": entry["last_updated"].isoformat() 
+        if isinstance(entry["last_updated"], datetime) 
+        else entry["last_updated"]
+    }
+    if rank is not None and rank <= 3:  # Only calculate medals for top 3
+        medals = ["gold", "silver", "bronze"]
+        processed_entry["medal"] = medals[rank - 1]
+    return processed_entry
+
+def _entry_position(entry):
+    return {
+        "points": entry["points"],
+        "last_updated": entry["last_updated"].isoformat(),
+        "_id": str(entry["_id"])
+    }
+
+def _position_from_cursor(cursor):
+    position = decode_cursor(cursor)
+    try:
+        return (
+            int(position["points"]),
+            datetime.fromisoformat(position["last_updated"]),
+            ObjectId(position["_id"])
+        )
+    except (KeyError, TypeError, ValueError, InvalidId) as e:
+        raise ValueError(f"Invalid cursor: {str(e)}")
+
+def get_leaderboard_page(role, cursor=None, limit=50):
+    """
+    Keyset-paginated leaderboard of one role, ordered by
+    (points desc, last_updated asc, _id asc). Every page is a single
+    indexed range scan, so deep pages cost the same as the first one.
+    Raises:
+        ValueError: if the cursor is malformed
+    """
+    db = get_db_handle()
+    collection = db['leaderboard']
+    
+    query = {"role": role}
+    if cursor:
+        query = after_position_filter(role, *_position_from_cursor(cursor))
+    
+    entries = list(collection.find(query).sort(PAGE_SORT).limit(limit + 1))
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    
+    return {
+        "role": role,
+        "results": [serialize_entry(entry, entry.get("rank")) for entry in entries],
+        "next_cursor": encode_cursor(_entry_position(entries[-1])) if has_more else None
+    }
+
+def get_leaderboard_around_user(user, role, size=5):
+    """
+    Window of the leaderboard around a user: up to `size` entries ranked
+    directly above and below them, plus their own entry.
+    Returns None if the user is not on the leaderboard.
+    """
+    db = get_db_handle()
+    collection = db['leaderboard']
+    
+    user_entry = collection.find_one({"user_id": str(user.id), "role": role})
+    if not user_entry:
+        return None
+    
+    position = (user_entry["points"], user_entry["last_updated"], user_entry["_id"])
+    above = list(
+        collection.find(before_position_filter(role, *position)).sort(REVERSE_PAGE_SORT).limit(size)
+    )[::-1]
+    below = list(
+        collection.find(after_position_filter(role, *position)).sort(PAGE_SORT).limit(size)
+    )
+    
+    rank = user_entry.get("rank") or compute_rank(collection, user_entry)
+    window = above + [user_entry] + below
+    first_rank = rank - len(above)
+    
+    return {
+        "role": role,
+        "rank": rank,
+        "results": [
+            dict(serialize_entry(entry, first_rank + index), is_current_user=entry is user_entry)
+            for index, entry in enumerate(window)
+        ]
+    }
+
 def get_leaderboard_data():
     """
-    Optimized leaderboard data fetching with smart verification
+    Top entries of each role, the loader of leaderboard_cache.
+    Errors are raised, not turned into empty lists, so a failed refresh
+    keeps the stale board being served and counts as a refresh failure.
     """
     db = get_db_handle()
     collection = db['leaderboard']
     
-    try:
-        # Run fast verification in background
-        from threading import Thread
-        Thread(target=fast_verify_leaderboard, daemon=True).start()
-        
-        # Get current data immediately
-        students = list(collection.find({"role": "student"}).sort([
-            ("points", pymongo.DESCENDING),
-            ("last_updated", pymongo.ASCENDING)
-        ]).limit(100))  # Limit to top 100 for each category
-        
-        teachers = list(collection.find({"role": "teacher"}).sort([
-            ("points", pymongo.DESCENDING),
-            ("last_updated", pymongo.ASCENDING)
-        ]).limit(100))
-        
-        schools = list(collection.find({"role": "school"}).sort([
-            ("points", pymongo.DESCENDING),
-            ("last_updated", pymongo.ASCENDING)
-        ]).limit(100))
-        
-        # Process entries (same as before)
-        def process_entries(entries):
-            processed = []
-            for index, entry in enumerate(entries):
-                processed_entry = {
-                    "_id": str(entry["_id"]),
-                    "user_id": entry["user_id"],
-                    "user_name": entry["user_name"],
-                    "points": entry["points"],
-                    "rank": index + 1,
-                    "last_updated": entry["last_updated"].isoformat() 
-                    if isinstance(entry["last_updated"], datetime) 
-                    else entry["last_updated"]
-                }
-                if index < 3:  # Only calculate medals for top 3
-                    medals = ["gold", "silver", "bronze"]
-                    processed_entry["medal"] = medals[index]
-                processed.append(processed_entry)
-            return processed
-        
-        return {
-            "students": process_entries(students),
-            "teachers": process_entries(teachers),
-            "schools": process_entries(schools)
-        }
-        
-    except Exception as e:
-        logger.error(f"Failed to get leaderboard data: {str(e)}")
-        return {"students": [], "teachers": [], "schools": []}
+    students = list(collection.find({"role": "student"}).sort(RANK_SORT).limit(LEADERBOARD_TOP_SIZE))  # Limit to top 100 for each category
+    
+    teachers = list(collection.find({"role": "teacher"}).sort(RANK_SORT).limit(LEADERBOARD_TOP_SIZE))
+    
+    schools = list(collection.find({"role": "school"}).sort(RANK_SORT).limit(LEADERBOARD_TOP_SIZE))
+    
+    def process_entries(entries):
+        return [serialize_entry(entry, index + 1) for index, entry in enumerate(entries)]
+    
+    return {
+        "students": process_entries(students),
+        "teachers": process_entries(teachers),
+        "schools": process_entries(schools)
+    }
+
 def ensure_indexes():
-    """Ensure MongoDB indexes exist for optimal performance"""
+    """Ensure the leaderboard MongoDB indexes declared in backend.mongo_indexes exist"""
     try:
-        db = get_db_handle()
-        collection = db['leaderboard']
-        
-        collection.create_index([("role", pymongo.ASCENDING), ("points", pymongo.DESCENDING)])
-        
-        collection.create_index([("user_id", pymongo.ASCENDING), ("role", pymongo.ASCENDING)], unique=True)
-        
-        collection.create_index([("last_updated", pymongo.ASCENDING)])
-        
+        ensure_mongo_indexes('leaderboard', get_db_handle())
         logger.info("MongoDB indexes ensured for leaderboard")
     except Exception as e:
         logger.error(f"Failed to ensure MongoDB indexes: {str(e)}")
@@ -235,9 +366,6 @@ def get_user_leaderboard_status(user, role):
     collection = db['leaderboard']
     
     try:
-        # First ensure ranks are up to date for this role
-        recalculate_ranks(role)
-        
         # Find the user in leaderboard
         user_entry = collection.find_one({
             "user_id": str(user.id),
@@ -245,11 +373,17 @@ def get_user_leaderboard_status(user, role):
         })
         
         if user_entry:
+            # Rank is computed on read, nothing is written back
+            rank = get_cached_rank(role, user_entry["user_id"])
+            if rank is None:
+                rank = compute_rank(collection, user_entry)
+                set_cached_rank(role, user_entry["user_id"], rank)
+            
             return {
                 "user_id": user_entry["user_id"],
                 "user_name": user_entry["user_name"],
                 "points": user_entry["points"],
-                "rank": user_entry.get("rank"),
+                "rank": rank,
                 "role": role,
                 "is_on_leaderboard": True
             }
@@ -258,94 +392,189 @@ def get_user_leaderboard_status(user, role):
         logger.error(f"Error getting user leaderboard status: {str(e)}")
         return None
 
-def fast_verify_leaderboard():
+def reconcile_leaderboard(chunk_size=None):
     """
-    Optimized verification using bulk operations and selective checking
+    Reconcile leaderboard points with the Student/Teacher/School profiles.
+    Entries are read from MongoDB in chunks, the matching profile points are
+    loaded with one IN query per role and chunk, and all corrections are
+    applied with a single bulk_write. Ranks of corrected roles are repaired.
     Returns count of corrected entries
     """
     db = get_db_handle()
     collection = db['leaderboard']
-    corrections = 0
+    chunk_size = chunk_size or getattr(settings, 'LEADERBOARD_RECONCILE_CHUNK_SIZE', 1000)
+    profile_models = {
+        'student': apps.get_model('authentication', 'Student'),
+        'teacher': apps.get_model('authentication', 'Teacher'),
+        'school': apps.get_model('authentication', 'School'),
+    }
     
-    # Only verify entries that haven't been checked recently
-    cutoff_time = datetime.utcnow() - timedelta(minutes=5)
+    bulk_ops = []
+    corrected_roles = set()
+    missing_profiles = 0
     
-    try:
-        # Get all leaderboard entries that need verification
-        to_verify = list(collection.find({
-            "$or": [
-                {"last_verified": {"$exists": False}},
-                {"last_verified": {"$lt": cutoff_time}}
-            ]
-        }))
+    def diff_chunk(entries):
+        nonlocal missing_profiles
+        entries_by_role = {}
+        for entry in entries:
+            entries_by_role.setdefault(entry['role'], []).append(entry)
         
-        if not to_verify:
-            return 0
+        for role, role_entries in entries_by_role.items():
+            model = profile_models.get(role)
+            if model is None:
+                continue
             
-        # Prepare bulk operations
-        bulk_ops = []
-        user_cache = {}
-        
-        for entry in to_verify:
-            user_id = entry['user_id']
-            role = entry['role']
+            user_ids = [int(entry['user_id']) for entry in role_entries if entry['user_id'].isdigit()]
+            source_points = {
+                str(user_id): points
+                for user_id, points in model.objects.filter(
+                    user_id__in=user_ids
+                ).values_list('user_id', 'points')
+            }
             
-            # Get source points (with caching)
-            if (user_id, role) not in user_cache:
-                try:
-                    if role == 'student':
-                        profile = apps.get_model('authentication', 'Student').objects.get(user__id=user_id)
-                    elif role == 'teacher':
-                        profile = apps.get_model('authentication', 'Teacher').objects.get(user__id=user_id)
-                    elif role == 'school':
-                        profile = apps.get_model('authentication', 'School').objects.get(user__id=user_id)
-                    
-                    user_cache[(user_id, role)] = profile.points
-                except Exception as e:
-                    logger.warning(f"Couldn't fetch profile for {user_id}: {str(e)}")
+            for entry in role_entries:
+                if entry['user_id'] not in source_points:
+                    missing_profiles += 1
                     continue
-            
-            source_points = user_cache[(user_id, role)]
-            
-            if entry['points'] != source_points:
-                bulk_ops.append(UpdateOne(
-                    {"_id": entry['_id']},
-                    {"$set": {
-                        "points": source_points,
-                        "last_updated": datetime.utcnow(),
-                        "last_verified": datetime.utcnow()
-                    }}
-                ))
-                corrections += 1
-            else:
-                bulk_ops.append(UpdateOne(
-                    {"_id": entry['_id']},
-                    {"$set": {"last_verified": datetime.utcnow()}}
-                ))
+                
+                if entry.get('points') != source_points[entry['user_id']]:
+                    now = datetime.utcnow()
+                    bulk_ops.append(UpdateOne(
+                        {"_id": entry['_id']},
+                        {"$set": {
+                            "points": source_points[entry['user_id']],
+                            "last_updated": now,
+                            "last_verified": now
+                        }}
+                    ))
+                    corrected_roles.add(role)
+    
+    try:
+        cursor = collection.find(
+            {}, {"user_id": 1, "role": 1, "points": 1}
+        ).sort("_id", pymongo.ASCENDING).batch_size(chunk_size)
         
-        # Execute all updates in a single batch
-        if bulk_ops:
-            collection.bulk_write(bulk_ops)
-            logger.info(f"Fast verification completed. Made {corrections} corrections.")
+        chunk = []
+        for entry in cursor:
+            chunk.append(entry)
+            if len(chunk) >= chunk_size:
+                diff_chunk(chunk)
+                chunk = []
+        if chunk:
+            diff_chunk(chunk)
         
-        return corrections
+        if missing_profiles:
+            logger.warning(f"Leaderboard reconciliation found {missing_profiles} entries without a profile")
+        
+        if not bulk_ops:
+            return 0
+        
+        # Execute all corrections in a single batch
+        collection.bulk_write(bulk_ops, ordered=False)
+        for role in corrected_roles:
+            rebuild_ranks(collection, role)
+            invalidate_rank_cache(role)
+        leaderboard_cache.invalidate()
+        
+        logger.info(f"Leaderboard reconciliation completed. Made {len(bulk_ops)} corrections.")
+        return len(bulk_ops)
         
     except Exception as e:
-        logger.error(f"Error in fast verification: {str(e)}")
+        logger.error(f"Error in leaderboard reconciliation: {str(e)}")
         raise
 
+def run_reconciliation(chunk_size=None):
+    """
+    Run one reconciliation pass unless another process is already running one
+    Returns count of corrected entries, None if the pass was skipped
+    """
+    lock_ttl = max(getattr(settings, 'LEADERBOARD_RECONCILE_INTERVAL', 300), 60)
+    token = acquire_lease('leaderboard_reconcile', lock_ttl)
+    if token is None:
+        logger.info("Leaderboard reconciliation already running elsewhere, skipping")
+        return None
+    
+    try:
+        return reconcile_leaderboard(chunk_size)
+    finally:
+        release_lease('leaderboard_reconcile', token)
+
 from django.core.cache import cache
 
+leaderboard_cache = StaleWhileRevalidateCache("leaderboard_data", get_leaderboard_data)
+
 def get_cached_leaderboard():
     """
-    Get leaderboard data with smart caching
+    Get leaderboard data, served stale while a single worker refreshes it
     """
-    cache_key = "leaderboard_data"
-    data = cache.get(cache_key)
-    
-    if data is None:
-        data = get_leaderboard_data()
-        # Cache for 1 minute, but background verification will keep it fresh
-        cache.set(cache_key, data, 60)
-    
-    return data
\ No newline at end of file
+    return leaderboard_cache.get()
+
+def _touches_top(old_rank, new_rank):
+    return any(rank is not None and rank <= LEADERBOARD_TOP_SIZE for rank in (old_rank, new_rank))
+
+def invalidate_leaderboard_if_top_changed(old_rank, new_rank):
+    """Mark the cached leaderboard stale when a move enters, leaves or reorders the top entries"""
+    if _touches_top(old_rank, new_rank):
+        leaderboard_cache.invalidate()
+
+def _rank_cache_key(role, user_id):
+    # Keys embed a per-role version so one points change invalidates the whole role
+    version = cache.get(f"leaderboard_rank_version:{role}", 0)
+    return f"leaderboard_rank:{role}:{version}:{user_id}"
+
+def get_cached_rank(role, user_id):
+    """Get a user's cached rank, None on miss or when the rank cache is disabled"""
+    if not getattr(settings, 'LEADERBOARD_RANK_CACHE_TTL', 0):
+        return None
+    return cache.get(_rank_cache_key(role, user_id))
+
+def set_cached_rank(role, user_id, rank):
+    timeout = getattr(settings, 'LEADERBOARD_RANK_CACHE_TTL', 0)
+    if timeout:
+        cache.set(_rank_cache_key(role, user_id), rank, timeout)
+
+def invalidate_rank_cache(role):
+    """
+    Invalidate cached ranks of a role. Any points change can move the rank
+    of every other user of the role, so the role version is bumped.
+    """
+    version_key = f"leaderboard_rank_version:{role}"
+    if not cache.add(version_key, 1, None):
+        try:
+            cache.incr(version_key)
+        except ValueError:
+            # Key expired between add and incr
+            cache.set(version_key, 1, None)
+
+
+_period_caches = {}
+
+def _get_period_cache(period):
+    """SWR cache of the current period, replaced when the period rolls over"""
+    start = period_start(period)
+    key = f"leaderboard_data:{period}:{start:%Y%m%d}"
+    period_cache = _period_caches.get(period)
+    if period_cache is None or period_cache.key != key:
+        period_cache = StaleWhileRevalidateCache(
+            key, lambda: get_period_leaderboard(get_db_handle(), period, start, LEADERBOARD_TOP_SIZE)
+        )
+        _period_caches[period] = period_cache
+    return period_cache
+
+def get_cached_period_leaderboard(period):
+    """
+    Get the daily, weekly or monthly leaderboard of the current period
+    Raises:
+        ValueError: if the period is unknown
+    """
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of: lifetime, {', '.join(PERIODS)}")
+    return _get_period_cache(period).get()
+
+def record_leaderboard_events(changes, replay=False):
+    """Add points deltas to the period buckets and mark the period boards stale"""
+    recorded = record_points_events(get_db_handle(), changes, replay=replay)
+    if recorded:
+        for period in PERIODS:
+            _get_period_cache(period).invalidate()
+    return recorded
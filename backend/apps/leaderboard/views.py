@@ -2,6 +2,7 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
+from backend.apps.authentication.permissions import IsAdminUser
 from django.apps import apps
 import logging
 
@@ -11,11 +12,19 @@ class LeaderboardView(APIView):
     def get(self, request):
         """
         Get leaderboard data with fast cached response
+        GET params:
+        - period: lifetime (default), daily, weekly or monthly
         """
         try:
-            from .utils import get_cached_leaderboard
-            leaderboard_data = get_cached_leaderboard()
+            from .utils import get_cached_leaderboard, get_cached_period_leaderboard
+            period = request.query_params.get('period', 'lifetime')
+            if period == 'lifetime':
+                leaderboard_data = get_cached_leaderboard()
+            else:
+                leaderboard_data = get_cached_period_leaderboard(period)
             return Response(leaderboard_data, status=status.HTTP_200_OK)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             logger.error(f"Leaderboard fetch failed: {str(e)}")
             return Response(
@@ -23,6 +32,77 @@ class LeaderboardView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+ROLE_ALIASES = {
+    'student': 'student', 'students': 'student',
+    'teacher': 'teacher', 'teachers': 'teacher',
+    'school': 'school', 'schools': 'school',
+}
+
+class RoleLeaderboardView(APIView):
+    def get(self, request, role):
+        """
+        Keyset-paginated leaderboard of one role
+        GET params:
+        - cursor: next_cursor from the previous page
+        - limit: page size (default 50, max 100)
+        """
+        role = ROLE_ALIASES.get(role)
+        if not role:
+            return Response({"error": "Unknown leaderboard role"}, status=status.HTTP_404_NOT_FOUND)
+        
+        try:
+            from backend.pagination import parse_limit
+            from .utils import get_leaderboard_page
+            limit = parse_limit(request.query_params.get('limit'), default=50, maximum=100)
+            page = get_leaderboard_page(role, request.query_params.get('cursor'), limit)
+            return Response(page, status=status.HTTP_200_OK)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Leaderboard page fetch failed: {str(e)}")
+            return Response(
+                {"error": "Could not retrieve leaderboard"}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+class LeaderboardAroundMeView(APIView):
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, role):
+        """
+        Entries ranked directly above and below the current user
+        GET params:
+        - size: entries on each side (default 5, max 50)
+        """
+        role = ROLE_ALIASES.get(role)
+        if not role:
+            return Response({"error": "Unknown leaderboard role"}, status=status.HTTP_404_NOT_FOUND)
+        
+        try:
+            from backend.pagination import parse_limit
+            from .utils import get_leaderboard_around_user
+            size = parse_limit(request.query_params.get('size'), default=5, maximum=50)
+            window = get_leaderboard_around_user(request.user, role, size)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Leaderboard window fetch failed: {str(e)}")
+            return Response(
+                {"error": "Could not retrieve leaderboard"}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        
+        if window is None:
+            return Response(
+                {
+                    "message": "You need to gain more points to appear on the leaderboard",
+                    "is_on_leaderboard": False,
+                    "role": role
+                },
+                status=status.HTTP_200_OK
+            )
+        return Response(window, status=status.HTTP_200_OK)
+
 class UserLeaderboardStatusView(APIView):
     permission_classes = [IsAuthenticated]
     
@@ -73,4 +153,12 @@ class UserLeaderboardStatusView(APIView):
             return Response(
                 {"error": "Could not check your leaderboard status"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+
+class LeaderboardCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        """Hit, miss and refresh latency counters of the leaderboard cache"""
+        from .caching import get_cache_stats
+        return Response(get_cache_stats(), status=status.HTTP_200_OK)
@@ -0,0 +1,14 @@
+from django.http import JsonResponse
+
+from backend.mongo import ping_mongo
+from backend.mongo_indexes import mongo_indexes_ready
+
+
+def readiness(request):
+    """Ready once MongoDB answers and every declared index is provisioned"""
+    mongo = ping_mongo()
+    indexes_ready = mongo["ok"] and mongo_indexes_ready()
+    return JsonResponse(
+        {"ready": indexes_ready, "mongodb": mongo, "indexes_ready": indexes_ready},
+        status=200 if indexes_ready else 503
+    )
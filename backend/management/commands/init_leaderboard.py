@@ -14,9 +14,7 @@ class Command(BaseCommand):
             self.stdout.write(f"Updated student: {student.user.email}")
         
         # Verify MongoDB entry
-        from pymongo import MongoClient
-        from django.conf import settings
-        client = MongoClient(settings.DATABASES['mongodb']['CLIENT']['host'])
-        db = client[settings.DATABASES['mongodb']['NAME']]
+        from backend.apps.leaderboard.utils import get_db_handle
+        db = get_db_handle()
         entry = db.leaderboard.find_one({"user_id": str(student.user.id)})
         self.stdout.write(f"MongoDB entry: {entry}")
\ No newline at end of file
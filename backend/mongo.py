@@ -0,0 +1,224 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from bson import Decimal128
+from django.conf import settings
+from pymongo import MongoClient, monitoring
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Counts commands sent through a client and their latency"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_count = 0
+            self.succeeded_count = 0
+            self.failed_count = 0
+            self.total_duration_ms = 0.0
+            self.commands = Counter()
+
+    def started(self, event):
+        with self._lock:
+            self.started_count += 1
+            self.commands[event.command_name] += 1
+
+    def succeeded(self, event):
+        with self._lock:
+            self.succeeded_count += 1
+            self.total_duration_ms += event.duration_micros / 1000
+
+    def failed(self, event):
+        with self._lock:
+            self.failed_count += 1
+            self.total_duration_ms += event.duration_micros / 1000
+
+    def snapshot(self):
+        with self._lock:
+            finished = self.succeeded_count + self.failed_count
+            return {
+                "started": self.started_count,
+                "succeeded": self.succeeded_count,
+                "failed": self.failed_count,
+                "avg_duration_ms": round(self.total_duration_ms / finished, 3) if finished else 0.0,
+                "commands": dict(self.commands)
+            }
+
+
+_lock = threading.Lock()
+_clients = {}
+_metrics = {}
+_pid = os.getpid()
+_overrides = {}
+
+
+def _reset_after_fork():
+    """
+    Forget clients inherited from the parent process. Their sockets and
+    monitor threads belong to the parent, so the child (e.g. a gunicorn
+    worker) lazily builds its own.
+    """
+    global _lock, _pid
+    _lock = threading.Lock()
+    _clients.clear()
+    _metrics.clear()
+    _pid = os.getpid()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _client_options(alias):
+    """Build MongoClient kwargs from the matching settings.DATABASES entry"""
+    options = dict(settings.DATABASES[alias].get('CLIENT', {}))
+    options.setdefault('maxPoolSize', getattr(settings, 'MONGO_MAX_POOL_SIZE', 100))
+    options.setdefault('minPoolSize', getattr(settings, 'MONGO_MIN_POOL_SIZE', 0))
+    options.update(getattr(settings, 'MONGO_CLIENT_OPTIONS', {}))
+    # Connect on first operation so a client built before forking stays unused
+    options.setdefault('connect', False)
+    return options
+
+
+def get_mongo_client(alias='mongodb'):
+    """
+    Get the process-wide MongoClient for a database alias.
+    The client is created on first use and then shared by every thread.
+    """
+    if os.getpid() != _pid:
+        _reset_after_fork()
+
+    client = _clients.get(alias)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(alias)
+        if client is None:
+            metrics = CommandMetrics()
+            options = _client_options(alias)
+            options['event_listeners'] = list(options.get('event_listeners', [])) + [metrics]
+            client = MongoClient(**options)
+            _metrics[alias] = metrics
+            _clients[alias] = client
+            logger.info(
+                f"Created MongoDB client for '{alias}' "
+                f"(maxPoolSize={options['maxPoolSize']}, pid={_pid})"
+            )
+    return client
+
+
+def get_mongo_db(alias='mongodb'):
+    """Get the database configured by NAME for a database alias"""
+    if alias in _overrides:
+        return _overrides[alias]
+    return get_mongo_client(alias)[settings.DATABASES[alias]['NAME']]
+
+
+@contextmanager
+def override_database(db, alias='mongodb'):
+    """Route get_mongo_db(alias) to another database handle, e.g. for benchmarks"""
+    previous = _overrides.get(alias)
+    _overrides[alias] = db
+    try:
+        yield db
+    finally:
+        if previous is None:
+            _overrides.pop(alias, None)
+        else:
+            _overrides[alias] = previous
+
+
+def ping_mongo(alias='mongodb'):
+    """
+    Health check for a database alias
+    Returns:
+        dict with ok flag, round trip latency in ms and error message if any
+    """
+    started = time.monotonic()
+    try:
+        get_mongo_client(alias).admin.command('ping')
+        return {"ok": True, "latency_ms": round((time.monotonic() - started) * 1000, 2)}
+    except Exception as e:
+        logger.warning(f"MongoDB ping failed for '{alias}': {str(e)}")
+        return {
+            "ok": False,
+            "latency_ms": round((time.monotonic() - started) * 1000, 2),
+            "error": str(e)
+        }
+
+
+def get_mongo_metrics(alias='mongodb'):
+    """Command counters of the shared client, None before it is first used"""
+    metrics = _metrics.get(alias)
+    return metrics.snapshot() if metrics else None
+
+
+def close_mongo_clients():
+    """Close every shared client, e.g. on worker shutdown"""
+    with _lock:
+        for alias, client in _clients.items():
+            client.close()
+            logger.info(f"Closed MongoDB client for '{alias}'")
+        _clients.clear()
+        _metrics.clear()
+
+
+
+def model_from_document(model, document, projected=False):
+    """
+    Build a djongo model instance from a raw document, as the ORM would
+    have loaded it, without querying again
+    Args:
+        projected: the document was read with a projection, fields it lacks
+            are left deferred as with QuerySet.only() instead of defaulted
+    """
+    field_names = []
+    values = []
+    for field in model._meta.concrete_fields:
+        if field.attname in document:
+            value = document[field.attname]
+            if isinstance(value, Decimal128):
+                value = value.to_decimal()
+        elif projected and not field.primary_key:
+            continue
+        else:
+            value = field.get_default()
+        field_names.append(field.attname)
+        values.append(value)
+    return model.from_db('mongodb', field_names, values)
+
+
+def acquire_lease(name, ttl, alias='mongodb'):
+    """
+    Take a named, expiring lock shared by every process using the database.
+    Returns an owner token when acquired, None if another owner holds it.
+    """
+    now = datetime.utcnow()
+    token = f"{os.getpid()}:{threading.get_ident()}:{time.monotonic()}"
+    try:
+        get_mongo_db(alias)['locks'].update_one(
+            {"_id": name, "expires_at": {"$lt": now}},
+            {"$set": {"owner": token, "expires_at": now + timedelta(seconds=ttl)}},
+            upsert=True
+        )
+        return token
+    except DuplicateKeyError:
+        # Lock document exists and has not expired yet
+        return None
+
+
+def release_lease(name, token, alias='mongodb'):
+    """Release a lease taken by acquire_lease, only if still owned by token"""
+    get_mongo_db(alias)['locks'].delete_one({"_id": name, "owner": token})
@@ -0,0 +1,214 @@
+import logging
+
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, TEXT, IndexModel
+
+from backend.mongo import get_mongo_db
+
+logger = logging.getLogger(__name__)
+
+# Every MongoDB index the application relies on, per app label and collection.
+# Indexes are matched on their keys, so ones djongo already built from
+# Meta.indexes under another name count as present.
+MONGO_INDEXES = {
+    'classrooms': {
+        'classrooms': [
+            # Nearby filters on availability, price and capacity are answered from the geo index
+            IndexModel([
+                ("location", GEOSPHERE),
+                ("is_available", ASCENDING),
+                ("price_per_hour", ASCENDING),
+                ("capacity", ASCENDING)
+            ], name='location_2dsphere_filters'),
+            IndexModel([("amenities", ASCENDING)]),
+            # Classroom list pages are keyed on (created_at, _id) within a school or availability
+            IndexModel([("school_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("is_available", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        ],
+    },
+    'courses': {
+        'courses': [
+            # Course list pages are keyed on (created_at, _id): over every course
+            # (teachers and admins, optionally filtered on is_online/is_free),
+            # per teacher or per status
+            IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("teacher_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+            # Course search, language 'none' since titles mix French, Arabic and English
+            IndexModel(
+                [("title", TEXT), ("description", TEXT)],
+                weights={"title": 3, "description": 1},
+                default_language='none',
+                name='course_text'
+            ),
+            IndexModel([("tags", ASCENDING)]),
+        ],
+        'enrollments': [
+            IndexModel([("student_id", ASCENDING), ("enrollment_date", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("course_id", ASCENDING)]),
+            # One enrollment per student and course, concurrent enrollments rely on it
+            IndexModel([("student_id", ASCENDING), ("course_id", ASCENDING)], unique=True),
+        ],
+    },
+    'contracts': {
+        'contracts': [
+            IndexModel([("classroom_id", ASCENDING), ("end_date", ASCENDING)]),
+            # Booking calendars load the blocking contracts of one classroom,
+            # booking checks only those overlapping a period
+            IndexModel([
+                ("classroom_id", ASCENDING),
+                ("status", ASCENDING),
+                ("end_date", ASCENDING),
+                ("start_date", ASCENDING)
+            ]),
+            IndexModel([("teacher_id", ASCENDING), ("created_at", DESCENDING)]),
+            IndexModel([("school_id", ASCENDING), ("created_at", DESCENDING)]),
+        ],
+    },
+    'chat': {
+        'chat_chatroom': [
+            IndexModel([("participants", ASCENDING), ("last_activity", DESCENDING)]),
+        ],
+        'chat_message': [
+            IndexModel([("room_id", ASCENDING), ("timestamp", DESCENDING)]),
+        ],
+    },
+    'leaderboard': {
+        'leaderboard': [
+            IndexModel([("role", ASCENDING), ("points", DESCENDING)]),
+            # Rank counts and keyset pages walk the full (points, last_updated, _id) order
+            IndexModel([
+                ("role", ASCENDING),
+                ("points", DESCENDING),
+                ("last_updated", ASCENDING),
+                ("_id", ASCENDING)
+            ]),
+            # Incremental rank shifts update a rank range within a role
+            IndexModel([("role", ASCENDING), ("rank", ASCENDING)]),
+            IndexModel([("user_id", ASCENDING), ("role", ASCENDING)], unique=True),
+            IndexModel([("last_updated", ASCENDING)]),
+        ],
+        'leaderboard_buckets': [
+            IndexModel([
+                ("period", ASCENDING),
+                ("period_start", ASCENDING),
+                ("role", ASCENDING),
+                ("points", DESCENDING),
+                ("last_updated", ASCENDING)
+            ]),
+            IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+        ],
+        'leaderboard_events': [
+            IndexModel([("user_id", ASCENDING), ("at", DESCENDING)]),
+            IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+        ],
+        'leaderboard_pending': [
+            IndexModel([("queued_at", ASCENDING)]),
+        ],
+    },
+}
+
+# Indexes superseded by a declaration above, dropped once it exists
+OBSOLETE_MONGO_INDEXES = {
+    'classrooms': {
+        'classrooms': ['location_2dsphere'],
+    },
+}
+
+_ready = False
+
+
+def _key(spec, weights=None):
+    """
+    Comparable form of an index key, servers may report 1 as 1.0.
+    Text indexes are reported as _fts/_ftsx with their fields in weights,
+    both forms compare as the other fields followed by the sorted text fields.
+    """
+    spec = list(spec)
+    text_fields = [field for field, direction in spec if direction == TEXT]
+    if ('_fts', TEXT) in spec:
+        text_fields = list(weights or {})
+    if text_fields:
+        spec = [
+            (field, direction) for field, direction in spec
+            if direction != TEXT and field not in ('_fts', '_ftsx')
+        ] + [(field, TEXT) for field in sorted(text_fields)]
+    return tuple(
+        (field, int(direction) if isinstance(direction, (int, float)) else direction)
+        for field, direction in spec
+    )
+
+
+def _declared(app_label=None):
+    for label, collections in MONGO_INDEXES.items():
+        if app_label is None or label == app_label:
+            for collection_name, indexes in collections.items():
+                yield collection_name, indexes
+
+
+def _missing(db, collection_name, indexes):
+    existing = {_key(info['key'], info.get('weights')) for info in db[collection_name].index_information().values()}
+    return [index for index in indexes if _key(index.document['key'].items()) not in existing]
+
+
+def ensure_mongo_indexes(app_label=None, db=None):
+    """
+    Create the declared indexes that do not exist yet, for one app or all
+    Returns:
+        list of created index names
+    """
+    db = db if db is not None else get_mongo_db('mongodb')
+    created = []
+    for collection_name, indexes in _declared(app_label):
+        missing = _missing(db, collection_name, indexes)
+        if missing:
+            names = db[collection_name].create_indexes(missing)
+            created.extend(f"{collection_name}.{name}" for name in names)
+    if created:
+        logger.info(f"Created MongoDB indexes: {', '.join(created)}")
+    _drop_obsolete(db, app_label)
+    return created
+
+
+def _drop_obsolete(db, app_label=None):
+    for label, collections in OBSOLETE_MONGO_INDEXES.items():
+        if app_label is not None and label != app_label:
+            continue
+        for collection_name, names in collections.items():
+            existing = db[collection_name].index_information()
+            for name in names:
+                if name in existing:
+                    db[collection_name].drop_index(name)
+                    logger.info(f"Dropped obsolete MongoDB index {collection_name}.{name}")
+
+
+def missing_mongo_indexes(db=None):
+    """Declared indexes not present in the database, as 'collection.name' strings"""
+    db = db if db is not None else get_mongo_db('mongodb')
+    return [
+        f"{collection_name}.{index.document['name']}"
+        for collection_name, indexes in _declared()
+        for index in _missing(db, collection_name, indexes)
+    ]
+
+
+def mongo_indexes_ready():
+    """
+    Readiness check, True once every declared index exists.
+    The positive answer is kept for the life of the process.
+    """
+    global _ready
+    if not _ready:
+        missing = missing_mongo_indexes()
+        if missing:
+            logger.warning(f"MongoDB indexes not provisioned: {', '.join(missing)}")
+            return False
+        _ready = True
+    return True
+
+
+def provision_indexes(sender, **kwargs):
+    """post_migrate receiver applying the indexes of the migrated app"""
+    try:
+        ensure_mongo_indexes(sender.label)
+    except Exception as e:
+        logger.error(f"Failed to provision MongoDB indexes for {sender.label}: {str(e)}", exc_info=True)
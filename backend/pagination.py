@@ -0,0 +1,149 @@
+import base64
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import DESCENDING
+from rest_framework.exceptions import ParseError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+from backend.mongo import model_from_document
+from backend.serializers import serializer_projection
+
+
+def encode_cursor(position):
+    """Encode a keyset position (dict of JSON-serializable values) as an opaque cursor"""
+    raw = json.dumps(position, separators=(',', ':'), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor built by encode_cursor
+    Raises:
+        ValueError: if the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {str(e)}")
+    if not isinstance(position, dict):
+        raise ValueError("Invalid cursor")
+    return position
+
+
+def parse_limit(value, default, maximum):
+    """Parse a page size query parameter, clamped to [1, maximum]"""
+    if value in (None, ''):
+        return default
+    limit = int(value)
+    if limit < 1:
+        raise ValueError("limit must be a positive integer")
+    return min(limit, maximum)
+
+
+def parse_fields(value, allowed):
+    """
+    Parse a fields= sparse fieldset query parameter (comma separated names)
+    Returns:
+        list of field names, or None when the parameter is absent
+    Raises:
+        ValueError: if a name is not one of allowed
+    """
+    if value in (None, ''):
+        return None
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = sorted(set(fields) - set(allowed))
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def keyset_cursor(document, field):
+    """Cursor continuing after a document in (field desc, _id desc) order, field being a datetime"""
+    value = document.get(field)
+    return encode_cursor({
+        field: value.isoformat() if isinstance(value, datetime) else None,
+        "_id": str(document["_id"])
+    })
+
+
+def keyset_filter(cursor, field):
+    """
+    MongoDB filter for the documents after a keyset_cursor position
+    Raises:
+        ValueError: if the cursor is malformed
+    """
+    position = decode_cursor(cursor)
+    try:
+        last_id = ObjectId(position["_id"])
+        value = position[field]
+        if value is None:
+            # Documents without the field sort last, continue among them by _id
+            return {field: None, "_id": {"$lt": last_id}}
+        value = datetime.fromisoformat(value)
+    except (KeyError, TypeError, ValueError, InvalidId) as e:
+        raise ValueError(f"Invalid cursor: {str(e)}")
+    return {"$or": [
+        {field: {"$lt": value}},
+        {field: value, "_id": {"$lt": last_id}},
+        {field: None}
+    ]}
+
+
+def keyset_sort(field):
+    return [(field, DESCENDING), ("_id", DESCENDING)]
+
+
+class MongoQuery:
+    """
+    A raw MongoDB query standing in for a queryset in generic list views
+    paginated by KeysetPagination
+    """
+
+    def __init__(self, collection, query, model, ordering_field='created_at'):
+        self.collection = collection
+        self.query = query
+        self.model = model
+        self.ordering_field = ordering_field
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pages of a MongoQuery, newest first on (ordering_field, _id), continued
+    with the next_cursor of the previous page. Documents are projected to
+    the fields the view's serializer renders.
+    """
+    default_limit = 20
+    max_limit = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        field = queryset.ordering_field
+        try:
+            limit = parse_limit(request.query_params.get('limit'), self.default_limit, self.max_limit)
+            query = queryset.query
+            cursor = request.query_params.get('cursor')
+            if cursor:
+                query = {"$and": [query, keyset_filter(cursor, field)]}
+        except ValueError as e:
+            raise ParseError(str(e))
+
+        projection = serializer_projection(view.get_serializer(), queryset.model) if view is not None else None
+        if projection is not None:
+            projection[field] = 1
+
+        documents = list(queryset.collection.find(query, projection).sort(keyset_sort(field)).limit(limit + 1))
+        self.next_cursor = keyset_cursor(documents[limit - 1], field) if len(documents) > limit else None
+        return [
+            model_from_document(queryset.model, document, projected=projection is not None)
+            for document in documents[:limit]
+        ]
+
+    def get_paginated_response(self, data):
+        return Response({
+            'results': data,
+            'next_cursor': self.next_cursor
+        })
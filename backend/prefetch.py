@@ -0,0 +1,95 @@
+import logging
+
+from django.contrib.auth import get_user_model
+from django.db import models
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+# Reverse one-to-one profiles read by UserProfileSerializer
+USER_PROFILE_RELATIONS = ('student_profile', 'teacher_profile', 'school_profile')
+
+
+def _related_queryset(model):
+    queryset = model._default_manager.all()
+    if model is get_user_model():
+        queryset = queryset.select_related(*USER_PROFILE_RELATIONS)
+    return queryset
+
+
+def _prefetch_field(instances, name):
+    """
+    Load one foreign key for a list of instances of the same model with a
+    single query, and cache each related object on its instance
+    Returns:
+        the related objects, in the order of instances (None where unset)
+    """
+    instances = [instance for instance in instances if instance is not None]
+    if not instances:
+        return []
+    field = instances[0]._meta.get_field(name)
+    target = field.target_field
+
+    # Instances loaded without the key (deferred by a projection) are left alone
+    pending = [
+        instance for instance in instances
+        if field.attname in instance.__dict__ and not field.is_cached(instance)
+        and getattr(instance, field.attname) is not None
+    ]
+    if pending:
+        values = list({getattr(instance, field.attname) for instance in pending})
+        related = {
+            getattr(obj, target.attname): obj
+            for obj in _related_queryset(field.related_model).filter(**{f"{target.name}__in": values})
+        }
+        for instance in pending:
+            obj = related.get(getattr(instance, field.attname))
+            # Dangling references stay uncached and fail on access as they did before
+            if obj is not None:
+                field.set_cached_value(instance, obj)
+    return [field.get_cached_value(instance, default=None) for instance in instances]
+
+
+def prefetch_related_across_databases(instances, *paths):
+    """
+    Load foreign keys of MongoDB-backed instances that point into PostgreSQL
+    (or the other way around), where select_related cannot join.
+    Each relation costs one query whatever the number of instances; users
+    come with their student, teacher and school profiles.
+    Args:
+        instances: list of model instances of the same model
+        paths: relation names, dotted to follow nested relations ('classroom.school')
+    Returns:
+        instances
+    """
+    for path in paths:
+        level = instances
+        for name in path.split('.'):
+            level = _prefetch_field(level, name)
+    return instances
+
+
+class CrossDatabaseListSerializer(serializers.ListSerializer):
+    """
+    List serializer prefetching the relations named by the child serializer's
+    Meta.prefetch_across before serializing, so nested serializers read them
+    from the instance cache instead of querying once per item.
+    Enabled with Meta.list_serializer_class = CrossDatabaseListSerializer.
+    """
+
+    def prefetch(self, instances):
+        """Load what the child serializer reads for every instance, extended by subclasses"""
+        paths = getattr(self.child.Meta, 'prefetch_across', ())
+        if paths:
+            prefetch_related_across_databases(instances, *paths)
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        instances = list(iterable)
+        if instances:
+            try:
+                self.prefetch(instances)
+            except Exception as e:
+                # Serialization still works without the prefetch, one query at a time
+                logger.error(f"Failed to prefetch for {type(self.child).__name__}: {str(e)}", exc_info=True)
+        return super().to_representation(instances)
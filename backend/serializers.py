@@ -0,0 +1,61 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ParseError
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer accepting a fields= keyword argument that limits its output
+    to the named fields, in the order they are declared on the serializer
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class SparseFieldsetViewMixin:
+    """
+    Generic view passing the fields= query parameter to a serializer using
+    SparseFieldsetMixin
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        from backend.pagination import parse_fields
+        
+        serializer_class = self.get_serializer_class()
+        if issubclass(serializer_class, SparseFieldsetMixin) and self.request.method == 'GET':
+            try:
+                fields = parse_fields(self.request.query_params.get('fields'), serializer_class.Meta.fields)
+                kwargs.setdefault('fields', fields)
+            except ValueError as e:
+                raise ParseError(str(e))
+        return super().get_serializer(*args, **kwargs)
+
+
+def serializer_projection(serializer, model):
+    """
+    MongoDB projection of the document fields a serializer reads, None when
+    that cannot be told. Method fields name what they read in
+    Meta.field_sources, e.g. {'attachments': ['is_free', 'meeting_link']}.
+    """
+    field_sources = getattr(getattr(serializer, 'Meta', None), 'field_sources', {})
+    projection = {}
+    for name, field in serializer.fields.items():
+        if name in field_sources:
+            sources = field_sources[name]
+        elif field.source == '*':
+            return None
+        else:
+            sources = [field.source.split('.')[0]]
+        for source in sources:
+            try:
+                model_field = model._meta.get_field(source)
+            except FieldDoesNotExist:
+                return None
+            if not model_field.concrete:
+                return None
+            projection[model_field.attname] = 1
+    return projection
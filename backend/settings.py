@@ -150,6 +150,52 @@ ONESIGNAL_REST_API_KEY = 'your-api-key'
 WSGI_APPLICATION = 'backend.wsgi.application'
 APPLICATION_FEE_PERCENTAGE = float(os.getenv('APPLICATION_FEE_PERCENTAGE', 5)) 
 
+# Leaderboard
+LEADERBOARD_RANK_CACHE_TTL = int(os.getenv('LEADERBOARD_RANK_CACHE_TTL', 30))  # seconds, 0 disables the rank cache
+LEADERBOARD_RECONCILE_INTERVAL = int(os.getenv('LEADERBOARD_RECONCILE_INTERVAL', 300))  # seconds between reconciliation passes
+LEADERBOARD_RECONCILE_CHUNK_SIZE = int(os.getenv('LEADERBOARD_RECONCILE_CHUNK_SIZE', 1000))
+LEADERBOARD_WRITE_BEHIND = os.getenv('LEADERBOARD_WRITE_BEHIND', 'true').lower() == 'true'  # buffer points changes before writing
+LEADERBOARD_BUFFER_FLUSH_MS = int(os.getenv('LEADERBOARD_BUFFER_FLUSH_MS', 500))
+LEADERBOARD_BUFFER_MAX_EVENTS = int(os.getenv('LEADERBOARD_BUFFER_MAX_EVENTS', 100))
+LEADERBOARD_BUFFER_REBUILD_THRESHOLD = int(os.getenv('LEADERBOARD_BUFFER_REBUILD_THRESHOLD', 50))  # above this many changes per role, ranks are rebuilt in one pass
+LEADERBOARD_BUFFER_RECOVER_AFTER = int(os.getenv('LEADERBOARD_BUFFER_RECOVER_AFTER', 60))  # seconds before unflushed journal entries are replayed
+LEADERBOARD_CACHE_TTL = int(os.getenv('LEADERBOARD_CACHE_TTL', 60))  # seconds the cached leaderboard counts as fresh
+LEADERBOARD_CACHE_STALE_TTL = int(os.getenv('LEADERBOARD_CACHE_STALE_TTL', 600))  # seconds a stale leaderboard may still be served
+LEADERBOARD_CACHE_REFRESH_AHEAD = int(os.getenv('LEADERBOARD_CACHE_REFRESH_AHEAD', 10))  # refresh this many seconds before going stale
+LEADERBOARD_PERIOD_RETENTION_DAYS = int(os.getenv('LEADERBOARD_PERIOD_RETENTION_DAYS', 90))  # days a finished period board is kept
+LEADERBOARD_EVENT_RETENTION_DAYS = int(os.getenv('LEADERBOARD_EVENT_RETENTION_DAYS', 30))  # days raw points events are kept
+LEADERBOARD_BUCKET_EVENT_IDS = int(os.getenv('LEADERBOARD_BUCKET_EVENT_IDS', 500))  # buffered event ids each period bucket remembers to skip replays
+BADGE_THRESHOLDS_TTL = int(os.getenv('BADGE_THRESHOLDS_TTL', 300))  # seconds badge thresholds stay cached in memory
+
+# Classrooms
+CLASSROOM_SNAPSHOT_TTL = int(os.getenv('CLASSROOM_SNAPSHOT_TTL', 300))  # seconds before the fallback coordinate snapshot is reloaded
+CLASSROOM_MEMORY_INDEX = os.getenv('CLASSROOM_MEMORY_INDEX', 'false').lower() == 'true'  # answer nearby searches from an in-process grid index
+CLASSROOM_INDEX_CELL_DEG = float(os.getenv('CLASSROOM_INDEX_CELL_DEG', 0.25))  # grid cell size in degrees
+CLASSROOM_INDEX_VERIFY_INTERVAL = int(os.getenv('CLASSROOM_INDEX_VERIFY_INTERVAL', 300))  # seconds between consistency checks against MongoDB
+CLASSROOM_PRICE_BUCKETS = [int(value) for value in os.getenv('CLASSROOM_PRICE_BUCKETS', '0,1000,2000,5000,10000').split(',')]  # nearby search price facet boundaries
+CLASSROOM_GEO_CACHE_TTL = int(os.getenv('CLASSROOM_GEO_CACHE_TTL', 60))  # seconds a cached nearby search is kept, 0 disables the cache
+CLASSROOM_GEO_CACHE_CELL_DEG = float(os.getenv('CLASSROOM_GEO_CACHE_CELL_DEG', 0.01))  # searches within the same cell share an entry
+CLASSROOM_GEO_CACHE_TILE_DEG = float(os.getenv('CLASSROOM_GEO_CACHE_TILE_DEG', 0.25))  # invalidation granularity
+CLASSROOM_GEO_CACHE_RADIUS_STEP_KM = int(os.getenv('CLASSROOM_GEO_CACHE_RADIUS_STEP_KM', 1))
+CLASSROOM_GEO_CACHE_MAX_CANDIDATES = int(os.getenv('CLASSROOM_GEO_CACHE_MAX_CANDIDATES', 2000))  # larger searches are not cached
+CLASSROOM_IMPORT_BATCH_SIZE = int(os.getenv('CLASSROOM_IMPORT_BATCH_SIZE', 500))  # classrooms per insert_many during bulk imports
+CLASSROOM_IMPORT_MAX_ROWS = int(os.getenv('CLASSROOM_IMPORT_MAX_ROWS', 10000))  # rows accepted by one bulk import request
+
+# Courses
+COURSE_SEARCH_RATING_WEIGHT = float(os.getenv('COURSE_SEARCH_RATING_WEIGHT', 0.5))  # boost of a 5-star course over an unrated one in search relevance
+COURSE_SEARCH_RATING_PRIOR = float(os.getenv('COURSE_SEARCH_RATING_PRIOR', 3.0))  # rating assumed for courses with few ratings
+COURSE_SEARCH_RATING_PRIOR_VOTES = int(os.getenv('COURSE_SEARCH_RATING_PRIOR_VOTES', 5))  # ratings needed before a course's own rating dominates
+COURSE_SEARCH_MAX_CANDIDATES = int(os.getenv('COURSE_SEARCH_MAX_CANDIDATES', 1000))  # best text matches ranked by relevance, the rest are not returned
+COURSE_RATING_REPAIR_INTERVAL = int(os.getenv('COURSE_RATING_REPAIR_INTERVAL', 3600))  # seconds between rating drift repairs
+COURSE_RATING_REPAIR_BATCH_SIZE = int(os.getenv('COURSE_RATING_REPAIR_BATCH_SIZE', 1000))
+COURSE_RATING_REPAIR_GRACE = int(os.getenv('COURSE_RATING_REPAIR_GRACE', 60))  # seconds a freshly rated course is left alone by the repair
+
+# Contracts
+CONTRACT_CALENDAR_TTL = int(os.getenv('CONTRACT_CALENDAR_TTL', 300))  # seconds a classroom booking calendar stays cached
+CONTRACT_BOOKING_LOCK_TTL = int(os.getenv('CONTRACT_BOOKING_LOCK_TTL', 10))  # seconds before an abandoned booking lock expires
+CONTRACT_BOOKING_LOCK_WAIT = int(os.getenv('CONTRACT_BOOKING_LOCK_WAIT', 2))  # seconds a booking waits for the classroom lock
+CONTRACT_CLASSROOM_WEEKLY_HOURS = int(os.getenv('CONTRACT_CLASSROOM_WEEKLY_HOURS', 84))  # weekly hours overlapping contracts may book in one classroom
+
 
 CHARGILY_CONFIG = {
     'MODE': os.getenv('CHARGILY_MODE', 'test'),  # 'test' or 'live'
@@ -205,6 +251,22 @@ DATABASES['mongodb'] = {
         },
 }
 
+# Shared MongoClient pool (see backend/mongo.py)
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 100))
+MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', 0))
+
+# Shared cache, required for cross-worker locks and counters
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            }
+        }
+    }
+
 # Database Router
 DATABASE_ROUTERS = ['backend.db_routers.MongoDBRouter']
 
@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from backend.health import readiness
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('authentication/', include('backend.apps.authentication.urls')),
@@ -10,5 +12,6 @@ urlpatterns = [
     path('achievements/', include('backend.apps.achievements.urls')),
     path('payments/', include('backend.apps.payments.urls')),
     path('contracts/', include('backend.apps.contracts.urls')),
+    path('health/ready/', readiness, name='readiness'),
   
 ]
\ No newline at end of file